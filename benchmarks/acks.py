@@ -0,0 +1,38 @@
+#! /usr/bin/env python3.6
+
+'''
+    Delayed ACK Benchmark - sender and receiver CPU per MB by ack_every
+
+    python3.6 benchmarks/acks.py [file MB] [ack_every ...]
+
+    ack_every=1 is an ACK per segment (the receiver declines delayed ACKs), so each
+    ack_every=N cuts the ACKs the sender handles to about 1/N of the segments.
+'''
+
+import os, sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from cpu import ROOT, run
+
+PORT = 7600
+ACK_EVERY = [1, 2, 4, 8]
+''' MWS MSS gamma pDrop pDuplicate pCorrupt pOrder maxOrder pDelay maxDelay seed '''
+CASES = [
+    ('lossless', ['50000', '500', '4', '0', '0', '0', '0', '3', '0', '20', '50']),
+    ('pDrop=0.02', ['50000', '500', '4', '0.02', '0', '0', '0', '3', '0', '20', '50']),
+]
+
+
+def main(sizeMB, ackEvery):
+    print('{:<12}{:>10}{:>10}{:>18}{:>20}'.format('case', 'ack_every', 'wall (s)', 'sender CPU s/MB', 'receiver CPU s/MB'))
+    port = PORT
+    for name, pld in CASES:
+        for every in ackEvery:
+            wall, senderCPU, receiverCPU = run(ROOT, sizeMB, pld, port,
+                ['delayed_ack=on', 'cc=reno', 'log=summary'], ['ack_every={}'.format(every), 'log=summary'])
+            port += 1
+            print('{:<12}{:>10}{:>10.2f}{:>18.3f}{:>20.3f}'.format(name, every, wall, senderCPU / sizeMB, receiverCPU / sizeMB))
+
+
+if __name__ == "__main__":
+    main(float(sys.argv[1]) if len(sys.argv) > 1 else 1,
+        [int(every) for every in sys.argv[2:]] or ACK_EVERY)
@@ -0,0 +1,158 @@
+#! /usr/bin/env python3.6
+
+'''
+    Congestion Control Benchmark - goodput of each algorithm through a simulated bottleneck
+
+    python3.6 benchmarks/bottleneck.py [file MB] [rate MB/s] [queue packets] [delay ms]
+
+    The sender sends through a UDP relay, which forwards data at a fixed rate through a
+    drop-tail queue of limited packets and delays both directions, so a window larger than
+    the bandwidth delay product overflows the queue. MWS is fixed well above it.
+'''
+
+import os, sys, time, heapq, shutil, filecmp, tempfile, threading, selectors, subprocess
+from socket import socket, AF_INET, SOCK_DGRAM
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from classes import defines, log
+from cpu import ROOT
+
+PORT = 7300
+''' MWS MSS gamma pDrop pDuplicate pCorrupt pOrder maxOrder pDelay maxDelay seed '''
+PLD = ['200000', '1000', '4', '0', '0', '0', '0', '3', '0', '20', '50']
+''' name, sender options (SACK so a burst of drops is not recovered one timeout at a time) '''
+CONFIGS = [(cc, ['cc=' + cc, 'sack=on']) for cc in defines.CCS]
+
+
+class Bottleneck(threading.Thread):
+    ''' UDP relay - rate limited drop-tail queue towards the receiver, delay in both directions '''
+    def __init__(self, port, receiverPort, rate, queueSize, delay):
+        threading.Thread.__init__(self, daemon=True)
+        self._listen = socket(AF_INET, SOCK_DGRAM)
+        self._listen.bind(('127.0.0.1', port))
+        self._forward = socket(AF_INET, SOCK_DGRAM)
+        self._forward.connect(('127.0.0.1', receiverPort))
+        self._rate = rate # bytes per second
+        self._queueSize = queueSize
+        self._delay = delay # seconds, one way
+        self._queue = [] # packets waiting for the link
+        self._inFlight = [] # heap of (delivery time, order, socket, packet, address)
+        self._order = 0
+        self._linkFree = 0.0 # time the link finishes the packet being serialised
+        self._sender = None
+        self.drops = 0
+        self._stopped = threading.Event()
+        self.start()
+
+
+    def deliver_later(self, when, sock, packet, address):
+        ''' queue packet to be sent on sock at when '''
+        self._order += 1
+        heapq.heappush(self._inFlight, (when, self._order, sock, packet, address))
+
+
+    def run(self):
+        ''' relay packets until stopped '''
+        selector = selectors.DefaultSelector()
+        selector.register(self._listen, selectors.EVENT_READ)
+        selector.register(self._forward, selectors.EVENT_READ)
+        while not self._stopped.is_set():
+            now = time.monotonic()
+
+            ''' serialise queued data packets onto the link '''
+            while self._queue and self._linkFree <= now:
+                packet = self._queue.pop(0)
+                self._linkFree = max(self._linkFree, now) + len(packet) / self._rate
+                self.deliver_later(self._linkFree + self._delay, self._forward, packet, None)
+
+            ''' deliver packets whose delay has passed '''
+            while self._inFlight and self._inFlight[0][0] <= now:
+                when, order, sock, packet, address = heapq.heappop(self._inFlight)
+                try:
+                    if address is None:
+                        sock.send(packet)
+                    else:
+                        sock.sendto(packet, address)
+                except OSError:
+                    pass
+
+            timeout = 0.05
+            if self._queue:
+                timeout = min(timeout, max(self._linkFree - now, 0))
+            if self._inFlight:
+                timeout = min(timeout, max(self._inFlight[0][0] - now, 0))
+            for key, events in selector.select(timeout):
+                try:
+                    if key.fileobj is self._listen:
+                        packet, self._sender = self._listen.recvfrom(defines.BUFFER_SIZE)
+                        if len(self._queue) >= self._queueSize:
+                            self.drops += 1
+                        else:
+                            self._queue.append(packet)
+                    else:
+                        packet = self._forward.recv(defines.BUFFER_SIZE)
+                        self.deliver_later(time.monotonic() + self._delay, self._listen, packet, self._sender)
+                except OSError:
+                    pass
+
+
+    def stop(self):
+        ''' stop relaying '''
+        self._stopped.set()
+        self.join()
+        self._listen.close()
+        self._forward.close()
+
+
+def results(logFile):
+    ''' read the retransmission counts from the sender log '''
+    counts = {}
+    with open(logFile) as f:
+        for line in f:
+            if line.startswith('Number of Retransmissions due to TIMEOUT'):
+                counts['timeout'] = int(line.split()[-1])
+            elif line.startswith('Number of FAST RETRANSMISSION'):
+                counts['fast'] = int(line.split()[-1])
+    return counts
+
+
+def run(sizeMB, options, port, rate, queueSize, delay):
+    ''' transfer a file through the bottleneck, returns (wall seconds, relay drops, sender results) '''
+    workDir = tempfile.mkdtemp(prefix='stp-bench-')
+    relay = Bottleneck(port, port + 1, rate, queueSize, delay)
+    try:
+        source = os.path.join(workDir, 'in.bin')
+        with open(source, 'wb') as f:
+            f.write(os.urandom(int(sizeMB * 1e6)))
+        receiver = subprocess.Popen([sys.executable, os.path.join(ROOT, 'receiver.py'), str(port + 1), 'out.bin', 'log=summary'],
+            cwd=workDir, stdout=subprocess.DEVNULL)
+        time.sleep(0.5)
+
+        start = time.perf_counter()
+        subprocess.run([sys.executable, os.path.join(ROOT, 'sender.py'), '127.0.0.1', str(port), 'in.bin'] + PLD + options,
+            cwd=workDir, stdout=subprocess.DEVNULL, timeout=600)
+        wall = time.perf_counter() - start
+        receiver.wait(timeout=60)
+
+        assert filecmp.cmp(source, os.path.join(workDir, 'out.bin'), shallow=False), "Transferred file differs"
+        return wall, relay.drops, results(os.path.join(workDir, log.SENDER_LOG))
+    finally:
+        relay.stop()
+        shutil.rmtree(workDir, ignore_errors=True)
+
+
+def main(sizeMB, rate, queueSize, delay):
+    print('bottleneck {} MB/s, queue {} packets, delay {} ms each way'.format(rate, queueSize, delay))
+    print('{:<16}{:>10}{:>12}{:>12}{:>12}{:>10}'.format('cc', 'wall (s)', 'MB/s', 'drops', 'timeouts', 'fast'))
+    port = PORT
+    for name, options in CONFIGS:
+        wall, drops, counts = run(sizeMB, options + ['log=summary'], port, rate * 1e6, queueSize, delay / 1000)
+        port += 2
+        print('{:<16}{:>10.2f}{:>12.3f}{:>12}{:>12}{:>10}'.format(name, wall, sizeMB / wall, drops,
+            counts.get('timeout', '-'), counts.get('fast', '-')))
+
+
+if __name__ == "__main__":
+    main(float(sys.argv[1]) if len(sys.argv) > 1 else 0.5,
+        float(sys.argv[2]) if len(sys.argv) > 2 else 1,
+        int(sys.argv[3]) if len(sys.argv) > 3 else 20,
+        float(sys.argv[4]) if len(sys.argv) > 4 else 10)
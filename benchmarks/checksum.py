@@ -0,0 +1,57 @@
+#! /usr/bin/env python3.6
+
+'''
+    Checksum Benchmark - MB/s per algorithm and payload size
+
+    python3.6 benchmarks/checksum.py [seconds per case]
+'''
+
+import os, sys, time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from classes import checksum, defines
+
+PAYLOAD_SIZES = [64, 512, 1460, 8192, 65000]
+
+
+def reference(msg):
+    ''' Original per-word RFC 1071 loop, used as the baseline and for verification '''
+    msgSum = 0
+    if len(msg)%2:
+        msg += b"\x00"
+    for (a, b) in zip(msg[0::2], msg[1::2]):
+        curr = msgSum + (a + (b << 8))
+        msgSum = (curr & 0xffff) + (curr >> 16)
+    return ~msgSum & 0xffff
+
+
+def throughput(func, data, seconds):
+    ''' return MB/s of func(data) over roughly seconds '''
+    count = 0
+    start = time.perf_counter()
+    while True:
+        func(data)
+        count += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= seconds:
+            return (count * len(data)) / elapsed / 1e6
+
+
+def main(seconds):
+    cases = [('reference', reference)]
+    for name, engine in checksum.ENGINES.items():
+        cases.append(('internet/' + name, lambda data, engine=engine: checksum.internet(data, engine=engine)))
+    cases.append((defines.CHECKSUM_CRC32, checksum.crc32))
+
+    print('{:<20}'.format('algorithm') + ''.join('{:>12}'.format(size) for size in PAYLOAD_SIZES))
+    for name, func in cases:
+        row = '{:<20}'.format(name)
+        for size in PAYLOAD_SIZES:
+            data = os.urandom(size + 11)
+            if name.startswith('internet'):
+                assert func(data) == reference(data), "{} differs from reference".format(name)
+            row += '{:>12.1f}'.format(throughput(func, data, seconds))
+        print(row)
+
+
+if __name__ == "__main__":
+    main(float(sys.argv[1]) if len(sys.argv) > 1 else 0.2)
@@ -0,0 +1,67 @@
+#! /usr/bin/env python3.6
+
+'''
+    Compression Benchmark - effective throughput and bytes on the wire by codec
+
+    python3.6 benchmarks/compression.py [file MB] [codec ...]
+
+    Each codec transfers a CSV log file and a random (incompressible) file over loopback.
+    Effective MB/s counts file bytes; wire is the payload bytes sent per file byte. Loopback
+    is not bandwidth limited, so the last column estimates the transfer time over a
+    LINK_MBIT link, where the bytes on the wire rather than the CPU set the pace.
+'''
+
+import os, sys, random
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from cpu import ROOT, run
+from classes import compress, defines
+
+PORT = 7800
+LINK_MBIT = 10
+''' MWS MSS gamma pDrop pDuplicate pCorrupt pOrder maxOrder pDelay maxDelay seed '''
+PLD = ['100000', '1000', '4', '0', '0', '0', '0', '3', '0', '20', '50']
+
+
+def csv_log(size):
+    ''' return size bytes of CSV access log lines '''
+    rng = random.Random(50)
+    lines = []
+    length = 0
+    while length < size:
+        line = '2026-10-18T12:{:02d}:{:02d},host-{},GET,/api/v1/items/{},{},{}\n'.format(
+            rng.randrange(60), rng.randrange(60), rng.randint(1, 20), rng.randint(1, 5000), rng.choice((200, 200, 200, 404, 500)), rng.randint(100, 90000))
+        lines.append(line)
+        length += len(line)
+    return ''.join(lines).encode()[:size]
+
+
+CONTENTS = [('csv', csv_log), ('random', os.urandom)]
+
+
+def wire_ratio(codec, data, mss):
+    ''' payload bytes sent per file byte - segments that do not get smaller are sent raw '''
+    if codec == defines.COMPRESS_OFF:
+        return 1
+    compressor = compress.compressor(codec)
+    wire = sum(min(len(compressor(data[start:start + mss])), len(data[start:start + mss])) for start in range(0, len(data), mss))
+    return wire / len(data)
+
+
+def main(sizeMB, codecs):
+    print('{:<8}{:<8}{:>10}{:>8}{:>16}{:>18}{:>22}'.format('file', 'codec', 'wall (s)', 'wire', 'effective MB/s', 'sender CPU s/MB',
+        'est. s at {} Mbit/s'.format(LINK_MBIT)))
+    port = PORT
+    for name, content in CONTENTS:
+        data = content(int(sizeMB * 1e6))
+        for codec in codecs:
+            wall, senderCPU, receiverCPU = run(ROOT, sizeMB, PLD, port, ['compress={}'.format(codec), 'log=summary'], ['log=summary'],
+                lambda size: data)
+            port += 1
+            ratio = wire_ratio(codec, data, int(PLD[1]))
+            linkTime = max(wall, len(data) * ratio * 8 / (LINK_MBIT * 1e6))
+            print('{:<8}{:<8}{:>10.2f}{:>8.2f}{:>16.2f}{:>18.3f}{:>22.2f}'.format(name, codec, wall, ratio, sizeMB / wall, senderCPU / sizeMB, linkTime))
+
+
+if __name__ == "__main__":
+    main(float(sys.argv[1]) if len(sys.argv) > 1 else 4,
+        sys.argv[2:] or (defines.COMPRESS_OFF,) + compress.available())
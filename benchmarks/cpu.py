@@ -0,0 +1,63 @@
+#! /usr/bin/env python3.6
+
+'''
+    Sender CPU Benchmark - CPU seconds per MB transferred over loopback
+
+    python3.6 benchmarks/cpu.py [file MB] [source tree ...]
+
+    Each source tree (default: this one) runs receiver.py and sender.py on a random file,
+    so an older checkout can be compared against the current tree.
+'''
+
+import os, sys, time, shutil, filecmp, tempfile, subprocess, resource
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PORT = 7100
+''' MWS MSS gamma pDrop pDuplicate pCorrupt pOrder maxOrder pDelay maxDelay seed '''
+CASES = [
+    ('lossless', ['50000', '1000', '4', '0', '0', '0', '0', '3', '0', '20', '50']),
+    ('pDrop=0.05', ['5000', '500', '4', '0.05', '0', '0', '0', '3', '0', '20', '50']),
+]
+
+
+def run(tree, sizeMB, pld, port, options=(), receiverOptions=(), content=os.urandom):
+    ''' transfer a file of content(bytes) with tree (sender/receiver options name=value), returns (wall seconds, sender cpu seconds, receiver cpu seconds) '''
+    workDir = tempfile.mkdtemp(prefix='stp-bench-')
+    try:
+        source = os.path.join(workDir, 'in.bin')
+        with open(source, 'wb') as f:
+            f.write(content(int(sizeMB * 1e6)))
+        receiver = subprocess.Popen([sys.executable, os.path.join(tree, 'receiver.py'), str(port), 'out.bin'] + list(receiverOptions),
+            cwd=workDir, stdout=subprocess.DEVNULL)
+        time.sleep(0.5)
+
+        before = resource.getrusage(resource.RUSAGE_CHILDREN)
+        start = time.perf_counter()
+        subprocess.run([sys.executable, os.path.join(tree, 'sender.py'), '127.0.0.1', str(port), 'in.bin'] + pld + list(options),
+            cwd=workDir, stdout=subprocess.DEVNULL, timeout=600)
+        wall = time.perf_counter() - start
+        middle = resource.getrusage(resource.RUSAGE_CHILDREN)
+        receiver.wait(timeout=60)
+        after = resource.getrusage(resource.RUSAGE_CHILDREN)
+
+        assert filecmp.cmp(source, os.path.join(workDir, 'out.bin'), shallow=False), "Transferred file differs"
+        senderCPU = (middle.ru_utime + middle.ru_stime) - (before.ru_utime + before.ru_stime)
+        receiverCPU = (after.ru_utime + after.ru_stime) - (middle.ru_utime + middle.ru_stime)
+        return wall, senderCPU, receiverCPU
+    finally:
+        shutil.rmtree(workDir, ignore_errors=True)
+
+
+def main(sizeMB, trees):
+    print('{:<30}{:<12}{:>10}{:>18}{:>20}'.format('tree', 'case', 'wall (s)', 'sender CPU s/MB', 'receiver CPU s/MB'))
+    port = PORT
+    for tree in trees:
+        for name, pld in CASES:
+            wall, senderCPU, receiverCPU = run(tree, sizeMB, pld, port)
+            port += 1
+            print('{:<30}{:<12}{:>10.2f}{:>18.3f}{:>20.3f}'.format(
+                os.path.basename(os.path.abspath(tree)), name, wall, senderCPU / sizeMB, receiverCPU / sizeMB))
+
+
+if __name__ == "__main__":
+    main(float(sys.argv[1]) if len(sys.argv) > 1 else 1, sys.argv[2:] or [ROOT])
@@ -0,0 +1,44 @@
+#! /usr/bin/env python3.6
+
+'''
+    Goodput Benchmark - Go-Back-N, Selective Repeat and SACK across loss rates over loopback
+
+    python3.6 benchmarks/goodput.py [file MB] [pDrop ...]
+
+    Goodput is the file size over the wall time of the transfer, including retransmissions.
+'''
+
+import os, sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from cpu import ROOT, run
+
+PORT = 7200
+DROPS = [0, 0.01, 0.05, 0.1]
+''' name, sender options '''
+CONFIGS = [
+    ('gbn', ['mode=gbn']),
+    ('sr', ['mode=sr']),
+    ('gbn+sack', ['mode=gbn', 'sack=on']),
+    ('sr+sack', ['mode=sr', 'sack=on']),
+]
+
+
+def pld(pDrop):
+    ''' MWS MSS gamma pDrop pDuplicate pCorrupt pOrder maxOrder pDelay maxDelay seed '''
+    return ['100000', '1000', '4', str(pDrop), '0', '0', '0', '3', '0', '20', '50']
+
+
+def main(sizeMB, drops):
+    print('{:<10}'.format('pDrop') + ''.join('{:>16}'.format(name + ' MB/s') for name, options in CONFIGS))
+    port = PORT
+    for pDrop in drops:
+        row = '{:<10}'.format(pDrop)
+        for name, options in CONFIGS:
+            wall, senderCPU, receiverCPU = run(ROOT, sizeMB, pld(pDrop), port, options)
+            row += '{:>16.3f}'.format(sizeMB / wall)
+            port += 1
+        print(row)
+
+
+if __name__ == "__main__":
+    main(float(sys.argv[1]) if len(sys.argv) > 1 else 1, [float(p) for p in sys.argv[2:]] or DROPS)
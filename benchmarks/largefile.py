@@ -0,0 +1,71 @@
+#! /usr/bin/env python3.6
+
+'''
+    Large File Test - transfers a sparse file over 4 GiB over loopback (64 bit sequence numbers)
+
+    python3.6 benchmarks/largefile.py [file GiB]
+
+    The file is sparse apart from random blocks at its start, either side of the 4 GiB
+    boundary and at its end. It is sent with seq64=auto, which must negotiate 64 bit
+    sequence numbers, then with seq64=off, which the sender must refuse. The received
+    file (not sparse) needs as much free space as the file size.
+'''
+
+import os, sys, time, shutil, filecmp, tempfile, subprocess
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from cpu import ROOT
+
+PORT = 7700
+''' MWS MSS gamma pDrop pDuplicate pCorrupt pOrder maxOrder pDelay maxDelay seed '''
+PLD = ['4000000', '60000', '4', '0', '0', '0', '0', '3', '0', '20', '50']
+BLOCK = 1 << 20
+
+
+def sparse_file(path, size):
+    ''' create a sparse file of size bytes with random blocks at its start, around 4 GiB and at its end '''
+    with open(path, 'wb') as f:
+        f.truncate(size)
+        for offset in (0, (1 << 32) - BLOCK // 2, size - BLOCK):
+            f.seek(offset)
+            f.write(os.urandom(BLOCK))
+
+
+def transfer(workDir, source, port, options):
+    ''' send source to a receiver, returns (wall seconds, sender returncode, sender output) '''
+    receiver = subprocess.Popen([sys.executable, os.path.join(ROOT, 'receiver.py'), str(port), 'out.bin', 'log=summary'],
+        cwd=workDir, stdout=subprocess.DEVNULL)
+    time.sleep(0.5)
+    try:
+        start = time.perf_counter()
+        sender = subprocess.run([sys.executable, os.path.join(ROOT, 'sender.py'), '127.0.0.1', str(port), source] + PLD + ['log=summary'] + options,
+            cwd=workDir, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, timeout=3600)
+        wall = time.perf_counter() - start
+        receiver.wait(timeout=60)
+    finally:
+        if receiver.poll() is None:
+            receiver.kill()
+    return wall, sender.returncode, sender.stdout.decode(errors='replace')
+
+
+def main(sizeGiB):
+    size = int(sizeGiB * (1 << 30))
+    assert size > (1 << 32), "File must be over 4 GiB"
+    workDir = tempfile.mkdtemp(prefix='stp-large-')
+    try:
+        source = os.path.join(workDir, 'in.bin')
+        sparse_file(source, size)
+
+        wall, returncode, output = transfer(workDir, source, PORT, ['checksum=crc32'])
+        assert filecmp.cmp(source, os.path.join(workDir, 'out.bin'), shallow=False), "Transferred file differs"
+        print('seq64=auto {:.2f} GiB in {:.1f} s ({:.1f} MB/s) - files match'.format(sizeGiB, wall, size / wall / 1e6))
+        os.remove(os.path.join(workDir, 'out.bin'))
+
+        wall, returncode, output = transfer(workDir, source, PORT + 1, ['seq64=off'])
+        assert '64 bit sequence numbers' in output, "Sender did not refuse the file without 64 bit sequence numbers"
+        print('seq64=off refused by the sender')
+    finally:
+        shutil.rmtree(workDir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main(float(sys.argv[1]) if len(sys.argv) > 1 else 4.25)
@@ -0,0 +1,72 @@
+#! /usr/bin/env python3.6
+
+'''
+    Load Benchmark - aggregate goodput of one receiver serving many concurrent senders
+
+    python3.6 benchmarks/load.py [file MB] [senders ...]
+
+    One receiver (connections=N, an output path per connection) serves N senders started
+    together, each sending its own random file. Aggregate goodput is the total data over
+    the wall time until the last sender finishes. Each sender is window limited (small
+    MWS, delayed segments) so a single connection does not saturate the receiver.
+'''
+
+import os, sys, time, shutil, hashlib, tempfile, subprocess
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from cpu import ROOT
+
+PORT = 7500
+SENDERS = [1, 2, 4, 8]
+''' MWS MSS gamma pDrop pDuplicate pCorrupt pOrder maxOrder pDelay maxDelay seed '''
+PLD = ['5000', '1000', '4', '0', '0', '0', '0', '3', '1', '50', '50']
+
+
+def digest(path):
+    ''' sha256 of a file '''
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def run(sizeMB, senders, port, pld=PLD, options=()):
+    ''' transfer a file from each of senders concurrently (receiver options name=value), returns wall seconds '''
+    workDir = tempfile.mkdtemp(prefix='stp-bench-')
+    try:
+        sources = []
+        for i in range(senders):
+            source = os.path.join(workDir, 'in{}.bin'.format(i))
+            with open(source, 'wb') as f:
+                f.write(os.urandom(int(sizeMB * 1e6)))
+            sources.append(source)
+        receiver = subprocess.Popen([sys.executable, os.path.join(ROOT, 'receiver.py'), str(port),
+            os.path.join('out', '{n}.bin'), 'log=summary', 'connections={}'.format(senders)] + list(options),
+            cwd=workDir, stdout=subprocess.DEVNULL)
+        time.sleep(0.5)
+
+        start = time.perf_counter()
+        running = [subprocess.Popen([sys.executable, os.path.join(ROOT, 'sender.py'), '127.0.0.1', str(port), source] + pld + ['log=summary'],
+            cwd=workDir, stdout=subprocess.DEVNULL) for source in sources]
+        for sender in running:
+            sender.wait(timeout=600)
+        wall = time.perf_counter() - start
+        receiver.wait(timeout=60)
+
+        ''' connections are numbered in accept order - match the files by content '''
+        received = sorted(digest(os.path.join(workDir, 'out', name)) for name in os.listdir(os.path.join(workDir, 'out')))
+        assert received == sorted(digest(source) for source in sources), "Transferred files differ"
+        return wall
+    finally:
+        shutil.rmtree(workDir, ignore_errors=True)
+
+
+def main(sizeMB, senders):
+    print('{:<10}{:>10}{:>16}{:>18}'.format('senders', 'wall (s)', 'aggregate MB/s', 'per sender MB/s'))
+    port = PORT
+    for count in senders:
+        wall = run(sizeMB, count, port)
+        port += 1
+        print('{:<10}{:>10.2f}{:>16.3f}{:>18.3f}'.format(count, wall, count * sizeMB / wall, sizeMB / wall))
+
+
+if __name__ == "__main__":
+    main(float(sys.argv[1]) if len(sys.argv) > 1 else 0.5,
+        [int(count) for count in sys.argv[2:]] or SENDERS)
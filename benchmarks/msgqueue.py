@@ -0,0 +1,87 @@
+#! /usr/bin/env python3.6
+
+'''
+    Message Queue Benchmark - queue setup time and per-ACK lookup cost as file size grows
+
+    python3.6 benchmarks/msgqueue.py [mss]
+
+    The sender's STPSegmentSource (segment boundaries computed from MSS over a memory map of a
+    sparse file) against the list of (payload,seq,ack) tuples scanned per ACK it replaced.
+    Each ACK looks up its queue index and the next segment, as update_window does.
+'''
+
+import os, sys, time, random, shutil, tempfile
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from classes import message
+
+FILE_SIZES = [10**5, 10**6, 10**7, 10**8, 10**9]
+LOOKUPS = 2000
+LINEAR_LIMIT = 10**6 # the linear queue is too slow to build past this size
+
+
+class linearQueue(object):
+    ''' Previous list scan queue, used as the baseline '''
+    def __init__(self,filename,mss):
+        self._msgQueue = []
+        with open(filename,'rb') as f:
+            seqNum = 0
+            for payload in iter(lambda: f.read(mss),b''):
+                item = (payload,seqNum,seqNum + len(payload))
+                if item not in self._msgQueue:
+                    self._msgQueue.append(item)
+                seqNum += len(payload)
+
+    def get_msg(self,index):
+        if index >= 0 and index < len(self._msgQueue):
+            return self._msgQueue[index]
+        return ()
+
+    def get_key_index(self,key):
+        for i in range(0,len(self._msgQueue)):
+            if self._msgQueue[i][2] == key:
+                return i
+        return -1
+
+    def get_length(self):
+        return len(self._msgQueue)
+
+    def close(self):
+        pass
+
+
+def measure(queueType, filename, mss):
+    ''' return (setup seconds, microseconds per ACK lookup) '''
+    start = time.perf_counter()
+    msgQueue = queueType(filename, mss)
+    setup = time.perf_counter() - start
+
+    acks = [random.randrange(1, msgQueue.get_length() + 1) * mss for _ in range(LOOKUPS)]
+    start = time.perf_counter()
+    for ack in acks:
+        index = msgQueue.get_key_index(ack)
+        msgQueue.get_msg(index + 1)
+    lookup = (time.perf_counter() - start) / LOOKUPS * 1e6
+    msgQueue.close()
+    return setup, lookup
+
+
+def main(mss):
+    workDir = tempfile.mkdtemp(prefix='stp-msgqueue-')
+    try:
+        print('{:<10}{:>12}{:>14}{:>16}'.format('queue', 'file bytes', 'setup (s)', 'us per ACK'))
+        for queueType, name in ((linearQueue, 'linear'), (message.STPSegmentSource, 'source')):
+            for fileSize in FILE_SIZES:
+                if queueType is linearQueue and fileSize > LINEAR_LIMIT:
+                    break
+                ''' a sparse file, so the large sizes take no disk space '''
+                filename = os.path.join(workDir, '{}.bin'.format(fileSize))
+                with open(filename, 'wb') as f:
+                    f.truncate(fileSize)
+                setup, lookup = measure(queueType, filename, mss)
+                print('{:<10}{:>12}{:>14.3f}{:>16.2f}'.format(name, fileSize, setup, lookup))
+    finally:
+        shutil.rmtree(workDir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000)
@@ -0,0 +1,58 @@
+#! /usr/bin/env python3.6
+
+'''
+    Datagram Batch Benchmark - packets/s over loopback by batch size and payload size
+
+    python3.6 benchmarks/pps.py [packets per case]
+
+    A batch size of 1 is the unbatched path (sendto/recvfrom per datagram), larger batches
+    use sendmmsg/recvmmsg where available. Each burst of a batch is sent then received.
+    Datagrams are sent as the sender sends segments - a header and a payload sliced from
+    a memory map, gathered by the kernel without copying the payload.
+'''
+
+import os, sys, mmap, time, socket
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from classes import batch
+
+BATCH_SIZES = [1, 8, 32]
+PAYLOAD_SIZES = [100, 1000]
+BURST = 32
+HEADER_SIZE = 11
+
+
+def pps(batchSize, size, packets):
+    ''' return packets/s sending and receiving packets of size with batchSize '''
+    receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    receiver.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 22)
+    receiver.bind(('127.0.0.1', 0))
+    sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sender.bind(('127.0.0.1', 0))
+    try:
+        sendIO, recvIO = batch.STPBatchIO(sender, batchSize), batch.STPBatchIO(receiver, batchSize)
+        payloads = memoryview(mmap.mmap(-1, size * BURST))
+        header = bytes(HEADER_SIZE)
+        burst = [([header, payloads[i * size:(i + 1) * size]], receiver.getsockname()) for i in range(BURST)]
+        received = 0
+        start = time.perf_counter()
+        for sent in range(BURST, packets + 1, BURST):
+            sendIO.send(burst)
+            while received < sent:
+                datagrams = recvIO.recv(1)
+                assert datagrams, "Datagrams lost on loopback"
+                received += len(datagrams)
+        return received / (time.perf_counter() - start)
+    finally:
+        sender.close()
+        receiver.close()
+
+
+def main(packets):
+    print('mmsg {}'.format('available' if batch.MMSG is not None else 'not available - batches loop'))
+    print('{:<10}'.format('batch') + ''.join('{:>12}'.format('{} B'.format(size)) for size in PAYLOAD_SIZES))
+    for batchSize in BATCH_SIZES:
+        print('{:<10}'.format(batchSize) + ''.join('{:>12.0f}'.format(pps(batchSize, size, packets)) for size in PAYLOAD_SIZES))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50000)
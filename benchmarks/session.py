@@ -0,0 +1,75 @@
+#! /usr/bin/env python3.6
+
+'''
+    Session Benchmark - files per second, one multi-file session against one sender per file
+
+    python3.6 benchmarks/session.py [files] [file KB]
+
+    A directory of small random files is sent once as a session over a single connection,
+    then file by file with a sender process (handshake, window fill and teardown) per file
+    to one receiver serving that many connections. Both trees received are compared.
+'''
+
+import os, sys, time, shutil, filecmp, tempfile, subprocess
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from cpu import ROOT
+
+PORT = 7900
+''' MWS MSS gamma pDrop pDuplicate pCorrupt pOrder maxOrder pDelay maxDelay seed '''
+PLD = ['50000', '1000', '4', '0', '0', '0', '0', '3', '0', '20', '50']
+
+
+def make_files(root, files, sizeKB):
+    ''' create files random files of sizeKB in subdirectories of root, returns their relative names '''
+    names = []
+    for n in range(files):
+        name = os.path.join('d{}'.format(n % 10), 'f{}.bin'.format(n))
+        os.makedirs(os.path.join(root, os.path.dirname(name)), exist_ok=True)
+        with open(os.path.join(root, name), 'wb') as f:
+            f.write(os.urandom(int(sizeKB * 1000)))
+        names.append(name)
+    return names
+
+
+def transfer(workDir, sources, output, port, connections):
+    ''' send each source with its own sender to one receiver serving connections, returns wall seconds '''
+    receiver = subprocess.Popen([sys.executable, os.path.join(ROOT, 'receiver.py'), str(port), output, 'log=summary', 'connections={}'.format(connections)],
+        cwd=workDir, stdout=subprocess.DEVNULL)
+    time.sleep(0.5)
+    try:
+        start = time.perf_counter()
+        for source in sources:
+            subprocess.run([sys.executable, os.path.join(ROOT, 'sender.py'), '127.0.0.1', str(port), source] + PLD + ['log=summary'],
+                cwd=workDir, stdout=subprocess.DEVNULL, timeout=600)
+        wall = time.perf_counter() - start
+        receiver.wait(timeout=60)
+    finally:
+        if receiver.poll() is None:
+            receiver.kill()
+    return wall
+
+
+def main(files, sizeKB):
+    workDir = tempfile.mkdtemp(prefix='stp-session-')
+    try:
+        names = make_files(os.path.join(workDir, 'src'), files, sizeKB)
+
+        sessionWall = transfer(workDir, ['src'], 'session', PORT, 1)
+        for name in names:
+            assert filecmp.cmp(os.path.join(workDir, 'src', name), os.path.join(workDir, 'session', name), shallow=False), "Session file differs: " + name
+
+        ''' a receiver serving one connection per file numbers them in order '''
+        fileWall = transfer(workDir, [os.path.join('src', name) for name in names], os.path.join('single', '{n}.bin'), PORT + 1, files)
+        for n, name in enumerate(names, 1):
+            assert filecmp.cmp(os.path.join(workDir, 'src', name), os.path.join(workDir, 'single', '{}.bin'.format(n)), shallow=False), "File differs: " + name
+
+        print('{:<18}{:>8}{:>10}{:>10}{:>12}'.format('mode', 'files', 'file KB', 'wall (s)', 'files/s'))
+        print('{:<18}{:>8}{:>10}{:>10.2f}{:>12.1f}'.format('session', files, sizeKB, sessionWall, files / sessionWall))
+        print('{:<18}{:>8}{:>10}{:>10.2f}{:>12.1f}'.format('process per file', files, sizeKB, fileWall, files / fileWall))
+    finally:
+        shutil.rmtree(workDir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200,
+        float(sys.argv[2]) if len(sys.argv) > 2 else 4)
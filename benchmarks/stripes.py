@@ -0,0 +1,67 @@
+#! /usr/bin/env python3.6
+
+'''
+    Stripe Benchmark - goodput of one file striped over N sender processes and connections
+
+    python3.6 benchmarks/stripes.py [file MB] [stripes ...]
+
+    The file is sent with stripes=N to a receiver with N workers sharing the port, so each
+    stripe may be served by its own process (the kernel hashes the senders' ports to the
+    workers, so two stripes can share one). Loopback is lossless, so throughput is bound by
+    sender and receiver CPU and stripe counts above the number of cores cannot scale further.
+'''
+
+import os, sys, glob, time, shutil, filecmp, tempfile, subprocess
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from cpu import ROOT
+
+PORT = 7950
+STRIPES = [1, 2, 3, 4, 5, 6, 7, 8]
+''' MWS MSS gamma pDrop pDuplicate pCorrupt pOrder maxOrder pDelay maxDelay seed '''
+PLD = ['200000', '8000', '4', '0', '0', '0', '0', '3', '0', '20', '50']
+
+
+def transfer(workDir, stripes, port):
+    ''' send in.bin striped over stripes connections to a receiver with as many workers, returns wall seconds '''
+    receiver = subprocess.Popen([sys.executable, os.path.join(ROOT, 'receiver.py'), str(port), os.path.join('out', '{group}.bin'), 'log=summary',
+        'connections={}'.format(stripes), 'workers={}'.format(stripes)], cwd=workDir, stdout=subprocess.DEVNULL)
+    time.sleep(1)
+    try:
+        start = time.perf_counter()
+        subprocess.run([sys.executable, os.path.join(ROOT, 'sender.py'), '127.0.0.1', str(port), 'in.bin'] + PLD + ['log=summary', 'stripes={}'.format(stripes)],
+            cwd=workDir, stdout=subprocess.DEVNULL, timeout=600)
+        wall = time.perf_counter() - start
+        receiver.wait(timeout=60)
+    finally:
+        if receiver.poll() is None:
+            receiver.kill()
+    return wall
+
+
+def main(sizeMB, stripes):
+    workDir = tempfile.mkdtemp(prefix='stp-stripes-')
+    try:
+        source = os.path.join(workDir, 'in.bin')
+        with open(source, 'wb') as f:
+            f.write(os.urandom(int(sizeMB * 1e6)))
+
+        print('{:.0f} MB file, {} cores'.format(sizeMB, os.cpu_count()))
+        print('{:<10}{:>10}{:>10}{:>10}'.format('stripes', 'wall (s)', 'MB/s', 'speedup'))
+        port = PORT
+        base = None
+        for count in stripes:
+            wall = transfer(workDir, count, port)
+            port += 1
+            ''' the output file is named by the stripe group, which is random per file '''
+            outputs = glob.glob(os.path.join(workDir, 'out', '*.bin'))
+            assert len(outputs) == 1 and filecmp.cmp(source, outputs[0], shallow=False), "Transferred file differs"
+            shutil.rmtree(os.path.join(workDir, 'out'))
+            base = base or wall
+            print('{:<10}{:>10.2f}{:>10.2f}{:>10.2f}'.format(count, wall, sizeMB / wall, base / wall))
+    finally:
+        shutil.rmtree(workDir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main(float(sys.argv[1]) if len(sys.argv) > 1 else 64,
+        [int(count) for count in sys.argv[2:]] or STRIPES)
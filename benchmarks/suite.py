@@ -0,0 +1,225 @@
+#! /usr/bin/env python3.6
+
+'''
+    Benchmark Suite - throughput, latency and cost of transfers over a matrix of parameters
+
+    python3.6 benchmarks/suite.py [matrix=quick|full] [repeat=3] [output=results.json]
+        [baseline=benchmarks/baseline.json] [threshold=0.15] [save=on|off] [sender option=value ...]
+
+    Each case runs receiver.py and sender.py on loopback with a random file and records the
+    wall time, goodput, segments and retransmissions from the sender log, CPU seconds and
+    peak RSS of each process. A case is run repeat times and the median run is kept (the
+    1 KB file is the latency case, its wall time is the handshake, one segment and teardown).
+
+    The quick matrix varies one parameter at a time from the base case, the full matrix is
+    the product of SIZES, MSS, MWS, GAMMA and PLD. Results are written as JSON and compared
+    with the baseline by case name: goodput lower, or CPU per MB or peak RSS higher, by more
+    than threshold is a regression and the run exits with status 1. save=on writes the
+    results as the new baseline instead. Remaining name=value arguments (mode=sr sack=on)
+    are passed to every sender.
+'''
+
+import os, sys, json, time, shutil, filecmp, platform, tempfile, threading, subprocess, statistics
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from cpu import ROOT
+
+PORT = 8000
+TIMEOUT = 600
+BASELINE = os.path.join(ROOT, 'benchmarks', 'baseline.json')
+
+''' file MB, MSS, MWS, gamma and (pDrop, pDuplicate, pCorrupt, pOrder, pDelay) of the base case '''
+BASE = {'size': 1, 'mss': 1000, 'mws': 50000, 'gamma': 4, 'pld': 'lossless'}
+SIZES = [0.001, 1, 4]
+MSS = [500, 1000, 4000]
+MWS = [5000, 50000, 200000]
+GAMMA = [2, 4, 8]
+PLD = {
+    'lossless': ('0', '0', '0', '0', '0'),
+    'drop': ('0.02', '0', '0', '0', '0'),
+    'duplicate': ('0', '0.02', '0', '0', '0'),
+    'corrupt': ('0', '0', '0.02', '0', '0'),
+    'order': ('0', '0', '0', '0.05', '0'),
+    'delay': ('0', '0', '0', '0', '0.02'),
+}
+MAX_ORDER = '3'
+MAX_DELAY = '20'
+SEED = '50'
+
+''' metrics compared with the baseline - True if higher is better '''
+COMPARED = {'goodput': True, 'cpu_per_mb': False, 'peak_rss_kb': False}
+''' sender log lines recorded '''
+SENDER_RESULTS = {
+    'segments': 'Segments transmitted (including drop & RXT)',
+    'timeout_retransmissions': 'Number of Retransmissions due to TIMEOUT',
+    'fast_retransmissions': 'Number of FAST RETRANSMISSION',
+    'payload_ratio': 'Payload bytes transmitted per file byte',
+}
+
+
+def case_name(case):
+    ''' return the name a case is stored under in the results and baseline '''
+    return 'size={size}MB mss={mss} mws={mws} gamma={gamma} pld={pld}'.format(**case)
+
+
+def matrix(kind):
+    ''' return the cases of the quick (one parameter at a time from BASE) or full (product of all) matrix '''
+    axes = [('size', SIZES), ('mss', MSS), ('mws', MWS), ('gamma', GAMMA), ('pld', list(PLD))]
+    if kind == 'full':
+        cases = [{}]
+        for key, values in axes:
+            cases = [dict(case, **{key: value}) for case in cases for value in values]
+    else:
+        cases = [dict(BASE)]
+        for key, values in axes:
+            cases += [dict(BASE, **{key: value}) for value in values if value != BASE[key]]
+        ''' gamma only sets the timeout, so it is varied with losses '''
+        cases = [dict(case, pld='drop') if case['gamma'] != BASE['gamma'] else case for case in cases]
+    return cases
+
+
+def pld_arguments(case):
+    ''' MWS MSS gamma pDrop pDuplicate pCorrupt pOrder maxOrder pDelay maxDelay seed '''
+    pDrop, pDuplicate, pCorrupt, pOrder, pDelay = PLD[case['pld']]
+    return [str(case['mws']), str(case['mss']), str(case['gamma']), pDrop, pDuplicate, pCorrupt, pOrder, MAX_ORDER, pDelay, MAX_DELAY, SEED]
+
+
+def wait_usage(process, timeout=TIMEOUT):
+    ''' wait for a process (killed after timeout seconds), returns its exit status and resource usage '''
+    timer = threading.Timer(timeout, process.kill)
+    timer.start()
+    try:
+        pid, status, usage = os.wait4(process.pid, 0)
+    finally:
+        timer.cancel()
+    process.returncode = os.WEXITSTATUS(status) if os.WIFEXITED(status) else -os.WTERMSIG(status)
+    return process.returncode, usage
+
+
+def sender_results(path):
+    ''' return the SENDER_RESULTS read from the results of a sender log '''
+    values = {}
+    with open(path) as f:
+        for line in f:
+            for key, label in SENDER_RESULTS.items():
+                if line.startswith(label):
+                    values[key] = float(line[len(label):])
+    return values
+
+
+def run(case, port, options=()):
+    ''' transfer a random file for a case, returns its metrics '''
+    workDir = tempfile.mkdtemp(prefix='stp-suite-')
+    try:
+        size = max(int(case['size'] * 1e6), 1)
+        source = os.path.join(workDir, 'in.bin')
+        with open(source, 'wb') as f:
+            f.write(os.urandom(size))
+        receiver = subprocess.Popen([sys.executable, os.path.join(ROOT, 'receiver.py'), str(port), 'out.bin', 'log=summary'],
+            cwd=workDir, stdout=subprocess.DEVNULL)
+        time.sleep(0.5)
+        try:
+            start = time.perf_counter()
+            sender = subprocess.Popen([sys.executable, os.path.join(ROOT, 'sender.py'), '127.0.0.1', str(port), 'in.bin'] + pld_arguments(case) +
+                ['log=summary'] + list(options), cwd=workDir, stdout=subprocess.DEVNULL)
+            senderStatus, senderUsage = wait_usage(sender)
+            wall = time.perf_counter() - start
+            receiverStatus, receiverUsage = wait_usage(receiver, 60)
+        finally:
+            if receiver.returncode is None:
+                receiver.kill()
+                wait_usage(receiver)
+
+        assert senderStatus == 0 and receiverStatus == 0, "Transfer failed ({}, {})".format(senderStatus, receiverStatus)
+        assert filecmp.cmp(source, os.path.join(workDir, 'out.bin'), shallow=False), "Transferred file differs"
+        senderCPU = senderUsage.ru_utime + senderUsage.ru_stime
+        receiverCPU = receiverUsage.ru_utime + receiverUsage.ru_stime
+        metrics = {
+            'wall': wall,
+            'goodput': size / 1e6 / wall,
+            'sender_cpu': senderCPU,
+            'receiver_cpu': receiverCPU,
+            'cpu_per_mb': (senderCPU + receiverCPU) / (size / 1e6),
+            'peak_rss_kb': max(senderUsage.ru_maxrss, receiverUsage.ru_maxrss), # ru_maxrss is in KB on Linux
+        }
+        metrics.update(sender_results(os.path.join(workDir, 'Sender_log')))
+        return metrics
+    finally:
+        shutil.rmtree(workDir, ignore_errors=True)
+
+
+def compare(results, baseline, threshold):
+    ''' return the regressions of results against a baseline - (case, metric, baseline, result, change) '''
+    regressions = []
+    for name, metrics in results['cases'].items():
+        previous = baseline['cases'].get(name)
+        if previous is None:
+            continue
+        for metric, higherBetter in COMPARED.items():
+            if not previous.get(metric):
+                continue
+            change = (metrics[metric] - previous[metric]) / previous[metric]
+            if (-change if higherBetter else change) > threshold:
+                regressions.append((name, metric, previous[metric], metrics[metric], change))
+    return regressions
+
+
+def report(results, baseline):
+    ''' print the results of each case, with the goodput change against the baseline '''
+    print('{:<58}{:>9}{:>9}{:>6}{:>9}{:>9}{:>10}'.format('case', 'wall (s)', 'MB/s', 'RXT', 'CPU s/MB', 'RSS MB', 'vs base'))
+    for name, metrics in results['cases'].items():
+        previous = (baseline or {'cases': {}})['cases'].get(name)
+        change = '{:+.1%}'.format(metrics['goodput'] / previous['goodput'] - 1) if previous else '-'
+        retransmissions = metrics.get('timeout_retransmissions', 0) + metrics.get('fast_retransmissions', 0)
+        print('{:<58}{:>9.3f}{:>9.2f}{:>6.0f}{:>9.3f}{:>9.1f}{:>10}'.format(name, metrics['wall'], metrics['goodput'], retransmissions,
+            metrics['cpu_per_mb'], metrics['peak_rss_kb'] / 1024, change))
+
+
+def main(options):
+    kind = options.pop('matrix', 'quick')
+    repeat = int(options.pop('repeat', 3))
+    output = options.pop('output', 'results.json')
+    baselinePath = options.pop('baseline', BASELINE)
+    threshold = float(options.pop('threshold', 0.15))
+    save = options.pop('save', 'off') == 'on'
+    senderOptions = ['{}={}'.format(name, value) for name, value in options.items()]
+
+    results = {'python': platform.python_version(), 'machine': platform.machine(), 'cores': os.cpu_count(),
+        'sender_options': senderOptions, 'repeat': repeat, 'cases': {}}
+    port = PORT
+    for case in matrix(kind):
+        runs = []
+        for n in range(repeat):
+            runs.append(run(case, port, senderOptions))
+            port += 1
+        ''' keep the run of median wall time '''
+        walls = [metrics['wall'] for metrics in runs]
+        results['cases'][case_name(case)] = dict(runs[walls.index(statistics.median_low(walls))], **case)
+
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+
+    if save:
+        shutil.copyfile(output, baselinePath)
+        report(results, None)
+        print('Baseline saved to {}'.format(baselinePath))
+        return 0
+
+    baseline = None
+    if os.path.exists(baselinePath):
+        with open(baselinePath) as f:
+            baseline = json.load(f)
+    report(results, baseline)
+    if baseline is None:
+        print('No baseline at {} (save=on stores one)'.format(baselinePath))
+        return 0
+    if baseline.get('sender_options') != senderOptions:
+        print('Baseline sender options {} differ from {}'.format(baseline.get('sender_options'), senderOptions))
+
+    regressions = compare(results, baseline, threshold)
+    for name, metric, previous, value, change in regressions:
+        print('REGRESSION {}: {} {:.4g} -> {:.4g} ({:+.1%})'.format(name, metric, previous, value, change))
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(dict(argument.split('=', 1) for argument in sys.argv[1:])))
@@ -0,0 +1,36 @@
+#! /usr/bin/env python3.6
+
+'''
+    Worker Benchmark - aggregate goodput of the multi-process receiver by worker count
+
+    python3.6 benchmarks/workers.py [file MB] [senders] [workers ...]
+
+    The receiver runs workers processes sharing the port with SO_REUSEPORT, serving
+    senders concurrent lossless transfers with a large window, so throughput is bound by
+    receiver CPU. Worker counts above the number of cores cannot scale further.
+'''
+
+import os, sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from load import run
+
+PORT = 7600
+WORKERS = [1, 2, 4]
+''' MWS MSS gamma pDrop pDuplicate pCorrupt pOrder maxOrder pDelay maxDelay seed, sender options '''
+PLD = ['50000', '1000', '4', '0', '0', '0', '0', '3', '0', '20', '50', 'sack=on', 'cc=reno']
+
+
+def main(sizeMB, senders, workers):
+    print('{} senders, {} cores'.format(senders, os.cpu_count()))
+    print('{:<10}{:>10}{:>16}'.format('workers', 'wall (s)', 'aggregate MB/s'))
+    port = PORT
+    for count in workers:
+        wall = run(sizeMB, senders, port, PLD, ['workers={}'.format(count)])
+        port += 1
+        print('{:<10}{:>10.2f}{:>16.3f}'.format(count, wall, senders * sizeMB / wall))
+
+
+if __name__ == "__main__":
+    main(float(sys.argv[1]) if len(sys.argv) > 1 else 1,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 8,
+        [int(count) for count in sys.argv[3:]] or WORKERS)
@@ -0,0 +1,314 @@
+#! /usr/bin/env python3.6
+
+import asyncio
+from classes import defines,protocol,message,log,sockopts
+
+
+'''
+    asyncio transport for STP
+
+    The STPSender and STPReceiver state machines driven by an asyncio.DatagramProtocol
+    instead of blocking sockets and threads. Retransmission timeouts and PLD delays are
+    loop timers, so many connections can share one event loop, ie:
+
+        sender = aio.STPAsyncSender(arguments.senderArgs(argv))
+        await sender.connect()
+        await sender.send_file()
+
+        receiver = aio.STPAsyncReceiver(arguments.receiverArgs(argv))
+        await receiver.serve()
+
+    The async senders of a process share one sender log unless given their own logFile, so
+    many connections on a loop write one Sender_log from one writer thread. A shared log
+    keeps the totals of its senders - the results written at each teardown are those so far.
+'''
+
+
+_SenderLog = None # sender log shared by the async senders of this process
+
+
+def shared_SenderLog():
+    ''' return the sender log shared by the async senders of this process (created on first use) '''
+    global _SenderLog
+    if _SenderLog is None:
+        _SenderLog = log.senderSTPLogs()
+    return _SenderLog
+
+
+
+class STPAsyncSender(protocol.STPSender, asyncio.DatagramProtocol):
+    ''' Sender Client on an asyncio event loop '''
+    def __init__(self,args,logFile=None):
+        protocol.STPSender.__init__(self,logFile if logFile is not None else shared_SenderLog())
+        self.set_Args(args)
+        self._Loop = None
+        self._Transport = None
+        self._Uploading = False
+        self._Done = None # resolved once every segment is ACK'd
+        self._Waiter = None # (predicate,future) for the next expected handshake/teardown msg
+        self._TimeoutHandle = None
+
+
+    def is_Uploading(self):
+        ''' return True while the file transfer is in progress '''
+        return self._Uploading
+
+
+    def call_later(self,delay,callback,*args):
+        ''' call callback(*args) after delay seconds on the event loop '''
+        self._Loop.call_later(delay,callback,*args)
+
+
+    def transmit(self,msg,corrupt=False):
+        ''' Sends msg to the receiver through the datagram transport '''
+        if self._Transport is not None:
+            msg.set_Wide(self.wide_Header(msg.get_Recipient()))
+            self._Transport.sendto(b''.join(msg.packInto(self._Header,corrupt)))
+
+
+    def connection_made(self,transport):
+        ''' datagram endpoint created - size its socket buffers '''
+        self._Transport = transport
+        self._Socket = transport.get_extra_info('socket')
+        self.init_SocketBuffers()
+
+
+    def datagram_received(self,packet,sender):
+        ''' handle a received packet '''
+        msg = self.receive(packet,sender)
+        if msg is None:
+            return
+
+        if self._Waiter is not None:
+            predicate, future = self._Waiter
+            if predicate(msg) and not future.done():
+                self._Waiter = None
+                future.set_result(msg)
+            return
+
+        if self._Uploading and msg.is_ACK():
+            self._Uploading = self.update_window(msg)
+            if not self._Uploading:
+                self.cancel_Timeout()
+                if not self._Done.done():
+                    self._Done.set_result(True)
+                return
+            self.sendMsgWindow()
+            self.schedule_Timeout()
+
+
+    def error_received(self,err):
+        ''' datagram send/receive error (ie ICMP port unreachable) '''
+        log.message.error("error_received","{}".format(err))
+
+
+    def expect(self,predicate):
+        ''' returns a future resolved by the next msg matching predicate '''
+        future = self._Loop.create_future()
+        self._Waiter = (predicate,future)
+        return future
+
+
+    def schedule_Timeout(self):
+        ''' (re)schedule the retransmission timeout on the loop '''
+        self.cancel_Timeout()
+        remaining = self.get_TimeoutRemaining()
+        if remaining is not None:
+            self._TimeoutHandle = self._Loop.call_later(remaining,self.on_Timeout)
+
+
+    def cancel_Timeout(self):
+        ''' cancel the scheduled retransmission timeout '''
+        if self._TimeoutHandle is not None:
+            self._TimeoutHandle.cancel()
+            self._TimeoutHandle = None
+
+
+    def on_Timeout(self):
+        ''' Timeout Event - Retransmit expired msgs and send any new msgs '''
+        self._TimeoutHandle = None
+        if self._Uploading:
+            self.retransmit_Timeout()
+            self.sendMsgWindow()
+            self.schedule_Timeout()
+
+
+    async def connect(self,loop=None):
+        ''' create the datagram endpoint and carry out handshake '''
+        self._Loop = loop if loop is not None else asyncio.get_event_loop()
+        self.init_window_frame()
+        await self._Loop.create_datagram_endpoint(lambda: self,remote_addr=self.get_Args().get_receiver())
+        await self.handShake()
+
+
+    async def handShake(self):
+        ''' Initiate Handshake With Receiver Connection '''
+        log.message.info("Handshake Initiated")
+        msg = message.STPMessage()
+        msg.set_Recipient(self.get_Args().get_receiver())
+        seqNum = self.get_SequenceNumber()
+        msg.set_ACKNumber(0)
+        msg.set_SequenceNumber(seqNum)
+
+        ''' store next sequence number we expect from the server '''
+        seqNum = self.set_SequenceNumber(seqNum+1)
+        features = self.request_Features(msg)
+
+        ''' Send and wait for SYN ACK Response - resend the SYN each (backed off) timeout '''
+        response = self.expect(lambda msg: msg.is_SYNACK() and msg.get_ACKNumber() == seqNum)
+        timer = self.get_Timer()
+        self.sendSYN(msg)
+        while not response.done():
+            try:
+                await asyncio.wait_for(asyncio.shield(response),timer.get_timeoutInterval()/1000)
+            except asyncio.TimeoutError:
+                log.message.info("Handshake Timeout - resending SYN")
+                timer.backoff_Timeout()
+                self.sendSYN(msg)
+        msg = response.result()
+        self.get_LogFile().toFile("rcv",self.get_TimePassed(),msg.getType(),msg.get_SequenceNumber(),len(msg.get_Payload()),msg.get_ACKNumber())
+        self.accept_Features(features,msg)
+
+        ''' Send ACK Response '''
+        ackMSG = msg.createACKResponse(1)
+        self.sendACK(ackMSG)
+        self.set_AckNumber(ackMSG.get_ACKNumber())
+        log.message.success("Connection Established")
+
+
+    async def send_file(self,filename=None):
+        ''' transfer filename (default the filename argument) and tear down the connection '''
+        logFile = self.get_LogFile()
+        sent = logFile.get_FileSize() # bytes of the senders sharing the log before us
+        self.init_msg_queue(filename)
+        logFile.set_FileSize(sent + logFile.get_FileSize())
+        self.init_PLD()
+        self._Done = self._Loop.create_future()
+        self._Uploading = self.get_MsgWindow().get_msgQueue().get_length() > 0
+        if self._Uploading:
+            self.sendMsgWindow()
+            self.schedule_Timeout()
+            await self._Done
+        await self.tearDown()
+
+
+    async def tearDown(self):
+        ''' Complete Connection Teardown '''
+        log.message.info("TearDown Initiated")
+        logFile = self.get_LogFile()
+        msg = message.STPMessage()
+        msg.set_Recipient(self.get_Args().get_receiver())
+        msg.set_ACKNumber(self.get_AckNumber())
+        seqNum = self.get_SequenceNumber()
+        msg.set_SequenceNumber(seqNum)
+        seqNum = self.set_SequenceNumber(seqNum+1)
+
+        ''' Send FIN MSG - FIN_WAIT_1 (old delayed ACKs are dropped) '''
+        response = self.expect(lambda msg: msg.is_ACK() and msg.get_ACKNumber() == seqNum)
+        self.sendFIN(msg)
+        msg = await response
+        logFile.toFile("rcv",self.get_TimePassed(),msg.getType(),msg.get_SequenceNumber(),len(msg.get_Payload()),msg.get_ACKNumber())
+
+        ''' FIN_WAIT_2 '''
+        msg = await self.expect(lambda msg: msg.is_FIN())
+        logFile.toFile("rcv",self.get_TimePassed(),msg.getType(),msg.get_SequenceNumber(),len(msg.get_Payload()),msg.get_ACKNumber())
+
+        ''' Send ACK Response '''
+        msg.set_ACKNumber(msg.get_SequenceNumber()+1)
+        msg.set_SequenceNumber(seqNum)
+        self.set_SequenceNumber(seqNum+1)
+        msg.resetFlag()
+        self.sendACK(msg)
+
+        logFile.writeResults()
+        self.get_MsgWindow().get_msgQueue().close()
+        self._Transport.close()
+        log.message.success("Connection Terminated")
+
+
+
+class STPAsyncReceiver(protocol.STPReceiver, asyncio.DatagramProtocol):
+    ''' Receiver Server on an asyncio event loop - serves many connections '''
+    def __init__(self,args,logFile=None):
+        protocol.STPReceiver.__init__(self,logFile)
+        self.set_Receiver(args.get_receiver())
+        self.set_Args(args)
+        self._Transport = None
+        self._Closed = None
+        self._Loop = None
+        self._ACKHandle = None # loop timer for the next delayed ACK
+        self._ACKDue = None # loop time the timer fires
+
+
+    def transmit(self,msg,corrupt=False):
+        ''' Sends msg to its recipient through the datagram transport '''
+        if self._Transport is not None:
+            msg.set_Wide(self.wide_Header(msg.get_Recipient()))
+            self._Transport.sendto(b''.join(msg.packInto(self._Header,corrupt)),msg.get_Recipient())
+
+
+    def schedule_DelayedACKs(self):
+        ''' start the loop timer for the next delayed ACK - kept if it fires no later than the ACK is due '''
+        remaining = self.get_DelayedACKTimeout()
+        if remaining is None or self._Loop is None:
+            return
+        due = self._Loop.time() + remaining
+        if self._ACKHandle is not None:
+            if self._ACKDue <= due:
+                return
+            self._ACKHandle.cancel()
+        self._ACKDue = due
+        self._ACKHandle = self._Loop.call_at(due,self.on_DelayedACK)
+
+
+    def on_DelayedACK(self):
+        ''' Delayed ACK timer - send the ACKs that are due '''
+        self._ACKHandle = None
+        self.send_DelayedACKs()
+        self.schedule_DelayedACKs()
+
+
+    def connection_made(self,transport):
+        ''' datagram endpoint created - size its socket buffers '''
+        self._Transport = transport
+        self._Socket = transport.get_extra_info('socket')
+        self.init_SocketBuffers()
+        self._KernelDrops = sockopts.kernel_drops(self._Socket)
+
+
+    def datagram_received(self,packet,sender):
+        ''' handle a received packet for its connection '''
+        msg = self.receive(packet,sender)
+        if msg is not None:
+            self.process(msg)
+            self.schedule_DelayedACKs()
+
+
+    def error_received(self,err):
+        ''' datagram send/receive error (ie ICMP port unreachable) '''
+        log.message.error("error_received","{}".format(err))
+
+
+    def connection_lost(self,err):
+        ''' datagram endpoint closed '''
+        if self._Closed is not None and not self._Closed.done():
+            self._Closed.set_result(True)
+
+
+    async def serve(self,loop=None):
+        ''' serve connections until close() is called '''
+        loop = loop if loop is not None else asyncio.get_event_loop()
+        self._Loop = loop
+        self._Closed = loop.create_future()
+        await loop.create_datagram_endpoint(lambda: self,local_addr=self._Receiver)
+        log.message.info("Awaiting Connection")
+        await self._Closed
+
+
+    def close(self):
+        ''' stop serving connections '''
+        self.finish_Serving()
+        if self._ACKHandle is not None:
+            self._ACKHandle.cancel()
+        if self._Transport is not None:
+            self._Transport.close()
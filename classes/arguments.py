@@ -1,9 +1,9 @@
 #! /usr/bin/env python3.6
 
 from os import sys
-import collections,ipaddress
+import collections,ipaddress,socket
 from abc import ABCMeta, abstractmethod
-from classes import defines,defines,log
+from classes import defines,defines,log,compress
 
 
 
@@ -54,6 +54,26 @@ class arg(object):
         return self._filename
 
 
+    def get_log(self):
+        ''' get argument log (verbosity) '''
+        return self._log
+
+
+    def get_batch(self):
+        ''' get argument batch (batched datagram I/O) '''
+        return self._batch
+
+
+    def get_rcvbuf(self):
+        ''' get argument rcvbuf (socket receive buffer bytes, 0 sizes it automatically) '''
+        return self._rcvbuf
+
+
+    def get_sndbuf(self):
+        ''' get argument sndbuf (socket send buffer bytes, 0 sizes it automatically) '''
+        return self._sndbuf
+
+
     def getReceipient(self):
         ''' returns tuple containing ip and port of target '''
         return ((self.get_receiver_host_ip(), self.get_receiver_port()))
@@ -70,6 +90,21 @@ class arg(object):
             setattr(self, variable, None)
 
 
+    def assignOptions(self,argv,options:dict):
+        ''' Set Optional Arguments given as name=value, otherwise their defaults '''
+        for name, default in options.items():
+            setattr(self, '_' + name, default)
+        for item in argv:
+            name, _, value = item.partition('=')
+            if name not in options:
+                log.message.error("Invalid Arguments","Unknown Option: {}".format(item))
+                sys.exit()
+            try:
+                setattr(self, '_' + name, type(options[name])(value))
+            except:
+                setattr(self, '_' + name, None)
+
+
     def printArgs(self,variable):
         ''' Print Program Arguments '''
         return "{} : {}".format(variable,getattr(self, variable))
@@ -131,6 +166,25 @@ class senderArgs(arg):
         self.assign('_maxDelay',args[12],False)
         self.assign('_seed',args[13])
 
+        ''' Optional Arguments (name=value) '''
+        self.assignOptions(argv[len(arg_names)+1:],{
+            'checksum': defines.CHECKSUM_INTERNET, # Segment checksum algorithm (internet or crc32).
+            'log': defines.LOG_FULL, # Log verbosity (full or summary).
+            'mode': defines.MODE_GBN, # Retransmission mode (gbn or sr).
+            'sack': defines.SACK_OFF, # Selective acknowledgments (on or off).
+            'cc': defines.CC_NONE, # Congestion control (none, reno, newreno or cubic).
+            'timestamps': defines.TIMESTAMPS_OFF, # Timestamp echo RTT samples (on or off).
+            'delayed_ack': defines.DELAYED_ACK_OFF, # Request delayed ACKs from the receiver (on or off).
+            'seq64': defines.SEQ64_AUTO, # 64 bit sequence numbers (auto requests them for files over 4 GiB, on or off).
+            'compress': defines.COMPRESS_OFF, # Segment compression codec (off, zlib, lzma or bz2).
+            'compress_level': defines.COMPRESS_LEVEL, # Compression level, 1 (fastest) to 9 (smallest).
+            'resume': defines.RESUME_OFF, # Resume the file where the receivers checkpoint ended (on or off).
+            'stripes': 1, # Sender processes, each sending one byte range of the file over its own connection.
+            'batch': defines.BATCH_ON, # Batched datagram I/O, recvmmsg/sendmmsg (on or off).
+            'rcvbuf': defines.SOCKET_BUFFER_AUTO, # Socket receive buffer bytes (0 sizes it for the ACKs of a window).
+            'sndbuf': defines.SOCKET_BUFFER_AUTO, # Socket send buffer bytes (0 sizes it for a window).
+        })
+
         ''' Print Arguments '''
         self.logArgs()
 
@@ -190,6 +244,61 @@ class senderArgs(arg):
         return self._seed
 
 
+    def get_checksum(self):
+        ''' get argument checksum '''
+        return self._checksum
+
+
+    def get_mode(self):
+        ''' get argument mode '''
+        return self._mode
+
+
+    def get_sack(self):
+        ''' get argument sack '''
+        return self._sack
+
+
+    def get_cc(self):
+        ''' get argument cc '''
+        return self._cc
+
+
+    def get_timestamps(self):
+        ''' get argument timestamps '''
+        return self._timestamps
+
+
+    def get_delayed_ack(self):
+        ''' get argument delayed_ack '''
+        return self._delayed_ack
+
+
+    def get_seq64(self):
+        ''' get argument seq64 '''
+        return self._seq64
+
+
+    def get_compress(self):
+        ''' get argument compress (segment compression codec) '''
+        return self._compress
+
+
+    def get_compress_level(self):
+        ''' get argument compress_level '''
+        return self._compress_level
+
+
+    def get_resume(self):
+        ''' get argument resume '''
+        return self._resume
+
+
+    def get_stripes(self):
+        ''' get argument stripes '''
+        return self._stripes
+
+
     def check(self):
         ''' Check Minimum arguments Set '''
         try:
@@ -217,6 +326,24 @@ class senderArgs(arg):
             assert(self.get_maxDelay() is not None and self.get_maxDelay() >= 0), "MaxDelay must be >= 0"
             assert(self.get_seed() is not None), "No Seed Specified"
 
+            ''' Optional Arguments '''
+            assert(self.get_checksum() in defines.CHECKSUMS), "Checksum must be one of {}".format(", ".join(defines.CHECKSUMS))
+            assert(self.get_mode() in defines.MODES), "Mode must be one of {}".format(", ".join(defines.MODES))
+            assert(self.get_sack() in defines.SACKS), "SACK must be one of {}".format(", ".join(defines.SACKS))
+            assert(self.get_cc() in defines.CCS), "CC must be one of {}".format(", ".join(defines.CCS))
+            assert(self.get_timestamps() in defines.TIMESTAMPS), "Timestamps must be one of {}".format(", ".join(defines.TIMESTAMPS))
+            assert(self.get_delayed_ack() in defines.DELAYED_ACKS), "Delayed ACK must be one of {}".format(", ".join(defines.DELAYED_ACKS))
+            assert(self.get_seq64() in defines.SEQ64S), "seq64 must be one of {}".format(", ".join(defines.SEQ64S))
+            assert(self.get_compress() in (defines.COMPRESS_OFF,) + compress.available()), "Compress must be one of {}".format(", ".join((defines.COMPRESS_OFF,) + compress.available()))
+            assert(self.get_compress_level() is not None and 1 <= self.get_compress_level() <= 9), "Compress level must be between 1 and 9"
+            assert(self.get_resume() in defines.RESUMES), "Resume must be one of {}".format(", ".join(defines.RESUMES))
+            assert(self.get_stripes() is not None and self.get_stripes() >= 1), "Stripes must be >= 1"
+            assert(self.get_stripes() == 1 or self.get_resume() == defines.RESUME_OFF), "Striped transfers are not resumable"
+            assert(self.get_batch() in defines.BATCHES), "Batch must be one of {}".format(", ".join(defines.BATCHES))
+            assert(self.get_rcvbuf() is not None and self.get_rcvbuf() >= 0), "rcvbuf must be >= 0"
+            assert(self.get_sndbuf() is not None and self.get_sndbuf() >= 0), "sndbuf must be >= 0"
+            assert(self.get_log() in defines.LOGS), "Log must be one of {}".format(", ".join(defines.LOGS))
+
         except AssertionError as e:
             log.message.error("Invalid Arguments",e)
             sys.exit()
@@ -240,12 +367,95 @@ class receiverArgs(arg):
         except:
             pass
 
+        ''' Optional Arguments (name=value) '''
+        self.assignOptions(argv[len(arg_names)+1:],{
+            'write_buffer': defines.WRITE_BUFFER_SIZE, # Bytes of in-order data buffered before writing to file.
+            'fsync': defines.FSYNC_FIN, # When to fsync the output file (never, periodic or fin).
+            'log': defines.LOG_FULL, # Log verbosity (full or summary).
+            'connections': 1, # Connections to serve before exiting (0 serves until interrupted).
+            'workers': 1, # Receiver processes sharing the port (SO_REUSEPORT).
+            'batch': defines.BATCH_ON, # Batched datagram I/O, recvmmsg/sendmmsg (on or off).
+            'rcvbuf': defines.SOCKET_BUFFER_AUTO, # Socket receive buffer bytes (0 sizes it automatically).
+            'sndbuf': defines.SOCKET_BUFFER_AUTO, # Socket send buffer bytes (0 keeps the default).
+            'ack_every': defines.ACK_EVERY, # In-order segments per delayed ACK (1 declines delayed ACKs).
+            'ack_delay': defines.ACK_DELAY, # Max milliseconds an ACK is delayed.
+            'checkpoint': defines.CHECKPOINT_INTERVAL, # Seconds between checkpoints of resumable transfers (0 declines them).
+        })
+
+
+    def get_ack_every(self):
+        ''' get argument ack_every '''
+        return self._ack_every
+
+
+    def get_ack_delay(self):
+        ''' get argument ack_delay (milliseconds) '''
+        return self._ack_delay
+
+
+    def get_checkpoint(self):
+        ''' get argument checkpoint (seconds) '''
+        return self._checkpoint
+
+
+    def get_connections(self):
+        ''' get argument connections '''
+        return self._connections
+
+
+    def get_workers(self):
+        ''' get argument workers '''
+        return self._workers
+
+
+    def single_Connection(self):
+        ''' return True if only one connection is served (logged to the server log) '''
+        return self.get_connections() == 1 and self.get_workers() == 1
+
+
+    def get_output_path(self,host,port,n,group=None):
+        ''' get the output path of the n-th connection (filename may use {host}, {port}, {n} and {group} - a stripe's group, otherwise n) '''
+        return self.get_filename().format(host=host,port=port,n=n,group=n if group is None else group)
+
+
+    def stripes_Shared(self):
+        ''' return True if the stripes of a file share its output path (filename does not use {port} or {n}) '''
+        return self.get_output_path('127.0.0.1',1,1,0) == self.get_output_path('127.0.0.1',2,2,0)
+
+
+    def get_write_buffer(self):
+        ''' get argument write_buffer '''
+        return self._write_buffer
+
+
+    def get_fsync(self):
+        ''' get argument fsync '''
+        return self._fsync
+
 
     def check(self):
         ''' Check Minimum arguments Set '''
         try:
             assert(self.get_receiver_port()),"No Port Specified"
             assert(self.get_filename()),"No File Specified"
+            assert(self.get_write_buffer() is not None and self.get_write_buffer() >= 0),"write_buffer must be >= 0"
+            assert(self.get_fsync() in defines.FSYNCS),"fsync must be one of {}".format(", ".join(defines.FSYNCS))
+            assert(self.get_log() in defines.LOGS),"log must be one of {}".format(", ".join(defines.LOGS))
+            assert(self.get_connections() is not None and self.get_connections() >= 0),"connections must be >= 0"
+            assert(self.get_batch() in defines.BATCHES),"batch must be one of {}".format(", ".join(defines.BATCHES))
+            assert(self.get_rcvbuf() is not None and self.get_rcvbuf() >= 0),"rcvbuf must be >= 0"
+            assert(self.get_sndbuf() is not None and self.get_sndbuf() >= 0),"sndbuf must be >= 0"
+            assert(self.get_ack_every() is not None and self.get_ack_every() >= 1),"ack_every must be >= 1"
+            assert(self.get_ack_delay() is not None and self.get_ack_delay() > 0),"ack_delay must be > 0"
+            assert(self.get_checkpoint() is not None and self.get_checkpoint() >= 0),"checkpoint must be >= 0"
+            try:
+                path = self.get_output_path('127.0.0.1',0,1)
+            except (KeyError,IndexError,ValueError):
+                path = None
+            assert(path is not None),"filename may only use the {host}, {port}, {n} and {group} fields"
+            assert(self.get_workers() is not None and self.get_workers() >= 1),"workers must be >= 1"
+            assert(self.get_workers() == 1 or hasattr(socket,'SO_REUSEPORT')),"workers requires SO_REUSEPORT"
+            assert(self.single_Connection() or path != self.get_output_path('127.0.0.1',1,2)),"filename must use {host}, {port}, {n} or {group} to serve more than one connection"
 
         except AssertionError as e:
             print("Invalid arguments: ",e)
@@ -0,0 +1,314 @@
+#! /usr/bin/env python3.6
+
+import ctypes, ctypes.util, errno, os, selectors, socket, struct, sys, threading
+from socket import inet_aton, inet_ntoa, htons, ntohs, AF_INET
+from classes import defines
+
+''' non-blocking receive flag is not available on all platforms (ie Windows) '''
+MSG_DONTWAIT = getattr(socket,'MSG_DONTWAIT',None)
+''' scatter-gather sends are not available on all platforms (ie Windows) '''
+SENDMSG = hasattr(socket.socket,'sendmsg')
+
+
+'''
+    Batched Datagram I/O
+
+    recvmmsg(2) drains up to a batch of pending datagrams in one system call and
+    sendmmsg(2) sends a batch of datagrams in one, so at a small MSS a burst of
+    segments or ACKs costs one system call rather than one per packet. Both are
+    called through ctypes on Linux; elsewhere each batch is a loop of recvfrom/sendmsg.
+
+    A datagram is sent as its [header, payload] buffers. The header is copied into a slot
+    of the batch (the sender reuses one header buffer), while a payload larger than COPY_BREAK
+    - ie a slice of the memory mapped file - is gathered by the kernel from where it is, not
+    copied. Smaller payloads are copied into the slot with the header, as addressing a buffer
+    in place (through ctypes) costs more than copying it.
+'''
+
+
+class iovec(ctypes.Structure):
+    _fields_ = [('iov_base',ctypes.c_void_p),('iov_len',ctypes.c_size_t)]
+
+
+class msghdr(ctypes.Structure):
+    _fields_ = [
+        ('msg_name',ctypes.c_void_p),
+        ('msg_namelen',ctypes.c_uint32),
+        ('msg_iov',ctypes.POINTER(iovec)),
+        ('msg_iovlen',ctypes.c_size_t),
+        ('msg_control',ctypes.c_void_p),
+        ('msg_controllen',ctypes.c_size_t),
+        ('msg_flags',ctypes.c_int)]
+
+
+class mmsghdr(ctypes.Structure):
+    _fields_ = [('msg_hdr',msghdr),('msg_len',ctypes.c_uint)]
+
+
+class Py_buffer(ctypes.Structure):
+    _fields_ = [
+        ('buf',ctypes.c_void_p),
+        ('obj',ctypes.c_void_p),
+        ('len',ctypes.c_ssize_t),
+        ('itemsize',ctypes.c_ssize_t),
+        ('readonly',ctypes.c_int),
+        ('ndim',ctypes.c_int),
+        ('format',ctypes.c_char_p),
+        ('shape',ctypes.c_void_p),
+        ('strides',ctypes.c_void_p),
+        ('suboffsets',ctypes.c_void_p),
+        ('internal',ctypes.c_void_p)]
+
+
+class sockaddr_in(ctypes.Structure):
+    _fields_ = [
+        ('sin_family',ctypes.c_ushort),
+        ('sin_port',ctypes.c_uint16), # network byte order
+        ('sin_addr',ctypes.c_uint8 * 4),
+        ('sin_zero',ctypes.c_uint8 * 8)]
+
+
+def load_mmsg():
+    ''' return the libc (recvmmsg, sendmmsg) functions, or None if not available '''
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c'),use_errno=True)
+        recvmmsg, sendmmsg = libc.recvmmsg, libc.sendmmsg
+    except (OSError, AttributeError):
+        return None
+    recvmmsg.argtypes = [ctypes.c_int,ctypes.POINTER(mmsghdr),ctypes.c_uint,ctypes.c_int,ctypes.c_void_p]
+    recvmmsg.restype = ctypes.c_int
+    sendmmsg.argtypes = [ctypes.c_int,ctypes.POINTER(mmsghdr),ctypes.c_uint,ctypes.c_int]
+    sendmmsg.restype = ctypes.c_int
+    return recvmmsg, sendmmsg
+
+
+def load_buffer_api():
+    ''' return the (PyObject_GetBuffer, PyBuffer_Release) functions, to address a (read-only) payload without copying it '''
+    try:
+        getBuffer, releaseBuffer = ctypes.pythonapi.PyObject_GetBuffer, ctypes.pythonapi.PyBuffer_Release
+    except AttributeError:
+        return None
+    getBuffer.argtypes = [ctypes.py_object,ctypes.c_void_p,ctypes.c_int]
+    getBuffer.restype = ctypes.c_int
+    releaseBuffer.argtypes = [ctypes.c_void_p]
+    releaseBuffer.restype = None
+    return getBuffer, releaseBuffer
+
+MMSG = load_mmsg()
+BUFFER_API = load_buffer_api()
+PyBUF_SIMPLE = 0
+
+''' struct layouts, to write per-datagram fields without building ctypes objects '''
+HEADER_SIZE = ctypes.sizeof(mmsghdr)
+LEN_OFFSET = mmsghdr.msg_len.offset
+NAME_OFFSET = msghdr.msg_name.offset
+NAMELEN_OFFSET = msghdr.msg_namelen.offset
+IOVEC_SIZE = ctypes.sizeof(iovec)
+IOV_BASE_OFFSET = iovec.iov_base.offset
+IOV_LEN_OFFSET = iovec.iov_len.offset
+NAME_SIZE = ctypes.sizeof(sockaddr_in)
+BUFFER_VIEW_SIZE = ctypes.sizeof(Py_buffer)
+COPY_BREAK = 2048 # largest payload copied into the batch rather than sent in place
+SLOT_SIZE = 64 + COPY_BREAK # bytes of a datagram's header (and small payload) copied into the batch
+
+
+def to_sockaddr(address:tuple):
+    ''' (ip, port) -> sockaddr_in '''
+    name = sockaddr_in()
+    name.sin_family = AF_INET
+    name.sin_port = htons(address[1])
+    name.sin_addr[:] = inet_aton(address[0])
+    return name
+
+
+def from_sockaddr(name):
+    ''' sockaddr_in -> (ip, port) '''
+    return (inet_ntoa(bytes(name.sin_addr)),ntohs(name.sin_port))
+
+
+
+class STPBatchIO(object):
+    '''
+        Receives and sends batches of datagrams on a UDP socket. The mmsghdr arrays and
+        datagram buffers are allocated once and their per-datagram fields written through
+        memoryviews, as building ctypes objects per datagram costs more than the system calls saved.
+    '''
+    def __init__(self,sock,batchSize=defines.BATCH_SIZE):
+        self._Socket = sock
+        self._BatchSize = batchSize
+        self._Selector = selectors.DefaultSelector()
+        self._Selector.register(sock,selectors.EVENT_READ)
+        self._SendLock = threading.Lock()
+        self._Names = {} # address -> sockaddr_in (send)
+        self._Senders = {} # sockaddr_in port and address bytes -> address (receive)
+        self._Recv = None
+        self._Send = None
+        if MMSG is not None and MSG_DONTWAIT is not None and batchSize > 1:
+            self._Recv = self.init_headers()
+            if BUFFER_API is not None:
+                self._Send = self.init_send_headers()
+
+
+    def get_BatchSize(self):
+        ''' get max datagrams per batch '''
+        return self._BatchSize
+
+
+    def init_headers(self):
+        ''' allocate a batch of mmsghdrs, each with a datagram buffer and address '''
+        count = self._BatchSize
+        data = ctypes.create_string_buffer(count * defines.BUFFER_SIZE)
+        names = (sockaddr_in * count)()
+        iovecs = (iovec * count)()
+        headers = (mmsghdr * count)()
+        for i in range(count):
+            iovecs[i].iov_base = ctypes.addressof(data) + i * defines.BUFFER_SIZE
+            iovecs[i].iov_len = defines.BUFFER_SIZE
+            headers[i].msg_hdr.msg_name = ctypes.addressof(names[i])
+            headers[i].msg_hdr.msg_namelen = ctypes.sizeof(sockaddr_in)
+            headers[i].msg_hdr.msg_iov = ctypes.pointer(iovecs[i])
+            headers[i].msg_hdr.msg_iovlen = 1
+        return (data,memoryview(data).cast('B'),names,memoryview(names).cast('B'),
+            iovecs,memoryview(iovecs).cast('B'),headers,memoryview(headers).cast('B'))
+
+
+    def init_send_headers(self):
+        ''' allocate a batch of mmsghdrs to send, each gathering two iovecs - a header slot and the payload in place '''
+        count = self._BatchSize
+        slots = ctypes.create_string_buffer(count * SLOT_SIZE)
+        iovecs = (iovec * (2 * count))()
+        views = (Py_buffer * count)()
+        headers = (mmsghdr * count)()
+        for i in range(count):
+            iovecs[2 * i].iov_base = ctypes.addressof(slots) + i * SLOT_SIZE
+            headers[i].msg_hdr.msg_namelen = ctypes.sizeof(sockaddr_in)
+            headers[i].msg_hdr.msg_iov = ctypes.pointer(iovecs[2 * i])
+            headers[i].msg_hdr.msg_iovlen = 2
+        viewAddresses = [ctypes.addressof(views) + i * BUFFER_VIEW_SIZE for i in range(count)]
+        return (memoryview(slots).cast('B'),iovecs,memoryview(iovecs).cast('B'),views,memoryview(views).cast('B'),
+            viewAddresses,headers,memoryview(headers).cast('B'))
+
+
+    def recv(self,timeout=None):
+        ''' wait for a datagram (up to timeout seconds), returns all pending [(packet,sender)] up to a batch '''
+        if not self._Selector.select(timeout):
+            return []
+        if self._Recv is None:
+            return self.recv_loop()
+
+        data, dataView, names, namesView, iovecs, iovecsView, headers, headersView = self._Recv
+        count = MMSG[0](self._Socket.fileno(),headers,self._BatchSize,MSG_DONTWAIT,None)
+        if count < 0:
+            err = ctypes.get_errno()
+            if err in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR):
+                return []
+            raise OSError(err,os.strerror(err))
+
+        datagrams = []
+        for i in range(count):
+            header = i * HEADER_SIZE
+            length = struct.unpack_from('I',headersView,header + LEN_OFFSET)[0]
+            struct.pack_into('I',headersView,header + NAMELEN_OFFSET,ctypes.sizeof(sockaddr_in))
+            offset = i * defines.BUFFER_SIZE
+            key = bytes(namesView[i * NAME_SIZE + 2:i * NAME_SIZE + 8])
+            sender = self._Senders.get(key)
+            if sender is None:
+                sender = self._Senders[key] = from_sockaddr(names[i])
+            datagrams.append((bytes(dataView[offset:offset + length]),sender))
+        return datagrams
+
+
+    def recv_loop(self):
+        ''' recvfrom each pending datagram up to a batch '''
+        datagrams = [self._Socket.recvfrom(defines.BUFFER_SIZE)]
+        if MSG_DONTWAIT is None:
+            return datagrams
+        try:
+            while len(datagrams) < self._BatchSize:
+                datagrams.append(self._Socket.recvfrom(defines.BUFFER_SIZE,MSG_DONTWAIT))
+        except (BlockingIOError, InterruptedError):
+            pass
+        return datagrams
+
+
+    def send(self,datagrams:list):
+        ''' send each (buffers,address) - the buffers of a datagram gathered, a batch per system call '''
+        with self._SendLock:
+            if self._Send is None or len(datagrams) == 1:
+                for buffers, address in datagrams:
+                    if SENDMSG:
+                        self.send_wait(self._Socket.sendmsg,buffers,[],0,address)
+                    else:
+                        self.send_wait(self._Socket.sendto,b''.join(buffers),address)
+                return
+            for start in range(0,len(datagrams),self._BatchSize):
+                self.send_batch(datagrams[start:start+self._BatchSize])
+
+
+    def send_batch(self,datagrams:list):
+        ''' sendmmsg up to a batch of datagrams, until all are sent - payloads above COPY_BREAK are not copied '''
+        slotsView, iovecs, iovecsView, views, viewsView, viewAddresses, headers, headersView = self._Send
+        getBuffer, releaseBuffer = BUFFER_API
+        acquired = []
+        try:
+            for i, (buffers, address) in enumerate(datagrams):
+                name = self._Names.get(address)
+                if name is None:
+                    name = self._Names[address] = to_sockaddr(address)
+                struct.pack_into('P',headersView,i * HEADER_SIZE + NAME_OFFSET,ctypes.addressof(name))
+
+                ''' the leading buffers (header) are copied into the slot, the last (payload) is addressed in place unless small '''
+                inPlace = len(buffers[-1]) > COPY_BREAK
+                slot = i * SLOT_SIZE
+                length = 0
+                for buffer in (buffers[:-1] if inPlace else buffers):
+                    slotsView[slot + length:slot + length + len(buffer)] = buffer
+                    length += len(buffer)
+                entry = 2 * i * IOVEC_SIZE
+                struct.pack_into('N',iovecsView,entry + IOV_LEN_OFFSET,length)
+                if not inPlace:
+                    struct.pack_into('N',iovecsView,entry + IOVEC_SIZE + IOV_LEN_OFFSET,0)
+                    continue
+                ''' views are acquired in datagram order, those of copied payloads are left unused '''
+                getBuffer(buffers[-1],viewAddresses[i],PyBUF_SIMPLE)
+                acquired.append(viewAddresses[i])
+                payload = struct.unpack_from('P',viewsView,i * BUFFER_VIEW_SIZE)[0]
+                struct.pack_into('P',iovecsView,entry + IOVEC_SIZE + IOV_BASE_OFFSET,payload)
+                struct.pack_into('N',iovecsView,entry + IOVEC_SIZE + IOV_LEN_OFFSET,len(buffers[-1]))
+
+            count = len(datagrams)
+            sent = 0
+            while sent < count:
+                pending = ctypes.cast(ctypes.addressof(headers) + sent * HEADER_SIZE,ctypes.POINTER(mmsghdr))
+                result = MMSG[1](self._Socket.fileno(),pending,count - sent,0)
+                if result < 0:
+                    err = ctypes.get_errno()
+                    if err in (errno.EAGAIN, errno.EWOULDBLOCK, errno.ENOBUFS):
+                        self.wait_writable()
+                        continue
+                    if err == errno.EINTR:
+                        continue
+                    raise OSError(err,os.strerror(err))
+                sent += result
+        finally:
+            for view in acquired:
+                releaseBuffer(view)
+
+
+    def send_wait(self,send,*args):
+        ''' call send, waiting for the socket send buffer if it is full '''
+        while True:
+            try:
+                return send(*args)
+            except BlockingIOError:
+                self.wait_writable()
+
+
+    def wait_writable(self):
+        ''' wait until the socket send buffer has space '''
+        selector = selectors.DefaultSelector()
+        selector.register(self._Socket,selectors.EVENT_WRITE)
+        selector.select(defines.BATCH_SEND_WAIT)
+        selector.close()
@@ -0,0 +1,169 @@
+#! /usr/bin/env python3.6
+
+from bisect import bisect_left, bisect_right
+from classes import defines,log
+
+
+class STPRangeSet(object):
+    ''' Sorted set of disjoint [start,end) sequence number ranges '''
+    def __init__(self):
+        self._starts = [] # sorted start of each range
+        self._ends = [] # end (exclusive) of each range
+
+
+    def get_Ranges(self):
+        ''' return the (start,end) ranges in order '''
+        return list(zip(self._starts,self._ends))
+
+
+    def get_Range(self,seqNum):
+        ''' return the (start,end) range holding seqNum, or None '''
+        index = bisect_right(self._starts,seqNum) - 1
+        if index >= 0 and seqNum < self._ends[index]:
+            return (self._starts[index],self._ends[index])
+        return None
+
+
+    def get_End(self):
+        ''' return the end of the highest range (0 if empty) '''
+        if self._ends:
+            return self._ends[-1]
+        return 0
+
+
+    def add(self,start,end):
+        ''' merge [start,end) into the ranges, returns the (start,end) gaps it newly covered '''
+        index = bisect_left(self._starts,start)
+        if index > 0 and self._ends[index-1] >= start:
+            index -= 1
+        last = index
+        covered = []
+        position = start
+        newStart, newEnd = start, end
+        while last < len(self._starts) and self._starts[last] <= end:
+            if self._starts[last] > position:
+                covered.append((position,self._starts[last]))
+            position = max(position,self._ends[last])
+            newStart = min(newStart,self._starts[last])
+            newEnd = max(newEnd,self._ends[last])
+            last += 1
+        if position < end:
+            covered.append((position,end))
+        self._starts[index:last] = [newStart]
+        self._ends[index:last] = [newEnd]
+        return covered
+
+
+    def trim(self,seqNum):
+        ''' drop the ranges (or parts) below seqNum '''
+        while self._starts and self._starts[0] < seqNum:
+            if self._ends[0] > seqNum:
+                self._starts[0] = seqNum
+                break
+            del self._starts[0]
+            del self._ends[0]
+
+
+
+class STPReorderBuffer(object):
+    '''
+        Receiver reorder buffer keyed by sequence number.
+        Out of order segments are held in a dict with a sorted set of the received
+        byte ranges, until the cumulative ACK reaches them. Segments spilled to the
+        file (checkpoints) are kept as stored ranges the cumulative ACK skips.
+    '''
+    def __init__(self,seqNum=0):
+        self._segments = {} # seqNum -> payload
+        self._ranges = STPRangeSet() # received byte ranges beyond the cumulative ACK
+        self._stored = STPRangeSet() # received byte ranges beyond the cumulative ACK written to file already
+        self._next = seqNum # next in-order sequence number (cumulative ACK)
+        self._bytes = 0 # bytes held in the buffer
+
+
+    def get_CumulativeACK(self):
+        ''' return the next in-order sequence number expected '''
+        return self._next
+
+
+    def get_Bytes(self):
+        ''' return the number of bytes held in the buffer '''
+        return self._bytes
+
+
+    def get_Ranges(self):
+        ''' return the received (start,end) byte ranges beyond the cumulative ACK '''
+        return self._ranges.get_Ranges()
+
+
+    def get_Blocks(self,seqNum,count):
+        ''' return up to count received ranges, the range holding seqNum first (SACK) '''
+        first = self._ranges.get_Range(seqNum)
+        blocks = [first] if first is not None else []
+        for block in self._ranges.get_Ranges():
+            if len(blocks) >= count:
+                break
+            if block != first:
+                blocks.append(block)
+        return blocks
+
+
+    def get_Stored(self):
+        ''' return the (start,end) byte ranges beyond the cumulative ACK written to file already '''
+        return self._stored.get_Ranges()
+
+
+    def add_Stored(self,start,end):
+        ''' mark [start,end) as received and written to file (a resumed checkpoint) '''
+        if end > max(start,self._next):
+            self._stored.add(max(start,self._next),end)
+            self._ranges.add(max(start,self._next),end)
+
+
+    def received(self,seqNum):
+        ''' return True if the segment at seqNum has been received already '''
+        return seqNum < self._next or seqNum in self._segments or self._stored.get_Range(seqNum) is not None
+
+
+    def add(self,seqNum,payload):
+        ''' Store a segment, returns False if it was received already '''
+        if len(payload) == 0 or self.received(seqNum):
+            return False
+        self._segments[seqNum] = payload
+        self._bytes += len(payload)
+        self._ranges.add(seqNum,seqNum + len(payload))
+        return True
+
+
+    def pop_ready(self):
+        ''' yields in-order payloads, advancing the cumulative ACK past them (up to a stored range) '''
+        while self._next in self._segments:
+            payload = self._segments.pop(self._next)
+            self._bytes -= len(payload)
+            self._next += len(payload)
+            yield payload
+
+        ''' drop ranges now covered by the cumulative ACK '''
+        self._ranges.trim(self._next)
+        self._stored.trim(self._next)
+
+
+    def pop_stored(self):
+        ''' advance the cumulative ACK past a stored range it has reached, returns the bytes skipped '''
+        stored = self._stored.get_Range(self._next)
+        if stored is None:
+            return 0
+        skipped = stored[1] - self._next
+        self._next = stored[1]
+        self._ranges.trim(self._next)
+        self._stored.trim(self._next)
+        return skipped
+
+
+    def spill(self):
+        ''' return the out of order (seqNum,payload) segments in order, releasing them as stored ranges - the caller writes them to file '''
+        segments = sorted(self._segments.items())
+        self._segments = {}
+        self._bytes = 0
+        for seqNum, payload in segments:
+            self._stored.add(seqNum,seqNum + len(payload))
+        return segments
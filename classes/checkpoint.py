@@ -0,0 +1,63 @@
+#! /usr/bin/env python3.6
+
+import os, json, hashlib
+from classes import defines, log
+
+
+'''
+    Resumable Transfers
+
+    The sender identifies a file by a transfer ID - a hash of its path, size and modification
+    time - so a restarted sender presents the same ID and a changed file a new one. While a
+    transfer with an ID runs, the receiver periodically syncs its output file and saves a
+    checkpoint: the contiguous bytes written and the out of order ranges (written at their
+    offsets). A SYN with the ID of a checkpoint resumes at the first missing byte.
+'''
+
+
+def transfer_id(filename):
+    ''' return the transfer ID of a file - changes if the file is modified '''
+    status = os.stat(filename)
+    identity = "{}\0{}\0{}".format(os.path.realpath(filename),status.st_size,status.st_mtime_ns)
+    digest = hashlib.sha1(identity.encode('utf-8','surrogateescape')).digest()
+    return int.from_bytes(digest[:defines.TRANSFER_ID_SIZE],'big')
+
+
+def checkpoint_path(transferID,directory=defines.CHECKPOINT_DIR):
+    ''' return the path of a transfers checkpoint '''
+    return os.path.join(directory,'{:016x}.json'.format(transferID))
+
+
+def load(transferID,directory=defines.CHECKPOINT_DIR):
+    ''' return a transfers checkpoint {path, size, mss, written, ranges}, None if there is none (or it is unreadable) '''
+    try:
+        with open(checkpoint_path(transferID,directory)) as f:
+            state = json.load(f)
+        state['ranges'] = [tuple(block) for block in state['ranges']]
+        if state['id'] != transferID or not 0 <= state['written'] <= state['size']:
+            return None
+        return state
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError, KeyError, TypeError) as err:
+        log.message.error("checkpoint.load","{}".format(err))
+        return None
+
+
+def save(state:dict,directory=defines.CHECKPOINT_DIR):
+    ''' write a transfers checkpoint - replaced atomically so a crash leaves the previous one '''
+    os.makedirs(directory,exist_ok=True)
+    path = checkpoint_path(state['id'],directory)
+    with open(path + '.tmp',defines.WRITE) as f:
+        json.dump(state,f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(path + '.tmp',path)
+
+
+def remove(transferID,directory=defines.CHECKPOINT_DIR):
+    ''' remove a transfers checkpoint once it has completed '''
+    try:
+        os.remove(checkpoint_path(transferID,directory))
+    except FileNotFoundError:
+        pass
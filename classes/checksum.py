@@ -0,0 +1,102 @@
+#! /usr/bin/env python3.6
+
+import zlib, sys
+from array import array
+from classes import defines
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+'''
+    RFC 1071 Internet Checksum computed in bulk.
+
+    The checksum pairs bytes into little endian 16 bit words and sums them with an
+    end-around carry. As 2^16 = 1 (mod 0xffff), the ones complement sum of the words
+    of a buffer is congruent to the whole buffer read as one little endian integer,
+    so a buffer can be folded with a single int.from_bytes and a modulo rather than
+    a Python loop per word.
+'''
+
+WORD_MASK = 0xffff
+
+
+def fold(value:int):
+    ''' Fold a word sum into the 16 bit ones complement range (0 only if value is 0) '''
+    if value == 0:
+        return 0
+    return ((value - 1) % WORD_MASK) + 1
+
+
+def sum_bigint(data):
+    ''' Ones complement word sum of data using one word-wide integer '''
+    return fold(int.from_bytes(data, 'little'))
+
+
+def sum_array(data):
+    ''' Ones complement word sum of data using an array of 16 bit words '''
+    view = memoryview(data).cast('B')
+    odd = len(view) % 2
+    words = array('H')
+    words.frombytes(view[:len(view) - odd])
+    if sys.byteorder != 'little':
+        words.byteswap()
+    total = sum(words)
+    if odd:
+        total += view[-1]
+    return fold(total)
+
+
+def sum_numpy(data):
+    ''' Ones complement word sum of data using NumPy (if installed) '''
+    view = memoryview(data).cast('B')
+    odd = len(view) % 2
+    total = int(numpy.frombuffer(view[:len(view) - odd], dtype='<u2').sum(dtype=numpy.uint64))
+    if odd:
+        total += view[-1]
+    return fold(total)
+
+
+ENGINES = {
+    'bigint': sum_bigint,
+    'array': sum_array,
+}
+if numpy is not None:
+    ENGINES['numpy'] = sum_numpy
+
+
+def internet(*chunks, engine=sum_bigint):
+    '''
+        Calculate the 16 bit RFC 1071 hash over the concatenation of chunks,
+        without joining them. Chunks starting on an odd byte are shifted by 8 bits.
+    '''
+    msgSum = 0
+    offset = 0
+    for chunk in chunks:
+        chunkSum = engine(chunk)
+        if offset % 2:
+            chunkSum = fold(chunkSum << 8)
+        msgSum = fold(msgSum + chunkSum)
+        offset += len(chunk)
+    return ~msgSum & WORD_MASK
+
+
+def crc32(*chunks):
+    ''' Calculate a CRC32 (zlib) over chunks, folded into the 16 bit checksum field '''
+    crc = 0
+    for chunk in chunks:
+        crc = zlib.crc32(chunk, crc)
+    return (crc ^ (crc >> 16)) & WORD_MASK
+
+
+ALGORITHMS = {
+    defines.CHECKSUM_INTERNET: internet,
+    defines.CHECKSUM_CRC32: crc32,
+}
+
+
+def calc(algorithm, *chunks):
+    ''' Calculate the checksum of chunks with algorithm, as stored in the STP header '''
+    return ALGORITHMS[algorithm](*chunks).to_bytes(2, 'little')
@@ -0,0 +1,68 @@
+#! /usr/bin/env python3.6
+
+import zlib
+from classes import defines
+
+try:
+    import lzma
+except ImportError:
+    lzma = None
+
+try:
+    import bz2
+except ImportError:
+    bz2 = None
+
+LZMA_DICT_SIZE = 1 << 16 # bytes (covers the largest segment)
+
+'''
+    Segment Compression
+
+    Each MSS segment of the file is compressed on its own, so a lost segment is resent
+    and decompressed without its neighbours, and sequence numbers still count file bytes
+    (a compressed segment's payload is shorter than its sequence range). The segments are
+    compressed ahead of the window by message.STPCompressedSource.
+'''
+
+
+def available():
+    ''' return the codecs this Python was built with '''
+    modules = {defines.COMPRESS_ZLIB: zlib, defines.COMPRESS_LZMA: lzma, defines.COMPRESS_BZ2: bz2}
+    return tuple(codec for codec in defines.CODECS if modules[codec] is not None)
+
+
+def lzma_filters(level=defines.COMPRESS_LEVEL):
+    ''' raw LZMA2 stream - the xz container would add 60 bytes to every segment, a dictionary over a segment is unused '''
+    return [{'id': lzma.FILTER_LZMA2, 'preset': level, 'dict_size': LZMA_DICT_SIZE}]
+
+
+def compressor(codec,level=defines.COMPRESS_LEVEL):
+    ''' return a function compressing one segment with codec at level (1-9) '''
+    if codec == defines.COMPRESS_ZLIB:
+        return lambda data: zlib.compress(data,level)
+    if codec == defines.COMPRESS_LZMA:
+        filters = lzma_filters(level)
+        return lambda data: lzma.compress(data,format=lzma.FORMAT_RAW,filters=filters)
+    if codec == defines.COMPRESS_BZ2:
+        return lambda data: bz2.compress(data,level)
+    raise ValueError("Unknown codec {}".format(codec))
+
+
+def decompress(codec,data,limit=defines.BUFFER_SIZE):
+    ''' decompress one segment, returns None if it is invalid or over limit bytes '''
+    try:
+        if codec == defines.COMPRESS_ZLIB:
+            decompressor = zlib.decompressobj()
+        elif codec == defines.COMPRESS_LZMA:
+            decompressor = lzma.LZMADecompressor(format=lzma.FORMAT_RAW,filters=lzma_filters())
+        elif codec == defines.COMPRESS_BZ2:
+            decompressor = bz2.BZ2Decompressor()
+        else:
+            return None
+        payload = decompressor.decompress(data,limit)
+        if not decompressor.eof:
+            ''' truncated, or more than limit bytes '''
+            return None
+        return payload
+    except (zlib.error, ValueError, OSError, EOFError, getattr(lzma,'LZMAError',ValueError)):
+        return None
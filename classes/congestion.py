@@ -0,0 +1,240 @@
+#! /usr/bin/env python3.6
+
+import time
+from classes import defines
+
+
+'''
+    Congestion Control for the STP Sender
+
+    An algorithm keeps a congestion window (cwnd, in segments) driven by the window
+    events in STPSender.update_window - ACK, duplicate ACK, loss (fast retransmit)
+    and timeout. The sender sends at most min(cwnd, MWS/MSS) panes past minPane.
+'''
+
+
+class STPCongestionControl(object):
+    ''' Fixed window (no congestion control) - the window is always MWS/MSS panes '''
+    name = defines.CC_NONE
+
+    def __init__(self,maxPanes):
+        self._maxPanes = maxPanes # MWS/MSS
+        self._cwnd = float(maxPanes)
+        self._ssthresh = float(maxPanes)
+        self._recovery = False
+
+
+    def get_cwnd(self):
+        ''' get congestion window (segments) '''
+        return self._cwnd
+
+
+    def get_ssthresh(self):
+        ''' get slow start threshold (segments) '''
+        return self._ssthresh
+
+
+    def get_Window(self):
+        ''' get the number of window panes the sender may use, capped by MWS '''
+        return max(min(int(self._cwnd),self._maxPanes),1)
+
+
+    def in_Recovery(self):
+        ''' return True during fast recovery '''
+        return self._recovery
+
+
+    def on_ACK(self,acked,pane,highPane):
+        ''' New ACK Event - acked panes cumulatively ACK'd up to pane, returns True on a partial ACK '''
+        return False
+
+
+    def on_DuplicateACK(self):
+        ''' Duplicate ACK Event '''
+        pass
+
+
+    def on_Loss(self,highPane):
+        ''' Loss Event (fast retransmit) - highPane is the highest pane sent '''
+        pass
+
+
+    def on_Timeout(self):
+        ''' Timeout Event '''
+        pass
+
+
+
+class STPReno(STPCongestionControl):
+    ''' Reno - slow start, congestion avoidance, fast retransmit/recovery (RFC 5681) '''
+    name = defines.CC_RENO
+
+    def __init__(self,maxPanes):
+        STPCongestionControl.__init__(self,maxPanes)
+        self._cwnd = float(min(defines.INITIAL_CWND,maxPanes))
+
+
+    def increase(self,acked):
+        ''' grow cwnd for acked panes (slow start below ssthresh, otherwise 1 pane per window) '''
+        for i in range(acked):
+            if self._cwnd < self._ssthresh:
+                self._cwnd += 1
+            else:
+                self._cwnd += 1 / self._cwnd
+        self._cwnd = min(self._cwnd,self._maxPanes)
+
+
+    def reduce(self):
+        ''' multiplicative decrease on loss - returns the new ssthresh '''
+        self._ssthresh = max(self._cwnd / 2,defines.MIN_CWND)
+        return self._ssthresh
+
+
+    def on_ACK(self,acked,pane,highPane):
+        ''' New ACK Event - recovery ends on the first new ACK '''
+        if self._recovery:
+            self._recovery = False
+            self._cwnd = self._ssthresh
+            return False
+        self.increase(acked)
+        return False
+
+
+    def on_DuplicateACK(self):
+        ''' Duplicate ACK Event - inflate the window for each segment that has left the network '''
+        if self._recovery:
+            self._cwnd = min(self._cwnd + 1,self._maxPanes)
+
+
+    def on_Loss(self,highPane):
+        ''' Loss Event - halve the window and enter fast recovery '''
+        if self._recovery:
+            return
+        self._cwnd = min(self.reduce() + defines.SACK_THRESHOLD,self._maxPanes)
+        self._recovery = True
+
+
+    def on_Timeout(self):
+        ''' Timeout Event - halve ssthresh and restart slow start from 1 segment '''
+        self.reduce()
+        self._cwnd = 1.0
+        self._recovery = False
+
+
+
+class STPNewReno(STPReno):
+    ''' NewReno - Reno with partial ACKs held in fast recovery (RFC 6582) '''
+    name = defines.CC_NEWRENO
+
+    def __init__(self,maxPanes):
+        STPReno.__init__(self,maxPanes)
+        self._recover = -1 # highest pane sent when fast recovery started
+
+
+    def on_ACK(self,acked,pane,highPane):
+        ''' New ACK Event - a partial ACK (below the recovery point) stays in recovery, returns True '''
+        if self._recovery:
+            if pane < self._recover:
+                ''' deflate by the panes ACK'd, and resend the next hole '''
+                self._cwnd = max(self._cwnd - acked + 1,1)
+                return True
+            self._recovery = False
+            self._cwnd = min(self._ssthresh,max(highPane - pane,0) + 1)
+            return False
+        self.increase(acked)
+        return False
+
+
+    def on_Loss(self,highPane):
+        ''' Loss Event - enter fast recovery until highPane is ACK'd '''
+        if self._recovery:
+            return
+        STPReno.on_Loss(self,highPane)
+        self._recover = highPane
+
+
+
+class STPCubic(STPCongestionControl):
+    ''' CUBIC - window growth a cubic function of time since the last loss (RFC 8312) '''
+    name = defines.CC_CUBIC
+    C = 0.4
+    BETA = 0.7
+
+    def __init__(self,maxPanes):
+        STPCongestionControl.__init__(self,maxPanes)
+        self._cwnd = float(min(defines.INITIAL_CWND,maxPanes))
+        self._ssthresh = float(maxPanes)
+        self._wMax = 0.0 # window before the last reduction
+        self._k = 0.0 # seconds to grow back to wMax
+        self._epoch = None # start of the current congestion avoidance epoch
+        self._wEst = 0.0 # Reno friendly window estimate
+
+
+    def on_ACK(self,acked,pane,highPane):
+        ''' New ACK Event - slow start, then grow along the cubic curve '''
+        self._recovery = False
+        for i in range(acked):
+            if self._cwnd < self._ssthresh:
+                self._cwnd += 1
+                continue
+
+            now = time.monotonic()
+            if self._epoch is None:
+                self._epoch = now
+                if self._cwnd < self._wMax:
+                    self._k = ((self._wMax - self._cwnd) / self.C) ** (1/3)
+                else:
+                    self._k = 0.0
+                    self._wMax = self._cwnd
+                self._wEst = self._cwnd
+
+            t = now - self._epoch
+            target = self.C * (t - self._k) ** 3 + self._wMax
+            self._wEst += 3 * (1 - self.BETA) / (1 + self.BETA) / self._cwnd
+            if target > self._cwnd:
+                self._cwnd += (target - self._cwnd) / self._cwnd
+            else:
+                self._cwnd += 0.01 / self._cwnd
+            self._cwnd = max(self._cwnd,self._wEst)
+        self._cwnd = min(self._cwnd,self._maxPanes)
+        return False
+
+
+    def reduce(self):
+        ''' multiplicative decrease by BETA, remembering wMax (with fast convergence) '''
+        if self._cwnd < self._wMax:
+            self._wMax = self._cwnd * (1 + self.BETA) / 2
+        else:
+            self._wMax = self._cwnd
+        self._ssthresh = max(self._cwnd * self.BETA,defines.MIN_CWND)
+        self._epoch = None
+
+
+    def on_Loss(self,highPane):
+        ''' Loss Event - reduce once per recovery '''
+        if self._recovery:
+            return
+        self.reduce()
+        self._cwnd = self._ssthresh
+        self._recovery = True
+
+
+    def on_Timeout(self):
+        ''' Timeout Event - reduce and restart slow start from 1 segment '''
+        self.reduce()
+        self._cwnd = 1.0
+        self._recovery = False
+
+
+
+ALGORITHMS = {
+    defines.CC_NONE: STPCongestionControl,
+    defines.CC_RENO: STPReno,
+    defines.CC_NEWRENO: STPNewReno,
+    defines.CC_CUBIC: STPCubic,
+}
+
+
+def create(algorithm,maxPanes):
+    ''' create the congestion control algorithm for a window of maxPanes '''
+    return ALGORITHMS[algorithm](maxPanes)
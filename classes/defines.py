@@ -1,7 +1,7 @@
 #! /usr/bin/env python3.6
 
 from socket import *
-from enum import IntFlag, auto
+from enum import IntEnum, IntFlag, auto
 
 
 class Perm(IntFlag):
@@ -11,6 +11,41 @@ class Perm(IntFlag):
     ACK = auto()
     SYNACK = SYN|ACK
     FIN = auto()
+    CRC32 = auto() # Segment checksum is CRC32 rather than RFC 1071
+    TIMESTAMP = auto() # Segment carries a timestamp (data) or timestamp echo (ACK) after the header
+    SEQ64 = auto() # Header is followed by the high 32 bits of the sequence and ACK numbers (64 bit header)
+    COMPRESSED = auto() # Payload is compressed with the connections codec
+
+
+class Feature(IntFlag):
+    ''' Optional Features Negotiated at Handshake '''
+    DEFAULT = 0
+    SELECTIVE_REPEAT = auto() # per segment timers, receiver reports each segment received
+    SACK = auto() # receiver reports its out of order ranges, sender resends only the holes
+    TIMESTAMPS = auto() # data segments carry a timestamp the receiver echoes in its ACK
+    DELAYED_ACK = auto() # receiver ACKs every ack_every in-order segments or after ack_delay
+    SEQ64 = auto() # 64 bit sequence and ACK numbers (files over 4 GiB)
+    COMPRESSION = auto() # data segments may carry a compressed payload (codec negotiated as an option)
+    SESSION = auto() # the data is a session of framed files (a directory or manifest) rather than one file
+    RESUME = auto() # the receiver checkpoints the transfer, a restarted sender resumes at the first missing byte
+    STRIPE = auto() # the data is one byte range of a file striped over several connections
+    ALL = SELECTIVE_REPEAT | SACK | TIMESTAMPS | DELAYED_ACK | SEQ64 | COMPRESSION | SESSION | RESUME | STRIPE
+
+
+class Option(IntEnum):
+    ''' Handshake Options - TLVs following the feature bitmask in SYN/SYN-ACK (unknown types are ignored) '''
+    MSS = 1 # max segment payload - sender MSS, receiver the largest it can receive (bytes)
+    WINDOW = 2 # sender MWS, receiver the window its socket buffer can queue (bytes)
+    CHECKSUM = 3 # checksum algorithm (index into CHECKSUMS) - receiver replies the one to use
+    ACK_EVERY = 4 # receiver - in-order segments per delayed ACK
+    ACK_DELAY = 5 # receiver - max milliseconds an ACK is delayed
+    FILE_SIZE = 6 # sender - bytes to be transferred
+    CODEC = 7 # compression codec (index into CODECS) - receiver replies it if it can decompress it
+    TRANSFER_ID = 8 # sender - identifies the file across restarts (path, size and modification time)
+    RESUME = 9 # receiver - bytes of the file it holds already, the sender starts after them
+    STRIPE = 10 # sender - stripe group, the stripes of one file share it (and its output file)
+    STRIPE_OFFSET = 11 # sender - file offset of the stripe (FILE_SIZE is the bytes of the stripe)
+    STRIPE_TOTAL = 12 # sender - size of the whole striped file
 
 
 class Status(IntFlag):
@@ -23,6 +58,77 @@ class Status(IntFlag):
     RECEIVED_3 = RECEIVED + 2
 
 
+''' Sender Retransmission Modes '''
+MODE_GBN = "gbn" # Go-Back-N (cumulative ACKs, single timer)
+MODE_SR = "sr" # Selective Repeat (per segment timers)
+MODES = (MODE_GBN, MODE_SR)
+
+''' Selective Acknowledgments '''
+SACK_OFF = "off"
+SACK_ON = "on"
+SACKS = (SACK_OFF, SACK_ON)
+SACK_BLOCKS = 4 # max out of order ranges reported per ACK
+SACK_THRESHOLD = 3 # segments SACK'd above a hole before it is resent
+
+''' Timestamp Echo '''
+TIMESTAMPS_OFF = "off"
+TIMESTAMPS_ON = "on"
+TIMESTAMPS = (TIMESTAMPS_OFF, TIMESTAMPS_ON)
+TIMESTAMP_MASK = 0xffffffff # 32 bit microsecond timestamps
+
+''' 64 Bit Sequence Numbers '''
+SEQ64_AUTO = "auto" # requested only if the file needs more than 32 bit sequence numbers
+SEQ64_ON = "on"
+SEQ64_OFF = "off"
+SEQ64S = (SEQ64_AUTO, SEQ64_ON, SEQ64_OFF)
+SEQ_MASK = 0xffffffff # sequence and ACK numbers of the 11 byte header
+
+''' Segment Compression '''
+COMPRESS_OFF = "off"
+COMPRESS_ZLIB = "zlib"
+COMPRESS_LZMA = "lzma"
+COMPRESS_BZ2 = "bz2"
+CODECS = (COMPRESS_ZLIB, COMPRESS_LZMA, COMPRESS_BZ2)
+COMPRESSIONS = (COMPRESS_OFF,) + CODECS
+COMPRESS_LEVEL = 6 # 1 (fastest) - 9 (smallest)
+COMPRESS_AHEAD = 256 # segments compressed ahead of the first unACK'd segment
+COMPRESS_SKIP_MAX = 64 # max segments sent raw without trying after an incompressible segment
+
+''' Multi-File Sessions '''
+MANIFEST_PREFIX = "@" # sender filename @path - a manifest listing the files of a session, one per line
+
+''' Resumable Transfers '''
+RESUME_OFF = "off"
+RESUME_ON = "on"
+RESUMES = (RESUME_OFF, RESUME_ON)
+CHECKPOINT_INTERVAL = 1.0 # seconds between checkpoints of a transfer (0 declines resumable transfers)
+CHECKPOINT_DIR = ".stp_checkpoints" # receiver checkpoints, one per transfer ID
+TRANSFER_ID_SIZE = 8 # bytes
+
+''' Striped Transfers '''
+STRIPE_GROUP_SIZE = 4 # bytes of the random stripe group of a transfer
+
+''' Delayed ACKs '''
+DELAYED_ACK_OFF = "off"
+DELAYED_ACK_ON = "on"
+DELAYED_ACKS = (DELAYED_ACK_OFF, DELAYED_ACK_ON)
+ACK_EVERY = 2 # in-order segments ACK'd together (1 declines delayed ACKs)
+ACK_DELAY = 40 # max milliseconds the ACK of an in-order segment is delayed
+QUICK_ACKS = 16 # in-order segments ACK'd at once after an out of order segment (sender recovering)
+
+''' Congestion Control Algorithms '''
+CC_NONE = "none" # fixed window of MWS/MSS panes
+CC_RENO = "reno"
+CC_NEWRENO = "newreno"
+CC_CUBIC = "cubic"
+CCS = (CC_NONE, CC_RENO, CC_NEWRENO, CC_CUBIC)
+INITIAL_CWND = 4 # segments
+MIN_CWND = 2 # segments (ssthresh floor)
+
+''' Receiver Connection States '''
+ESTABLISHED = "ESTABLISHED"
+LAST_ACK = "LAST_ACK"
+
 CRLF = "\r\n"
 UDPSOCKET = SOCK_DGRAM
 TCPSOCKET = SOCK_STREAM
@@ -34,11 +140,51 @@ BETA = 0.25
 ESTIMATEDRTT = 500 # 500 milliseconds
 DEVRTT = 250 # 250 milliseconds
 TIMEOUT = 1000 # 1000 milliseconds
+RTO_MIN = 200 # 200 milliseconds
+RTO_MAX = 60000 # 60 seconds
 
 APPEND = "a"
 WRITE = "w"
 WRITE_BYTE = "wb"
 READ_BYTE = "rb"
+UPDATE_BYTE = "r+b"
+
+''' Checksum Algorithms '''
+CHECKSUM_INTERNET = "internet"
+CHECKSUM_CRC32 = "crc32"
+CHECKSUMS = (CHECKSUM_INTERNET, CHECKSUM_CRC32)
+
+''' Receiver File Writer '''
+WRITE_BUFFER_SIZE = 65536 # bytes of in-order data buffered before writing
+FSYNC_NEVER = "never"
+FSYNC_PERIODIC = "periodic"
+FSYNC_FIN = "fin"
+FSYNCS = (FSYNC_NEVER, FSYNC_PERIODIC, FSYNC_FIN)
+FSYNC_INTERVAL = 1 # seconds between periodic fsyncs
+
+''' Batched Datagram I/O '''
+BATCH_OFF = "off"
+BATCH_ON = "on"
+BATCHES = (BATCH_OFF, BATCH_ON)
+BATCH_SIZE = 32 # max datagrams received or sent per system call
+BATCH_SEND_WAIT = 1 # max seconds to wait for a full socket send buffer
+
+''' Socket Buffers '''
+SOCKET_BUFFER_AUTO = 0 # size the socket buffers from the window
+SOCKET_BUFFER_OVERHEAD = 512 # kernel bookkeeping bytes per queued datagram
+RECEIVER_BUFFER_SIZE = 4194304 # receive buffer when sized automatically (the senders windows are not known)
+UDP_TABLES = ('/proc/net/udp','/proc/net/udp6') # kernel UDP socket tables with per socket drops
+
+''' Receiver Worker Processes '''
+WORKER_POLL_INTERVAL = 0.5 # seconds between supervisor checks of its workers
+WORKER_RESTART_DELAY = 1 # seconds before restarting a worker that exited
+
+''' Log Files '''
+LOG_FULL = "full" # log every packet event
+LOG_SUMMARY = "summary" # only log the results (no per packet formatting)
+LOGS = (LOG_FULL, LOG_SUMMARY)
+LOG_QUEUE_SIZE = 65536 # max log lines waiting to be written
+LOG_BATCH_SIZE = 1024 # max log lines written per batch
 
 SUCCESS = 0
 CORRUPT = 1
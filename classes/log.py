@@ -2,11 +2,14 @@
 
 from abc import ABCMeta, abstractmethod
 from classes import defines
-import threading
+import threading, queue, atexit
 
 
 SENDER_LOG = "Sender_log"
 RECEIVER_LOG = "Receiver_log"
+CONNECTION_LOG = "Receiver_log_{n}_{host}_{port}" # per connection log when serving many connections
+WORKER_LOG = "Receiver_log_w{}" # receiver worker process log
+STRIPE_LOG = "Sender_log_s{}" # sender stripe process log
 
 class terminalColours:
     ''' colour defines for msg output '''
@@ -66,6 +69,75 @@ def downloadProgress(ackReceived):
 
 
 
+class logWriter(threading.Thread):
+    '''
+        Background Log File Writer - keeps one file handle open and writes
+        queued log lines in batches, off the send/receive path.
+    '''
+    def __init__(self,filename):
+        threading.Thread.__init__(self,daemon=True)
+        self._file = open(filename,defines.WRITE)
+        self._queue = queue.Queue(maxsize=defines.LOG_QUEUE_SIZE)
+        self._closed = False
+        self.start()
+        atexit.register(self.close)
+
+
+    def write(self,item):
+        ''' queue a log line tuple (event,time,type,seq,bytes,ack) or raw text '''
+        self._queue.put(item)
+
+
+    def flush(self):
+        ''' block until all queued lines are written to file '''
+        if self._closed:
+            return
+        flushed = threading.Event()
+        self._queue.put(flushed)
+        flushed.wait()
+
+
+    def close(self):
+        ''' flush and close the log file '''
+        if self._closed:
+            return
+        self._queue.put(None)
+        self.join()
+        self._closed = True
+
+
+    def run(self):
+        ''' write queued lines in batches until closed '''
+        running = True
+        while running:
+            batch = [self._queue.get()]
+            while len(batch) < defines.LOG_BATCH_SIZE:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            lines = []
+            flushed = []
+            for item in batch:
+                if item is None:
+                    running = False
+                elif isinstance(item,threading.Event):
+                    flushed.append(item)
+                elif isinstance(item,tuple):
+                    lines.append("{0} {1} {2} {3} {4} {5}\n".format(*item))
+                else:
+                    lines.append(item)
+            self._file.write(''.join(lines))
+
+            if flushed or not running:
+                self._file.flush()
+            for event in flushed:
+                event.set()
+        self._file.close()
+
+
+
 class STPLogs(object):
     ''' Log File Object '''
     @abstractmethod
@@ -73,66 +145,182 @@ class STPLogs(object):
         pass
 
     @abstractmethod
-    def writeResults(self):
-        ''' Write Results to File '''
+    def resultsData(self):
+        ''' return Results as text '''
         pass
 
-    @abstractmethod
+
+    def set_Verbosity(self,value):
+        ''' set log verbosity (full logs every packet, summary only writes the results) '''
+        self._Verbosity = value
+
+
+    def get_Verbosity(self):
+        ''' get log verbosity '''
+        return self._Verbosity
+
+
     def toFile(self,event="",timeRcv = -1.0, typePacket="",seq=-1,numBytes=-1,ack=-1):
-        ''' Write RCV/SND Logs to File '''
-        print("{0} {1} {2} {3} {4} {5}".format(event,timeRcv,typePacket,seq,numBytes,ack))
+        ''' Queue RCV/SND Logs to be written to File '''
+        if self._Verbosity == defines.LOG_FULL:
+            self._writer.write((event,timeRcv,typePacket,seq,numBytes,ack))
+
+
+    def flush(self):
+        ''' Block until queued Logs are written to File '''
+        self._writer.flush()
+
+
+    def close(self):
+        ''' Flush and close the Log File '''
+        self._writer.close()
+
+
+    def writeResults(self):
+        ''' Append Log FIle Results to LogFile '''
+        try:
+            results = self.resultsData()
+            self._writer.write(results)
+            self._writer.flush()
+            print(results)
+        except Exception as err:
+            message.error("writeResults","Error Writing LogFile: {}".format(err))
 
 
 
+RECEIVER_COUNTERS = ('_Received','_Bytes_Received','_Segments_Received','_Corrupted_Received','_Duplicate_Received','_Duplicate_ACK_Sent','_ACK_Sent','_Kernel_Dropped','_Compressed_Received','_Files_Received')
+
+
 class receiverSTPLogs(STPLogs):
     ''' Receiver Log File Object '''
-    def __init__(self):
+    def __init__(self,verbosity=defines.LOG_FULL,filename=RECEIVER_LOG,parent=None):
         self.lock = threading.RLock() 
+        self._Parent = parent #Server Log counts are the totals of its connections#
         self._Received  = 0 #Total segments received#
         self._Bytes_Received = 0 #Amount of Data Received (bytes)#
         self._Segments_Received = 0 #Data segments received#
         self._Corrupted_Received = 0 #Data Segments with bit errors#
         self._Duplicate_Received = 0 #Duplicate data segments received#
         self._Duplicate_ACK_Sent = 0 #Duplicate Acks sent#
+        self._ACK_Sent = 0 #Acks of data segments sent#
+        self._Kernel_Dropped = None #Datagrams dropped by the kernel, receive buffer full (None if not known)#
+        self._Compressed_Received = 0 #Data segments received compressed#
+        self._Files_Received = 0 #Files received in multi-file sessions#
+        self._Features = defines.Feature.DEFAULT #Features negotiated by its connections (results of the others are not written)#
+        self._Verbosity = verbosity
         ''' Erase Old Log FIle if it exists '''
-        f = open(RECEIVER_LOG,defines.WRITE)
-        f.close()
+        self._writer = logWriter(filename)
 
 
     def incr_Received(self):
         ''' Increment STPLog Received by 1 '''
         with self.lock:
             self._Received += 1
+        if self._Parent is not None:
+            self._Parent.incr_Received()
 
 
     def update_Bytes_Received(self,value:int):
         ''' Increment STPLog Bytes Received by 1 '''
         with self.lock:
             self._Bytes_Received += value
+        if self._Parent is not None:
+            self._Parent.update_Bytes_Received(value)
 
 
     def incr_Segments_Received(self):
         ''' Increment STPLog Segments Received by 1 '''
         with self.lock:
             self._Segments_Received += 1
+        if self._Parent is not None:
+            self._Parent.incr_Segments_Received()
 
 
     def incr_Corrupted_Received(self):
         ''' Increment STPLog Corrupted Received by 1 '''
         with self.lock:
             self._Corrupted_Received += 1
+        if self._Parent is not None:
+            self._Parent.incr_Corrupted_Received()
 
 
     def incr_Duplicate_Received(self):
         ''' Increment STPLog Duplicate Received by 1 '''
         with self.lock:
             self._Duplicate_Received += 1
+        if self._Parent is not None:
+            self._Parent.incr_Duplicate_Received()
 
 
     def incr_Duplicate_ACK_Sent(self):
         ''' Increment STPLog Duplicate ACK Sent by 1 '''
         with self.lock:
             self._Duplicate_ACK_Sent += 1
+        if self._Parent is not None:
+            self._Parent.incr_Duplicate_ACK_Sent()
+
+
+    def incr_ACK_Sent(self):
+        ''' Increment STPLog ACK Sent by 1 '''
+        with self.lock:
+            self._ACK_Sent += 1
+        if self._Parent is not None:
+            self._Parent.incr_ACK_Sent()
+
+
+    def incr_Compressed_Received(self):
+        ''' Increment STPLog Compressed Received by 1 '''
+        with self.lock:
+            self._Compressed_Received += 1
+        if self._Parent is not None:
+            self._Parent.incr_Compressed_Received()
+
+
+    def update_Files_Received(self,value:int):
+        ''' Increment STPLog Files Received by value '''
+        with self.lock:
+            self._Files_Received += value
+        if self._Parent is not None:
+            self._Parent.update_Files_Received(value)
+
+
+    def add_Features(self,features):
+        ''' Add the features negotiated by a connection to STPLog Features '''
+        with self.lock:
+            self._Features |= features
+        if self._Parent is not None:
+            self._Parent.add_Features(features)
+
+
+    def set_Kernel_Dropped(self,value):
+        ''' Set STPLog Kernel Dropped (None if not known) '''
+        with self.lock:
+            self._Kernel_Dropped = value
+
+
+    def get_ACK_Ratio(self):
+        ''' return ACKs sent per data segment received '''
+        if self._Segments_Received == 0:
+            return 0
+        return self._ACK_Sent / self._Segments_Received
+
+
+    def get_Counters(self):
+        ''' return the counters as a dict (ie to pass between processes) '''
+        with self.lock:
+            counters = {name: getattr(self,name) for name in RECEIVER_COUNTERS}
+            counters['_Features'] = int(self._Features)
+            return counters
+
+
+    def add_Counters(self,counters:dict):
+        ''' add the counters of another receiver log to this one '''
+        with self.lock:
+            for name in RECEIVER_COUNTERS:
+                value = counters.get(name)
+                if value is not None:
+                    setattr(self,name,(getattr(self,name) or 0) + value)
+            self._Features |= counters.get('_Features',defines.Feature.DEFAULT)
 
 
     def resultsData(self):
@@ -143,33 +331,28 @@ class receiverSTPLogs(STPLogs):
             data += '{:<45} {:>7}\n'.format('Data segments with Bit Errors',self._Corrupted_Received)
             data += '{:<45} {:>7}\n'.format('Duplicate data segments received',self._Duplicate_Received)
             data += '{:<45} {:>7}\n'.format('Duplicate ACKs sent',self._Duplicate_ACK_Sent)
+            if self._Features & defines.Feature.DELAYED_ACK:
+                data += '{:<45} {:>7}\n'.format('ACKs sent',self._ACK_Sent)
+                data += '{:<45} {:>7.2f}\n'.format('ACKs sent per data segment',self.get_ACK_Ratio())
+            if self._Features & defines.Feature.COMPRESSION:
+                data += '{:<45} {:>7}\n'.format('Compressed data segments received',self._Compressed_Received)
+            if self._Files_Received:
+                data += '{:<45} {:>7}\n'.format('Files received (sessions)',self._Files_Received)
+            if self._Kernel_Dropped is not None:
+                data += '{:<45} {:>7}\n'.format('Segments dropped by the kernel (buffer full)',self._Kernel_Dropped)
             data += '=======================================================\n'
             return data
 
 
-    def writeResults(self):
-        ''' Append Log FIle Results to LogFile '''
-        try:
-            f = open(RECEIVER_LOG,defines.APPEND)
-            results = self.resultsData()
-            f.write(results)
-            f.close()
-            print(results)
-        except Exception as err:
-            message.error("writeResults","Error Writing LogFile: {}".format(err))
 
 
-    def toFile(self,event="",timeRcv = -1.0, typePacket="",seq=-1,numBytes=-1,ack=-1):
-        ''' Write RCV/SND Logs to File '''
-        f = open(RECEIVER_LOG,defines.APPEND)
-        #print("{0} {1} {2} {3} {4} {5}".format(event,timeRcv,typePacket,seq,numBytes,ack))
-        f.write("{0} {1} {2} {3} {4} {5}\n".format(event,timeRcv,typePacket,seq,numBytes,ack))
-        f.close()
+
+SENDER_COUNTERS = ('_FileSize','_Transmitted','_PLDCount','_Dropped','_Corrupted','_ReOrdered','_Duplicated','_Delayed','_Retransmissions','_Fast_Retransmissions','_Duplicate_ACK_Received','_ACK_Received','_Payload_Sent','_Resumed')
 
 
 class senderSTPLogs(STPLogs):
     ''' Sender Log File Object '''
-    def __init__(self):
+    def __init__(self,verbosity=defines.LOG_FULL,filename=SENDER_LOG):
         self.lock = threading.RLock() 
         self._FileSize = 0 #Size of the file (in Bytes)#
         self._Transmitted = 0 #Segments transmitted (including drop & RXT)#
@@ -182,9 +365,14 @@ class senderSTPLogs(STPLogs):
         self._Retransmissions = 0 #Number of Retransmissions due to timeout#
         self._Fast_Retransmissions = 0 #Number of Fast Retransmissions#
         self._Duplicate_ACK_Received = 0 #Number of Duplicate Acknowledgements received#
+        self._ACK_Received = 0 #Number of Acknowledgements received#
+        self._Payload_Sent = 0 #Payload bytes transmitted (including drop & RXT)#
+        self._Files = None #Files in a multi-file session (None if a single file)#
+        self._Resumed = 0 #Bytes the receiver held already (resumed transfer)#
+        self._Features = defines.Feature.DEFAULT #Features negotiated (results of the others are not written)#
+        self._Verbosity = verbosity
 
-        f = open(SENDER_LOG,defines.WRITE)
-        f.close()
+        self._writer = logWriter(filename)
 
 
     def set_FileSize(self,value:int):
@@ -198,6 +386,24 @@ class senderSTPLogs(STPLogs):
         return self._FileSize
 
 
+    def set_Files(self,value:int):
+        ''' Set STPLog Files (multi-file session) '''
+        with self.lock:
+            self._Files = value
+
+
+    def set_Resumed(self,value:int):
+        ''' Set STPLog Resumed (bytes skipped by a resumed transfer) '''
+        with self.lock:
+            self._Resumed = value
+
+
+    def add_Features(self,features):
+        ''' Add the features negotiated at handshake to STPLog Features '''
+        with self.lock:
+            self._Features |= features
+
+
     def incr_Transmitted(self):
         ''' Increment STPLog Transmitted by 1 '''
         with self.lock:
@@ -258,9 +464,55 @@ class senderSTPLogs(STPLogs):
             self._Duplicate_ACK_Received += 1   
 
 
+    def incr_ACK_Received(self):
+        ''' Increment STPLog ACK Received by 1 '''
+        with self.lock:
+            self._ACK_Received += 1
+
+
+    def update_Payload_Sent(self,value:int):
+        ''' Increment STPLog Payload Sent by value bytes '''
+        with self.lock:
+            self._Payload_Sent += value
+
+
+    def get_Payload_Ratio(self):
+        ''' return payload bytes transmitted per byte of the file '''
+        if self._FileSize == 0:
+            return 0
+        return self._Payload_Sent / self._FileSize
+
+
+    def get_ACK_Ratio(self):
+        ''' return ACKs received per segment transmitted '''
+        if self._Transmitted == 0:
+            return 0
+        return self._ACK_Received / self._Transmitted
+
+
+    def get_Counters(self):
+        ''' return the counters as a dict (ie to pass between processes) '''
+        with self.lock:
+            counters = {name: getattr(self,name) for name in SENDER_COUNTERS}
+            counters['_Features'] = int(self._Features)
+            return counters
+
+
+    def add_Counters(self,counters:dict):
+        ''' add the counters of another sender log to this one '''
+        with self.lock:
+            for name in SENDER_COUNTERS:
+                setattr(self,name,getattr(self,name) + counters.get(name,0))
+            self._Features |= counters.get('_Features',defines.Feature.DEFAULT)
+
+
     def resultsData(self):
             data = '=======================================================\n'
             data += '{:<45} {:>7}\n'.format('Size of the file (in Bytes)',self._FileSize)
+            if self._Files is not None:
+                data += '{:<45} {:>7}\n'.format('Files in the session',self._Files)
+            if self._Resumed:
+                data += '{:<45} {:>7}\n'.format('Bytes resumed from the receivers checkpoint',self._Resumed)
             data += '{:<45} {:>7}\n'.format('Segments transmitted (including drop & RXT)',self._Transmitted)
             data += '{:<45} {:>7}\n'.format('Number of Segments handled by PLD',self._PLDCount)
             data += '{:<45} {:>7}\n'.format('Number of Segments dropped',self._Dropped)
@@ -271,24 +523,11 @@ class senderSTPLogs(STPLogs):
             data += '{:<45} {:>7}\n'.format('Number of Retransmissions due to TIMEOUT',self._Retransmissions)
             data += '{:<45} {:>7}\n'.format('Number of FAST RETRANSMISSION',self._Fast_Retransmissions)
             data += '{:<45} {:>7}\n'.format('Number of DUP ACKS received',self._Duplicate_ACK_Received)
+            if self._Features & defines.Feature.DELAYED_ACK:
+                data += '{:<45} {:>7}\n'.format('Number of ACKS received',self._ACK_Received)
+                data += '{:<45} {:>7.2f}\n'.format('ACKS received per segment transmitted',self.get_ACK_Ratio())
+            if self._Features & defines.Feature.COMPRESSION:
+                data += '{:<45} {:>7}\n'.format('Payload bytes transmitted (including RXT)',self._Payload_Sent)
+                data += '{:<45} {:>7.2f}\n'.format('Payload bytes transmitted per file byte',self.get_Payload_Ratio())
             data += '=======================================================\n'
             return data
-
-    def writeResults(self):
-        ''' Append Log FIle Results to LogFile '''
-        try:
-            f = open(SENDER_LOG,defines.APPEND)
-            results = self.resultsData()
-            f.write(results)
-            f.close()
-            print(results)
-        except Exception as err:
-            message.error("writeResults","Error Writing LogFile: {}".format(err))
-
-
-    def toFile(self,event="",timeRcv = -1.0, typePacket="",seq=-1,numBytes=-1,ack=-1):
-        ''' Write RCV/SND Logs to File '''
-        f = open(SENDER_LOG,defines.APPEND)
-        #print("{0} {1} {2} {3} {4} {5}".format(event,timeRcv,typePacket,seq,numBytes,ack))
-        f.write("{0} {1} {2} {3} {4} {5}\n".format(event,timeRcv,typePacket,seq,numBytes,ack))
-        f.close()
\ No newline at end of file
@@ -1,8 +1,29 @@
 #! /usr/bin/env python3.6
 
 from os import sys
-import struct, binascii, hashlib
-from classes import defines,protocol,threads,arguments,timer,log
+import os, mmap, struct, binascii, hashlib, threading, bisect
+from classes import defines,protocol,threads,arguments,timer,log,checksum,compress
+
+
+HEADER_FORMAT = "!LLB2s"
+FEATURES_FORMAT = "!H" # SYN/SYN-ACK options - feature bitmask
+FEATURES_SIZE = struct.calcsize(FEATURES_FORMAT)
+OPTION_FORMAT = "!BB" # SYN/SYN-ACK options following the feature bitmask - type and length, the value follows
+OPTION_SIZE = struct.calcsize(OPTION_FORMAT)
+BLOCK_FORMAT = "!LL" # ACK options - (start,end) received ranges
+BLOCK_SIZE = struct.calcsize(BLOCK_FORMAT)
+BLOCK64_FORMAT = "!QQ" # ACK options of a 64 bit header
+BLOCK64_SIZE = struct.calcsize(BLOCK64_FORMAT)
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT) # 11 bytes
+SEQ64_FORMAT = "!LL" # high 32 bits of the sequence and ACK numbers following the header (64 bit header)
+SEQ64_SIZE = struct.calcsize(SEQ64_FORMAT)
+TIMESTAMP_FORMAT = "!L" # optional timestamp (data) or timestamp echo (ACK) following the header
+TIMESTAMP_SIZE = struct.calcsize(TIMESTAMP_FORMAT)
+MAX_HEADER_SIZE = HEADER_SIZE + SEQ64_SIZE + TIMESTAMP_SIZE
+FRAME_FORMAT = "!HQ" # session file frame - name length and file size, the utf-8 name follows (then the file)
+FRAME_SIZE = struct.calcsize(FRAME_FORMAT)
+CHECKSUM_OFFSET = 9
+FLAGS_OFFSET = 8
 
 
 class STPMessage(object):
@@ -12,7 +33,13 @@ class STPMessage(object):
         self._ACKNumber = 0
         self._Flags = defines.Perm.DEFAULT
         self._Payload = ""
+        self._Options = b"" # carried in place of the payload by SYN/ACK segments
+        self._Timestamp = None # timestamp (data) or timestamp echo (ACK), if any
+        self._Wide = False # 64 bit sequence and ACK numbers
+        self._Compressed = False # payload compressed with the connections codec
+        self._Blocks = None # (start,end) received ranges (ACK), packed when sent
         self._Recipient = None
+        self._ChecksumType = defines.CHECKSUM_INTERNET
         
 
     def set_SequenceNumber(self,value: int):
@@ -55,6 +82,118 @@ class STPMessage(object):
         return self._CheckSum
 
 
+    def set_ChecksumType(self,value):
+        ''' set STPMessage Checksum Algorithm '''
+        self._ChecksumType = value
+
+
+    def get_ChecksumType(self):
+        ''' get STPMessage Checksum Algorithm '''
+        return self._ChecksumType
+
+
+    def get_WireFlags(self):
+        ''' get STPMessage Flags as sent in the header (includes checksum algorithm and timestamp) '''
+        flags = self._Flags
+        if self._ChecksumType == defines.CHECKSUM_CRC32:
+            flags |= defines.Perm.CRC32
+        if self._Timestamp is not None:
+            flags |= defines.Perm.TIMESTAMP
+        if self._Wide:
+            flags |= defines.Perm.SEQ64
+        if self._Compressed:
+            flags |= defines.Perm.COMPRESSED
+        return flags
+
+
+    def set_Wide(self,value:bool):
+        ''' set STPMessage header to carry 64 bit sequence and ACK numbers '''
+        self._Wide = value
+
+
+    def is_Wide(self):
+        ''' return True if the STPMessage header carries 64 bit sequence and ACK numbers '''
+        return self._Wide
+
+
+    def set_Compressed(self,value:bool):
+        ''' set STPMessage payload as compressed with the connections codec '''
+        self._Compressed = value
+
+
+    def is_Compressed(self):
+        ''' return True if the STPMessage payload is compressed with the connections codec '''
+        return self._Compressed
+
+
+    def get_PayloadBytes(self):
+        ''' get STPMessage Payload as bytes '''
+        if type(self._Payload) is str:
+            return self._Payload.encode('utf-8')
+        return self._Payload
+
+
+    def set_Options(self,value:bytes):
+        ''' set STPMessage Options (SYN/ACK segments only) '''
+        self._Options = value
+
+
+    def get_Options(self):
+        ''' get STPMessage Options '''
+        return self._Options
+
+
+    def get_Body(self):
+        ''' get STPMessage bytes following the header (options for SYN/ACK segments, otherwise payload) '''
+        if self._Blocks:
+            blockFormat = BLOCK64_FORMAT if self._Wide else BLOCK_FORMAT
+            return b''.join(struct.pack(blockFormat,start,end) for start,end in self._Blocks)
+        if self._Options:
+            return self._Options
+        return self.get_PayloadBytes()
+
+
+    def set_Features(self,features:int,options:dict={}):
+        ''' set STPMessage Options to a feature bitmask followed by {Option: value} TLVs (SYN/SYN-ACK) '''
+        self._Options = struct.pack(FEATURES_FORMAT,features) + pack_options(options)
+
+
+    def get_Features(self):
+        ''' get STPMessage feature bitmask from its Options (0 if none) '''
+        if len(self._Options) < FEATURES_SIZE:
+            return defines.Feature.DEFAULT
+        return defines.Feature(struct.unpack_from(FEATURES_FORMAT,self._Options)[0] & defines.Feature.ALL)
+
+
+    def get_HandshakeOptions(self):
+        ''' get STPMessage {type: value} TLVs following the feature bitmask (SYN/SYN-ACK) '''
+        return unpack_options(self._Options[FEATURES_SIZE:])
+
+
+    def set_Blocks(self,blocks:list):
+        ''' set STPMessage (start,end) received ranges (ACK) - packed as its Options when sent '''
+        self._Blocks = blocks
+
+
+    def get_Blocks(self):
+        ''' get STPMessage (start,end) received ranges (from its Options if received) '''
+        if self._Blocks is None:
+            blockFormat, blockSize = (BLOCK64_FORMAT,BLOCK64_SIZE) if self._Wide else (BLOCK_FORMAT,BLOCK_SIZE)
+            count = len(self._Options) // blockSize
+            self._Blocks = [struct.unpack_from(blockFormat,self._Options,i*blockSize) for i in range(count)]
+        return self._Blocks
+
+
+    def set_Timestamp(self,value):
+        ''' set STPMessage Timestamp (None for no timestamp field) '''
+        self._Timestamp = value
+
+
+    def get_Timestamp(self):
+        ''' get STPMessage Timestamp '''
+        return self._Timestamp
+
+
     def set_Payload(self,value):
         ''' set STPMessage Payload '''
         self._Payload = value
@@ -145,7 +284,7 @@ class STPMessage(object):
 
     def isCorrupted(self,chk):
         ''' return True if STPMessage Checksum Fails '''
-        return chk != self.calc_CheckSum(self.packMsgNoHash())
+        return chk != self.calc_CheckSum(self.packHeader(self.get_WireFlags()),self.get_Body())
 
 
     def createACKResponse(self,msgLength = 0):
@@ -167,64 +306,108 @@ class STPMessage(object):
             Calculate a 16 bit hash of msg 
             as per RFC https://tools.ietf.org/html/rfc1071 
         '''
-        msgSum = 0
-        if len(msg)%2:
-            msg += "\x00".encode('utf-8')
-        for (a, b) in zip(msg[0::2], msg[1::2]):
-            curr = msgSum + (a + (b << 8))
-            msgSum = (curr & 0xffff) + (curr >> 16)
-        return ~msgSum & 0xffff
+        return checksum.internet(msg)
+
+
+    def calc_CheckSum(self,*chunks):
+        ''' Calculate the Checksum of msg chunks with the messages checksum algorithm '''
+        return checksum.calc(self._ChecksumType,*chunks)
+
+
+    def packFields(self,header:bytearray,flags):
+        ''' Packs the STPMessage header fields (big endian) with a zeroed checksum into header, returns its size '''
+        size = HEADER_SIZE
+        if self._Wide:
+            ''' the 11 byte header holds the low 32 bits, the high 32 bits follow it '''
+            struct.pack_into(HEADER_FORMAT,header,0,self._SequenceNumber & defines.SEQ_MASK,self._ACKNumber & defines.SEQ_MASK,flags,b"\x00\x00")
+            struct.pack_into(SEQ64_FORMAT,header,size,self._SequenceNumber >> 32,self._ACKNumber >> 32)
+            size += SEQ64_SIZE
+        else:
+            struct.pack_into(HEADER_FORMAT,header,0,self._SequenceNumber,self._ACKNumber,flags,b"\x00\x00")
+        if self._Timestamp is not None:
+            struct.pack_into(TIMESTAMP_FORMAT,header,size,self._Timestamp)
+            size += TIMESTAMP_SIZE
+        return size
+
+
+    def packHeader(self,flags):
+        ''' Packs the STPMessage header fields (big endian) with a zeroed checksum '''
+        header = bytearray(MAX_HEADER_SIZE)
+        return bytes(header[:self.packFields(header,flags)])
 
 
-    def calc_CheckSum(self,msg):
-        ''' Calculate the Checksum of msg '''
-        hashValue = self.checksum(msg)
-        return (hashValue).to_bytes(2, 'little')
+    def packInto(self,header:bytearray,corrupt=False):
+        '''
+            Packs the STPMessage header into a reusable header buffer and returns the
+            [header, payload] buffers to be sent with scatter-gather (payload is not copied).
+            If corrupt, the flag has a single bit error after the checksum is calculated.
+        '''
+        flags = self.get_WireFlags()
+        payload = self.get_Body()
+        size = self.packFields(header,flags)
+        view = memoryview(header)[:size]
+        header[CHECKSUM_OFFSET:HEADER_SIZE] = self.calc_CheckSum(view,payload)
+        if corrupt:
+            header[FLAGS_OFFSET] = flags + 1
+        return [view, payload]
 
 
     def packMsg(self):
         ''' Packs message into STPMessage Packet (big endian) with checksum hash '''
-        msg = struct.pack("!LLB",self._SequenceNumber,self._ACKNumber,self._Flags)
-        msg += self.calc_CheckSum(self.packMsgNoHash())
-        if type(self._Payload) is str:
-            msg += self._Payload.encode('utf-8')
-        else:
-            msg += self._Payload
-        return msg
+        return b''.join(self.packInto(bytearray(MAX_HEADER_SIZE)))
 
 
     def packMsgNoHash(self):
         ''' Packs message into STPMessage Packet (big endian) with no checksum hash '''
-        msg = struct.pack("!LLB", self._SequenceNumber, self._ACKNumber, self._Flags)
-        msg += "\x00\x00".encode('utf-8')
-        if type(self._Payload) is str:
-            msg += self._Payload.encode('utf-8')
-        else:
-            msg += self._Payload
-        return msg
+        return self.packHeader(self.get_WireFlags()) + self.get_Body()
 
 
     def packCorruptedMsg(self):
         ''' Packs a corrupted message (flag has single bit error) into STPMessage Packet (big endian) '''
-        msg = struct.pack("!LLB", self._SequenceNumber, self._ACKNumber, self._Flags + 1)
-        msg += self.calc_CheckSum(self.packMsgNoHash())
-        if type(self._Payload) is str:
-            msg += self._Payload.encode('utf-8')
-        else:
-            msg += self._Payload
-        return msg
+        return b''.join(self.packInto(bytearray(MAX_HEADER_SIZE),corrupt=True))
 
 
     def unpackMsg(self,msg):
         ''' unpacks message STPMessage'''
         try:
-            self._SequenceNumber, self._ACKNumber, self._Flags, CheckSum = struct.unpack("!LLB2s",msg[:11])
-            self._Payload = msg[11:]
+            self._SequenceNumber, self._ACKNumber, flags, CheckSum = struct.unpack_from(HEADER_FORMAT,msg)
+            self._Options = b""
+            self._Blocks = None
+            size = HEADER_SIZE
+
+            ''' 64 bit header - the high 32 bits of the sequence and ACK numbers follow '''
+            self._Wide = bool(flags & defines.Perm.SEQ64)
+            if self._Wide:
+                seqHigh, ackHigh = struct.unpack_from(SEQ64_FORMAT,msg,size)
+                self._SequenceNumber |= seqHigh << 32
+                self._ACKNumber |= ackHigh << 32
+                size += SEQ64_SIZE
+
+            ''' optional timestamp field follows the header '''
+            if flags & defines.Perm.TIMESTAMP:
+                self._Timestamp = struct.unpack_from(TIMESTAMP_FORMAT,msg,size)[0]
+                size += TIMESTAMP_SIZE
+            else:
+                self._Timestamp = None
+            self._Payload = msg[size:]
+
+            ''' checksum algorithm is carried in the flags '''
+            if flags & defines.Perm.CRC32:
+                self._ChecksumType = defines.CHECKSUM_CRC32
+            else:
+                self._ChecksumType = defines.CHECKSUM_INTERNET
+            self._Compressed = bool(flags & defines.Perm.COMPRESSED)
+            self._Flags = flags & ~(defines.Perm.CRC32|defines.Perm.TIMESTAMP|defines.Perm.SEQ64|defines.Perm.COMPRESSED)
 
             ''' check the checksum matches '''
             if self.isCorrupted(CheckSum):
                 return defines.CORRUPT
 
+            ''' SYN/ACK segments carry options rather than a payload '''
+            if self._Flags & (defines.Perm.SYN|defines.Perm.ACK):
+                self._Options = bytes(self._Payload)
+                self._Payload = b""
+
         except Exception as err:
             log.message.error("unpackMsg","{}".format(err))
             return defines.FAILURE
@@ -243,63 +426,411 @@ class STPMessage(object):
         print("-------------------------------------")
 
 
-class STPMSGQueue(object):
-    ''' STP message queue '''
-    def __init__(self):
-        self._msgQueue = []
-        self._length = 0
+class STPSegmentSource(object):
+    ''' 
+        Lazy STP segment source - memory maps a file and slices MSS segments on demand.
+        Serves the sender's msg queue (get_msg, get_range, get_key_index, get_seq_index) with
+        segment boundaries computed from MSS.
+        Given an offset (and end) the segments cover that range of the file (a resumed transfer or stripe).
+    '''
+    def __init__(self,filename,mss:int,seqNum=0,offset=0,end=None):
+        self._file = open(filename,defines.READ_BYTE)
+        self._fileSize = os.fstat(self._file.fileno()).st_size
+        self._mss = mss
+        self._base = seqNum # sequence number of the first byte
+        self._end = self._fileSize if end is None else min(end,self._fileSize) # file offset after the last segment
+        self._start = min(offset,self._end) # file offset of the first segment
+        self._released = 0 # bytes already released from memory
+        self._length = -(-(self._end - self._start) // mss)
+        self._map = None
+        self._view = memoryview(b'')
+        if self._fileSize > 0:
+            self._map = mmap.mmap(self._file.fileno(),0,access=mmap.ACCESS_READ)
+            if hasattr(self._map,'madvise'):
+                self._map.madvise(mmap.MADV_SEQUENTIAL)
+            self._view = memoryview(self._map)
 
 
-    def add(self,item:tuple):
-        ''' add items to msg queue - (msg,seqNum,ackNum) '''
-        try:
-            if item not in self._msgQueue:
-                self._msgQueue.append(item)
-                self._length += 1
-        except:
-            pass
+    def get_msg(self,index):
+        ''' returns msg tuple (payload view,seqNum,ackNum) from index '''
+        if index >= 0 and index < self._length:
+            start = self._start + index * self._mss
+            end = min(start + self._mss,self._end)
+            return (self._view[start:end],self._base + start,self._base + end)
+        return ()
+
+
+    def get_range(self,start,end):
+        ''' yields (index,msg tuple) for queue indexes start to end (exclusive) '''
+        for index in range(max(start,0),min(end,self._length)):
+            yield index, self.get_msg(index)
+
+
+    def get_key(self,index):
+        ''' return a queue index's ack number (without reading its payload) '''
+        if index < 0 or index >= self._length:
+            return -1
+        return self._base + min(self._start + (index + 1) * self._mss,self._end)
 
 
-    def remove(self,index:int):
-        ''' remove items from msg queue '''
+    def get_key_index(self,key):
+        ''' returns a keys (ack number) queue index '''
+        offset = key - self._base - self._start
+        if offset <= 0 or offset > self._end - self._start:
+            return -1
+        if offset == self._end - self._start:
+            return self._length - 1
+        if offset % self._mss:
+            return -1
+        return offset // self._mss - 1
+
+
+    def get_seq_index(self,seq):
+        ''' returns a sequence numbers queue index '''
+        offset = seq - self._base - self._start
+        if offset < 0 or offset >= self._end - self._start or offset % self._mss:
+            return -1
+        return offset // self._mss
+
+
+    def get_length(self):
+        ''' return the number of segments '''
+        return self._length
+
+
+    def get_FileSize(self):
+        ''' return the size of the file in bytes '''
+        return self._fileSize
+
+
+    def release(self,index):
+        ''' release the memory of all segments before index (ie ACK'd segments) '''
+        if self._map is None or not hasattr(mmap,'MADV_DONTNEED'):
+            return
+        end = (self._start + min(index,self._length) * self._mss) // mmap.PAGESIZE * mmap.PAGESIZE
+        if end > self._released:
+            self._map.madvise(mmap.MADV_DONTNEED,self._released,end - self._released)
+            self._released = end
+
+
+    def close(self):
+        ''' close the memory map and file '''
         try:
-            self._msgQueue.remove(index)
-            self._length -= 1
-        except:
+            self._view.release()
+            if self._map is not None:
+                self._map.close()
+        except BufferError:
+            ''' segments still referenced (ie delayed msgs) - closed when collected '''
             pass
+        self._file.close()
+
+
+
+class STPSessionSource(STPSegmentSource):
+    '''
+        Segment source over a session of files. Each file is framed by its name and size and
+        the frames follow each other in the sequence space, so a segment may carry the end of
+        one file and the start of the next (ie many small files). File data is read on demand.
+    '''
+    def __init__(self,files:list,mss:int,seqNum=0):
+        self._Paths = [] # per frame - file path, header bytes, file size and stream offset
+        self._Headers = []
+        self._Sizes = []
+        self._Starts = []
+        offset = 0
+        for path, name, size in files:
+            self._Paths.append(path)
+            self._Headers.append(pack_frame(name,size))
+            self._Sizes.append(size)
+            self._Starts.append(offset)
+            offset += len(self._Headers[-1]) + size
+        self._fileSize = offset
+        self._mss = mss
+        self._base = seqNum # sequence number of the first byte
+        self._start = 0
+        self._end = offset
+        self._length = -(-offset // mss)
+        self._map = None # files are read on demand, there is no memory to release
+        self._Lock = threading.Lock()
+        self._OpenFrame = None # frame of the file open for reading
+        self._OpenFile = None
 
 
-    def get_msgQueue(self):
-        ''' returns the Msg Queue '''
-        return self._msgQueue
+    def get_msg(self,index):
+        ''' returns msg tuple (payload,seqNum,ackNum) from index - the frames the segment covers '''
+        if index < 0 or index >= self._length:
+            return ()
+        start = index * self._mss
+        end = min(start + self._mss,self._fileSize)
+        chunks = []
+        frame = bisect.bisect_right(self._Starts,start) - 1
+        position = start
+        while position < end:
+            header = self._Headers[frame]
+            offset = position - self._Starts[frame]
+            if offset < len(header):
+                chunk = header[offset:offset + end - position]
+            else:
+                offset -= len(header)
+                chunk = self.read_file(frame,offset,min(end - position,self._Sizes[frame] - offset))
+            chunks.append(chunk)
+            position += len(chunk)
+            if position == self._Starts[frame] + len(header) + self._Sizes[frame]:
+                frame += 1
+        return (b''.join(chunks),self._base + start,self._base + end)
+
+
+    def read_file(self,frame,offset,size):
+        ''' read size bytes at offset of a frames file (zero filled if it is now shorter) '''
+        with self._Lock:
+            try:
+                if self._OpenFrame != frame:
+                    self.close_file()
+                    self._OpenFile = open(self._Paths[frame],defines.READ_BYTE)
+                    self._OpenFrame = frame
+                self._OpenFile.seek(offset)
+                data = self._OpenFile.read(size)
+            except OSError as err:
+                log.message.error("read_file","{}".format(err))
+                data = b''
+        if len(data) < size:
+            log.message.error("read_file","{} is shorter than when the session started".format(self._Paths[frame]))
+            data += bytes(size - len(data))
+        return data
+
+
+    def get_Files(self):
+        ''' return the number of files in the session '''
+        return len(self._Paths)
+
+
+    def close_file(self):
+        ''' close the file open for reading '''
+        if self._OpenFile is not None:
+            self._OpenFile.close()
+        self._OpenFile = None
+        self._OpenFrame = None
+
+
+    def close(self):
+        ''' close the file open for reading '''
+        with self._Lock:
+            self.close_file()
+
+
+
+class STPCompressedSource(object):
+    '''
+        Wraps a segment source, compressing each segment with codec in a background thread
+        ahead of the window. get_msg returns the compressed payload of a segment that got
+        smaller, else its raw payload. After a segment that does not get smaller the next are
+        sent raw without trying, for a run that doubles with each further one (ie compressed files).
+    '''
+    def __init__(self,source,codec,level=defines.COMPRESS_LEVEL,ahead=defines.COMPRESS_AHEAD):
+        self._Source = source
+        self._Compress = compress.compressor(codec,level)
+        self._Ahead = ahead # segments compressed past the first unreleased segment
+        self._Payloads = {} # index -> compressed payload (segments sent raw are absent)
+        self._Next = 0 # next segment to compress
+        self._First = 0 # first unreleased segment
+        self._Skip = 0 # segments left to send raw without trying
+        self._SkipRun = 1 # segments sent raw after the next incompressible segment
+        self._Compressing = set() # segments claimed and being compressed (without the lock)
+        self._Condition = threading.Condition()
+        self._Running = True
+        self._Thread = threading.Thread(target=self.compress_ahead,daemon=True)
+        self._Thread.start()
 
 
     def get_msg(self,index):
-        ''' returns msg tuple from index '''
-        if index >= 0 and index < self._length:
-            return self.get_msgQueue()[index]
-        return ()
+        ''' returns msg tuple (payload,seqNum,ackNum) from index - compressing it now if the thread is behind '''
+        msg = self._Source.get_msg(index)
+        if msg:
+            if index >= self._Next or index in self._Compressing:
+                self.compress_to(index + 1)
+            payload = self._Payloads.get(index)
+            if payload is not None:
+                return (payload,msg[1],msg[2])
+        return msg
+
+
+    def get_range(self,start,end):
+        ''' yields (index,msg tuple) for queue indexes start to end (exclusive) '''
+        for index in range(max(start,0),min(end,self.get_length())):
+            yield index, self.get_msg(index)
 
 
     def get_key(self,index):
-        ''' return a queue index's tuple '''
-        msg = self.get_msg(index)
-        if len(msg) != 3:
-            return -1
-        return msg[2]
+        ''' return a queue index's ack number (without compressing it) '''
+        return self._Source.get_key(index)
 
 
     def get_key_index(self,key):
-        ''' returns a keys queue index '''
-        for i in range(0,self.get_length()):
-            if self.get_key(i) == key:
-                return i
-        return -1
+        ''' returns a keys (ack number) queue index '''
+        return self._Source.get_key_index(key)
+
+
+    def get_seq_index(self,seq):
+        ''' returns a sequence numbers queue index '''
+        return self._Source.get_seq_index(seq)
 
 
     def get_length(self):
-        ''' return the queue length '''
-        return self._length
+        ''' return the number of segments '''
+        return self._Source.get_length()
+
+
+    def get_FileSize(self):
+        ''' return the size of the source in bytes '''
+        return self._Source.get_FileSize()
+
+
+    def claim_next(self):
+        ''' claim the next segment to compress (holding the condition lock), returns (index,raw payload) - None if it is sent raw without trying '''
+        index = self._Next
+        if self._Skip > 0:
+            self._Skip -= 1
+            self._Next += 1
+            return None
+        ''' marked as compressing before _Next passes it, so get_msg waits for it '''
+        self._Compressing.add(index)
+        self._Next += 1
+        return index, self._Source.get_msg(index)[0]
+
+
+    def compress(self,claimed):
+        ''' compress a claimed segment without the condition lock held, then store its payload '''
+        if claimed is None:
+            return
+        index, raw = claimed
+        payload = self._Compress(raw)
+        with self._Condition:
+            if len(payload) < len(raw):
+                if index >= self._First:
+                    self._Payloads[index] = payload
+                self._SkipRun = 1
+            else:
+                ''' incompressible - send raw, and the next segments without trying '''
+                self._Skip = self._SkipRun
+                self._SkipRun = min(self._SkipRun * 2,defines.COMPRESS_SKIP_MAX)
+            self._Compressing.discard(index)
+            self._Condition.notify_all()
+
+
+    def compress_to(self,end):
+        ''' compress the segments before end the background thread has not reached, and wait for those it is compressing '''
+        end = min(end,self.get_length())
+        while True:
+            with self._Condition:
+                if self._Next >= end:
+                    while any(index < end for index in self._Compressing):
+                        self._Condition.wait()
+                    return
+                claimed = self.claim_next()
+            self.compress(claimed)
+
+
+    def compress_ahead(self):
+        ''' background thread - keep ahead segments past the first unreleased segment compressed '''
+        length = self.get_length()
+        while True:
+            with self._Condition:
+                while self._Running and self._Next < length and self._Next >= self._First + self._Ahead:
+                    self._Condition.wait()
+                if not self._Running or self._Next >= length:
+                    return
+                claimed = self.claim_next()
+            self.compress(claimed)
+
+
+    def release(self,index):
+        ''' release the memory of all segments before index (ie ACK'd segments) and let the thread move on '''
+        self._Source.release(index)
+        with self._Condition:
+            for released in range(self._First,min(index,self._Next)):
+                self._Payloads.pop(released,None)
+            self._First = max(self._First,index)
+            self._Condition.notify_all()
+
+
+    def close(self):
+        ''' stop the background thread and close the source '''
+        with self._Condition:
+            self._Running = False
+            self._Condition.notify_all()
+        self._Thread.join()
+        self._Source.close()
+
+
+
+def pack_frame(name,size):
+    ''' pack a session file frame header - name length, file size and utf-8 name '''
+    encoded = name.encode('utf-8','surrogateescape')
+    return struct.pack(FRAME_FORMAT,len(encoded),size) + encoded
+
+
+def session_name(path):
+    ''' return the name a path is recreated as in a session - relative, with / separators and no .. '''
+    parts = os.path.normpath(path).split(os.sep)
+    return '/'.join(part for part in parts if part not in ('', '.', '..'))
+
+
+def directory_files(root,prefix=''):
+    ''' return the (path,name,size) of each file under root, named relative to root (after prefix) '''
+    files = []
+    for directory, subdirectories, filenames in os.walk(root):
+        subdirectories.sort()
+        for filename in sorted(filenames):
+            path = os.path.join(directory,filename)
+            if os.path.isfile(path):
+                name = session_name(os.path.join(prefix,os.path.relpath(path,root)))
+                files.append((path,name,os.path.getsize(path)))
+    return files
+
+
+def session_files(filename):
+    ''' return the (path,name,size) of each file of a session - a directory, or the files (or directories) listed in an @manifest '''
+    if not filename.startswith(defines.MANIFEST_PREFIX):
+        return directory_files(filename)
+    files = []
+    with open(filename[len(defines.MANIFEST_PREFIX):]) as manifest:
+        for line in manifest:
+            path = line.strip()
+            if not path or path.startswith('#'):
+                continue
+            if os.path.isdir(path):
+                files += directory_files(path,session_name(path))
+            else:
+                files.append((path,session_name(path),os.path.getsize(path)))
+    return files
+
+
+def session_size(files:list):
+    ''' return the bytes of a session - the frames and files '''
+    return sum(FRAME_SIZE + len(name.encode('utf-8','surrogateescape')) + size for path, name, size in files)
+
+
+def pack_options(options:dict):
+    ''' pack {type: int value} as TLVs, each value big endian in as few bytes as it needs '''
+    data = b''
+    for kind, value in options.items():
+        length = max((value.bit_length() + 7) // 8,1)
+        data += struct.pack(OPTION_FORMAT,kind,length) + value.to_bytes(length,'big')
+    return data
+
+
+def unpack_options(data):
+    ''' unpack TLVs to {type: int value} - callers ignore the types they do not know, a truncated TLV ends the options '''
+    options = {}
+    offset = 0
+    while offset + OPTION_SIZE <= len(data):
+        kind, length = struct.unpack_from(OPTION_FORMAT,data,offset)
+        offset += OPTION_SIZE
+        if offset + length > len(data):
+            break
+        options[kind] = int.from_bytes(data[offset:offset + length],'big')
+        offset += length
+    return options
 
 
 
@@ -41,9 +41,7 @@ class PLDModule(object):
                 msg = self.get_reOrderedMsg()
                 if msg is not None:
                     protocol = self.get_Stp()
-                    socket = protocol.get_Socket()
-                    with protocol.lock:
-                        socket.sendto(msg.packMsg(), msg.get_Recipient())
+                    protocol.transmit(msg)
                     self._reOrderedMsg = None
                     protocol.get_LogFile().toFile("snd/rord",protocol.get_TimePassed(),msg.getType(),
                     msg.get_SequenceNumber(),len(msg.get_Payload()),msg.get_ACKNumber())
@@ -57,7 +55,6 @@ class PLDModule(object):
             if msg is None:
                 return
             protocol = self.get_Stp()
-            socket = protocol.get_Socket()
 
             ''' Log File Params '''
             logFile = protocol.get_LogFile()
@@ -79,19 +76,16 @@ class PLDModule(object):
 
             elif self.duplicateMsg():
                 ''' forward the segment twice back-to-back. '''
-                packedMsg = msg.packMsg()
-                recipient = msg.get_Recipient()
                 with protocol.lock:
-                    socket.sendto(packedMsg, recipient)
-                    socket.sendto(packedMsg, recipient)
+                    protocol.transmit(msg)
+                    protocol.transmit(msg)
                 logEvent += "/dup"
                 logFile.incr_Duplicated()
                 #logFile.incr_Transmitted() # We transmitted 2x segments??
 
             elif self.corruptMsg():
                 '''introduce one bit error in msg forward the STP segment to UDP '''
-                with protocol.lock:
-                    socket.sendto(msg.packCorruptedMsg(), msg.get_Recipient())
+                protocol.transmit(msg,corrupt=True)
                 logEvent += "/corr"
                 logFile.incr_Corrupted()
 
@@ -102,18 +96,16 @@ class PLDModule(object):
                     logFile.incr_ReOrdered()
                     return
                 else:
-                    with protocol.lock:
-                        socket.sendto(msg.packMsg(), msg.get_Recipient())
+                    protocol.transmit(msg)
 
             elif self.delayMsg():
                 ''' Delay segment between 0 to MaxDelay ms '''
                 stpDelay = self.getRandomUniform(0,protocol.get_Args().get_maxDelay())
-                Timer(stpDelay/1000, sendDelayedMsg,args=[self,msg]).start()
+                protocol.call_later(stpDelay/1000,sendDelayedMsg,self,msg)
                 logFile.incr_Delayed()
                 return
             else:
-                with protocol.lock:
-                    socket.sendto(msg.packMsg(), msg.get_Recipient())
+                protocol.transmit(msg)
 
             ''' Log Msg Info '''
             logFile.toFile(logEvent,logTime,logType,logSeq,logBytes,logAck)
@@ -189,11 +181,9 @@ class PLDModule(object):
 
 def sendDelayedMsg(pld,msg):
     ''' Sends a Delayed Message - ignores if connection already terminated'''
-    if defines.uploading:
-        protocol = pld.get_Stp()
-        socket = protocol.get_Socket()
-        with protocol.lock:
-            socket.sendto(msg.packMsg(), msg.get_Recipient())
+    protocol = pld.get_Stp()
+    if protocol.is_Uploading():
+        protocol.transmit(msg)
         protocol.get_LogFile().toFile("snd/dely",protocol.get_TimePassed(),msg.getType(),
             msg.get_SequenceNumber(),len(msg.get_Payload()),msg.get_ACKNumber())
 
@@ -2,12 +2,17 @@
 
 from abc import ABCMeta, abstractmethod
 from socket import *
+import os
 from os import sys, urandom
 from heapq import *
-from classes import defines,arguments,timer,message,window,pld,defines,log
+from classes import defines,arguments,timer,message,window,pld,defines,log,writer,buffer,congestion,batch,sockopts,compress,checkpoint
 from enum import IntFlag, auto
 from math import floor
-import threading, datetime
+import threading, datetime, selectors, time
+
+
+''' scatter-gather send is not available on all platforms (ie Windows) '''
+SCATTER_GATHER = hasattr(socket, 'sendmsg')
 
 
 class STPConnection(object):
@@ -21,6 +26,9 @@ class STPConnection(object):
         self.lock = threading.RLock() 
         self._time = datetime.datetime.now()
         self._logFile = None
+        self._Header = bytearray(message.MAX_HEADER_SIZE) # reusable header buffer (guarded by lock)
+        self._BatchIO = None # batched datagram I/O
+        self._Batch = threading.local() # datagrams queued by this thread until flush_Batch
 
 
     @abstractmethod
@@ -79,6 +87,65 @@ class STPConnection(object):
         return round(timePassed,2)
 
 
+    def init_BatchIO(self):
+        ''' create the batched datagram I/O for the socket (a batch of 1 when batch=off) '''
+        batchSize = defines.BATCH_SIZE if self.get_Args().get_batch() == defines.BATCH_ON else 1
+        self._BatchIO = batch.STPBatchIO(self.get_Socket(),batchSize)
+
+
+    def begin_Batch(self):
+        ''' queue this threads transmitted msgs until flush_Batch '''
+        if self._BatchIO is not None and self._BatchIO.get_BatchSize() > 1:
+            self._Batch.datagrams = []
+
+
+    def flush_Batch(self):
+        ''' send this threads queued msgs, a batch per system call '''
+        datagrams = getattr(self._Batch,'datagrams',None)
+        self._Batch.datagrams = None
+        if datagrams:
+            try:
+                self._BatchIO.send(datagrams)
+            except OSError as err:
+                log.message.error("flush_Batch","{}".format(err))
+
+
+    def listen_Batch(self,timeout=None):
+        ''' wait for packets (up to timeout seconds), returns the msg objects of all pending packets '''
+        try:
+            packets = self._BatchIO.recv(timeout)
+        except KeyboardInterrupt:
+            sys.exit()
+        except OSError:
+            return []
+        msgs = []
+        for packet, sender in packets:
+            msg = self.receive(packet,sender)
+            if msg is not None:
+                msgs.append(msg)
+        return msgs
+
+
+    def wide_Header(self,recipient):
+        ''' return True if msgs to recipient carry 64 bit sequence and ACK numbers '''
+        return False
+
+
+    def transmit(self,msg,corrupt=False):
+        ''' Sends msg header and payload to its recipient in a single scatter-gather call (or queues them in a batch) '''
+        with self.lock:
+            msg.set_Wide(self.wide_Header(msg.get_Recipient()))
+            buffers = msg.packInto(self._Header,corrupt)
+            datagrams = getattr(self._Batch,'datagrams',None)
+            if datagrams is not None:
+                ''' the header buffer is reused by the next msg - only it is copied, the payload is sent in place '''
+                datagrams.append(([bytes(buffers[0]),buffers[1]],msg.get_Recipient()))
+            elif SCATTER_GATHER:
+                self.get_Socket().sendmsg(buffers,[],0,msg.get_Recipient())
+            else:
+                self.get_Socket().sendto(b''.join(buffers),msg.get_Recipient())
+
+
     def sendSYN(self,msg):
         ''' Send a SYN request '''
         msg.set_SYN(True)
@@ -128,7 +195,7 @@ class STPConnection(object):
 
 class STPSender(STPConnection):
     ''' Sender Client '''
-    def __init__(self):
+    def __init__(self,logFile=None):
         ''' Initialises an STP Message Object '''
         self._Socket = None
         self._Args = None
@@ -136,10 +203,25 @@ class STPSender(STPConnection):
         self._AckNumber = 0 #acknum does not change as this is a one way connection
         self._MsgWindow = window.STPWindow() # Window Frame of Messages
         self._Timer = timer.STDTimer() # Timer, EstimatedRTT etc
+        self._SegmentTimers = timer.STPTimerHeap() # per segment timers (selective repeat)
+        self._Features = defines.Feature.DEFAULT # features negotiated at handshake
+        self._MSS = None # segment payload, MWS and checksum algorithm (from the arguments, as negotiated at handshake)
+        self._MWS = None
+        self._Checksum = defines.CHECKSUM_INTERNET
+        self._Session = None # (filename, files) of the session last listed
+        self._ResumeOffset = 0 # bytes of the file the receiver holds already
+        self._SackNext = 0 # next pane to check for loss against the SACK scoreboard
+        self._Congestion = None # congestion control algorithm, created with the window frame
+        self._TracedCwnd = None # last congestion window written to the log
         self._PLD = None
         self.lock = threading.RLock()        
         self._time = datetime.datetime.now()
-        self._logFile = log.senderSTPLogs()
+        self._logFile = logFile if logFile is not None else log.senderSTPLogs()
+        self._Header = bytearray(message.MAX_HEADER_SIZE)
+        self._Selector = None
+        self._BatchIO = None # batched datagram I/O
+        self._Batch = threading.local() # datagrams queued by this thread until flush_Batch
+        self._Event = threading.Condition() # signals the sender thread (ACK, window opened, shutdown)
         
 
     def get_Timer(self):
@@ -169,11 +251,203 @@ class STPSender(STPConnection):
         return self._AckNumber
 
 
+    def get_Congestion(self):
+        ''' get STP congestion control object '''
+        return self._Congestion
+
+
+    def get_Features(self):
+        ''' get STP features negotiated at handshake '''
+        return self._Features
+
+
+    def selective_Repeat(self):
+        ''' return True if selective repeat was negotiated '''
+        return bool(self._Features & defines.Feature.SELECTIVE_REPEAT)
+
+
+    def sack_Enabled(self):
+        ''' return True if selective acknowledgments were negotiated '''
+        return bool(self._Features & defines.Feature.SACK)
+
+
+    def timestamps_Enabled(self):
+        ''' return True if the timestamp echo was negotiated '''
+        return bool(self._Features & defines.Feature.TIMESTAMPS)
+
+
+    def delayedACK_Enabled(self):
+        ''' return True if delayed ACKs were negotiated '''
+        return bool(self._Features & defines.Feature.DELAYED_ACK)
+
+
+    def seq64_Enabled(self):
+        ''' return True if 64 bit sequence numbers were negotiated '''
+        return bool(self._Features & defines.Feature.SEQ64)
+
+
+    def compression_Enabled(self):
+        ''' return True if segment compression was negotiated '''
+        return bool(self._Features & defines.Feature.COMPRESSION)
+
+
+    def resume_Enabled(self):
+        ''' return True if a resumable transfer was negotiated '''
+        return bool(self._Features & defines.Feature.RESUME)
+
+
+    def get_ResumeOffset(self):
+        ''' get the bytes of the file the receiver holds already (as replied at handshake) '''
+        return self._ResumeOffset
+
+
+    def get_SendRange(self):
+        ''' return the (start, end) file offsets to send - end None is the end of the file '''
+        return self.get_ResumeOffset(), None
+
+
+    def wide_Header(self,recipient):
+        ''' return True if msgs carry 64 bit sequence and ACK numbers (from the SYN-ACK on) '''
+        return self.seq64_Enabled()
+
+
+    def seq64_Required(self,filename=None):
+        ''' return True if the sequence numbers of the file (default the filename argument) exceed 32 bits '''
+        try:
+            fileSize = self.get_TransferSize(filename)
+        except OSError:
+            return False
+        return self.get_SequenceNumber() + fileSize + 2 > defines.SEQ_MASK
+
+
+    def session_Enabled(self):
+        ''' return True if multi-file sessions were negotiated '''
+        return bool(self._Features & defines.Feature.SESSION)
+
+
+    def is_Session(self,filename=None):
+        ''' return True if filename (default the filename argument) is a session - a directory or @manifest '''
+        if filename is None:
+            filename = self.get_Args().get_filename()
+        return filename.startswith(defines.MANIFEST_PREFIX) or os.path.isdir(filename)
+
+
+    def get_SessionFiles(self,filename=None):
+        ''' return the (path,name,size) of each file of a session (listed once per filename) '''
+        if filename is None:
+            filename = self.get_Args().get_filename()
+        if self._Session is None or self._Session[0] != filename:
+            self._Session = (filename,message.session_files(filename))
+        return self._Session[1]
+
+
+    def get_TransferSize(self,filename=None):
+        ''' return the bytes to transfer - the file (default the filename argument) or the framed files of a session '''
+        if self.is_Session(filename):
+            return message.session_size(self.get_SessionFiles(filename))
+        return os.path.getsize(filename if filename is not None else self.get_Args().get_filename())
+
+
+    def request_Features(self,msg):
+        ''' set the features requested by our arguments in a SYN msg '''
+        features = defines.Feature.DEFAULT
+        if self.get_Args().get_mode() == defines.MODE_SR:
+            features |= defines.Feature.SELECTIVE_REPEAT
+        if self.get_Args().get_sack() == defines.SACK_ON:
+            features |= defines.Feature.SACK
+        if self.get_Args().get_timestamps() == defines.TIMESTAMPS_ON:
+            features |= defines.Feature.TIMESTAMPS
+        if self.get_Args().get_delayed_ack() == defines.DELAYED_ACK_ON:
+            features |= defines.Feature.DELAYED_ACK
+        seq64 = self.get_Args().get_seq64()
+        if seq64 == defines.SEQ64_ON or (seq64 == defines.SEQ64_AUTO and self.seq64_Required()):
+            features |= defines.Feature.SEQ64
+        if self.get_Args().get_compress() != defines.COMPRESS_OFF:
+            features |= defines.Feature.COMPRESSION
+        if self.is_Session():
+            features |= defines.Feature.SESSION
+        elif self.get_Args().get_resume() == defines.RESUME_ON:
+            features |= defines.Feature.RESUME
+        msg.set_Features(features,self.request_Options())
+        return features
+
+
+    def request_Options(self):
+        ''' return the handshake options of our SYN msg {Option: value} '''
+        options = {
+            defines.Option.MSS: self.get_MSS(),
+            defines.Option.WINDOW: self.get_MWS(),
+            defines.Option.CHECKSUM: defines.CHECKSUMS.index(self.get_ChecksumType()),
+        }
+        if self.get_Args().get_compress() != defines.COMPRESS_OFF:
+            options[defines.Option.CODEC] = defines.CODECS.index(self.get_Args().get_compress())
+        try:
+            options[defines.Option.FILE_SIZE] = self.get_TransferSize()
+            if self.get_Args().get_resume() == defines.RESUME_ON and not self.is_Session():
+                options[defines.Option.TRANSFER_ID] = checkpoint.transfer_id(self.get_Args().get_filename())
+        except OSError:
+            pass
+        return options
+
+
+    def accept_Features(self,requested,msg):
+        ''' store the features and options the receiver accepted in its SYN-ACK msg '''
+        self._Features = msg.get_Features() & requested
+        self.get_LogFile().add_Features(self._Features)
+        if self._Features != requested:
+            log.message.info("Receiver does not support {} - disabled".format(requested & ~self._Features))
+        self.accept_Options(msg.get_HandshakeOptions())
+
+
+    def accept_Options(self,options:dict):
+        ''' apply the receivers handshake options - the MSS and window it can receive, checksum and ACK strategy '''
+        mss, mws = self.get_MSS(), self.get_MWS()
+        if 0 < options.get(defines.Option.MSS,mss) < mss:
+            log.message.info("Receiver MSS {} bytes - MSS reduced from {}".format(options[defines.Option.MSS],mss))
+            self._MSS = options[defines.Option.MSS]
+        if 0 < options.get(defines.Option.WINDOW,mws) < mws:
+            log.message.info("Receiver window {} bytes - MWS reduced from {}".format(options[defines.Option.WINDOW],mws))
+            self._MWS = max(options[defines.Option.WINDOW],self._MSS)
+        if (mss, mws) != (self.get_MSS(), self.get_MWS()):
+            self.init_window_frame()
+
+        checksum = options.get(defines.Option.CHECKSUM)
+        if checksum is not None and checksum < len(defines.CHECKSUMS) and defines.CHECKSUMS[checksum] != self.get_ChecksumType():
+            log.message.info("Receiver checksum {} - {} disabled".format(defines.CHECKSUMS[checksum],self.get_ChecksumType()))
+            self._Checksum = defines.CHECKSUMS[checksum]
+
+        if self.resume_Enabled():
+            self._ResumeOffset = options.get(defines.Option.RESUME,0)
+
+        if self.delayedACK_Enabled() and defines.Option.ACK_EVERY in options:
+            log.message.info("Receiver ACKs every {} segments or after {} ms".format(
+                options[defines.Option.ACK_EVERY],options.get(defines.Option.ACK_DELAY,defines.ACK_DELAY)))
+
+
+    def get_MSS(self):
+        ''' get the segment payload size (as negotiated at handshake) '''
+        return self._MSS
+
+
+    def get_MWS(self):
+        ''' get the max window size (as negotiated at handshake) '''
+        return self._MWS
+
+
+    def get_ChecksumType(self):
+        ''' get the checksum algorithm (as negotiated at handshake) '''
+        return self._Checksum
+
+
     def set_Args(self,args):
         ''' set STP Arguments Object '''
         self._Args = args
+        self._MSS = args.get_max_segment_size()
+        self._MWS = args.get_max_window_size()
+        self._Checksum = args.get_checksum()
         timer = self.get_Timer()
         timer.set_Gamma(args.get_gamma())
+        self.get_LogFile().set_Verbosity(args.get_log())
 
 
     def set_MsgWindow(self,window:object):
@@ -203,9 +477,149 @@ class STPSender(STPConnection):
             sys.exit()
         with self.lock:
             self._Socket = socket(AF_INET, defines.UDPSOCKET)
+            self.init_SocketBuffers()
+            self._Selector = selectors.DefaultSelector()
+            self._Selector.register(self._Socket,selectors.EVENT_READ)
+            self.init_BatchIO()
             self.handShake()
 
 
+    def init_SocketBuffers(self):
+        ''' size the send buffer for a window of segments and the receive buffer for their ACKs (unless set) '''
+        args = self.get_Args()
+        mws, mss = self.get_MWS(), self.get_MSS()
+        sockopts.set_buffer(self.get_Socket(),SO_SNDBUF,args.get_sndbuf() or sockopts.window_buffer(mws,mss),not args.get_sndbuf())
+        sockopts.set_buffer(self.get_Socket(),SO_RCVBUF,args.get_rcvbuf() or sockopts.window_buffer(mws,mss,False),not args.get_rcvbuf())
+
+
+    def is_Uploading(self):
+        ''' return True while the file transfer is in progress '''
+        return defines.uploading
+
+
+    def call_later(self,delay,callback,*args):
+        ''' call callback(*args) after delay seconds (ie PLD delayed msgs) '''
+        threading.Timer(delay,callback,args=args).start()
+
+
+    def build_Msg(self,msgTuple):
+        ''' build the msg of a queued (payload,seqNum,ackNum) - a payload shorter than its sequence range is compressed '''
+        payload, payloadSeq, payloadAck = msgTuple
+        msg = message.build(self.get_Args().get_receiver(),payload,payloadSeq,self.get_AckNumber())
+        msg.set_Compressed(len(payload) < payloadAck - payloadSeq)
+        return msg
+
+
+    def resend_Pane(self,pane):
+        ''' ReSend the msg in pane to the server, returns True if sent '''
+        msgTuple = self.get_MsgWindow().get_msgQueue().get_msg(pane)
+        if len(msgTuple) != 3:
+            return False
+        msg = self.build_Msg(msgTuple)
+        timer = self.get_Timer()
+        timer.segment_Sent(pane) # before sending, its ACK may be handled first
+        self.sendMsg(msg,event="snd/RXT")
+        if self.selective_Repeat():
+            self._SegmentTimers.start(pane,timer.get_timeoutInterval())
+        return True
+
+
+    def retransmit_Lost(self,timeout=False):
+        ''' SACK Recovery - resend (once) each pane with SACK_THRESHOLD panes ACK'd above it '''
+        window = self.get_MsgWindow()
+        logFile = self.get_LogFile()
+        pane = max(self._SackNext,window.get_minPane())
+        lastLost = min(window.get_highSelected() - defines.SACK_THRESHOLD,window.get_nextPane() - 1)
+        while pane <= lastLost:
+            if not window.is_selected(pane) and self.resend_Pane(pane):
+                if timeout:
+                    logFile.incr_Retransmissions()
+                else:
+                    logFile.incr_Fast_Retransmissions()
+                    self.congestion_Event(self._Congestion.on_Loss,window.get_nextPane()-1)
+            pane += 1
+        self._SackNext = max(self._SackNext,pane)
+
+
+    def get_TimeoutRemaining(self):
+        ''' return seconds until the next retransmission timeout (None if no timer running) '''
+        if self.selective_Repeat():
+            return self._SegmentTimers.get_TimeoutRemaining()
+        return self.get_Timer().get_TimeoutRemaining()
+
+
+    def congestion_Event(self,event,*args):
+        ''' pass a window event to the congestion control, then resize the window frame '''
+        with self.lock:
+            result = event(*args)
+            self.update_WindowFrame()
+        return result
+
+
+    def update_WindowFrame(self):
+        ''' set maxPane from minPane and the congestion window (cannot exceed queueLength) '''
+        window = self.get_MsgWindow()
+        congestion = self._Congestion
+        maxPane = window.set_maxPane(min(window.get_minPane() + congestion.get_Window() - 1,window.get_msgQueue().get_length()))
+
+        ''' trace the congestion window '''
+        cwnd = round(congestion.get_cwnd(),2)
+        if congestion.name != defines.CC_NONE and cwnd != self._TracedCwnd:
+            self._TracedCwnd = cwnd
+            self.get_LogFile().toFile("cwnd",self.get_TimePassed(),congestion.name,cwnd,round(congestion.get_ssthresh(),2),congestion.get_Window())
+        return maxPane
+
+
+    def retransmit_Timeout(self):
+        ''' Timeout Event - Retransmit MinPane (or each expired pane), returns True if a timer had expired '''
+        window = self.get_MsgWindow()
+        logFile = self.get_LogFile()
+        if self.selective_Repeat():
+            ''' Retransmit only the expired segments not yet ACK'd '''
+            expired = self._SegmentTimers.expired()
+            for pane in expired:
+                if pane >= window.get_minPane() and not window.is_selected(pane):
+                    if self.resend_Pane(pane):
+                        logFile.incr_Retransmissions()
+            if expired:
+                self.get_Timer().backoff_Timeout()
+                self.congestion_Event(self._Congestion.on_Timeout)
+            return len(expired) > 0
+
+        timer = self.get_Timer()
+        if not timer.TimeoutExpired():
+            return False
+        timer.backoff_Timeout()
+        self.congestion_Event(self._Congestion.on_Timeout)
+
+        if self.resend_Pane(window.get_minPane()):
+            logFile.incr_Retransmissions()
+
+        ''' SACK - the holes resent before may have been lost too, resend them again '''
+        if self.sack_Enabled():
+            self._SackNext = window.get_minPane()+1
+            self.retransmit_Lost(True)
+
+        ''' Restart Timer (backed off) '''
+        timer.startTimeoutTimer()
+        return True
+
+
+    def wait_Event(self):
+        ''' Block the sender thread until the window has unsent msgs, the timeout expires or notified '''
+        with self._Event:
+            remaining = self.get_TimeoutRemaining()
+            if self.get_MsgWindow().has_unsent() or remaining == 0:
+                return
+            self._Event.wait(remaining)
+
+
+    def notify_Event(self):
+        ''' Wake the sender thread '''
+        with self._Event:
+            self._Event.notify_all()
+
+
     def sendMsgWindow(self):
         ''' Sends any new unsent messages from our window '''
         try:
@@ -213,27 +627,28 @@ class STPSender(STPConnection):
             timer = self.get_Timer()
             minPane = window.get_minPane()
             maxPane = window.get_maxPane()
-            args = self.get_Args()
-            receiver = args.get_receiver()   
 
             msgQueue = window.get_msgQueue()
             if msgQueue is None:
                 log.message.error("sendMsgWindow","No Msg Queue Created")
                 sys.exit()
 
-            ''' Send any unsent msgs '''
-            for pane in range(minPane,maxPane+1):
-                msgTuple = msgQueue.get_msg(pane)
-                if len(msgTuple) == 3:
-                    payload, payloadSeq, payloadAck = msgTuple
-                    if window.msg_sent(payloadAck) is False:
-                        msg = message.build(receiver,payload,payloadSeq,self.get_AckNumber())           
-                        self.sendMsg(msg)
-                        timer = self.get_Timer()
-                        if timer.TimeoutStarted() is False or timer.TimeoutExpired():
-                            timer.startTimeoutTimer(True)
-
-                        window.set_window_status(payloadAck,defines.Status.SENT)
+            ''' Send any unsent msgs (from the first pane never sent) '''
+            nextPane = max(window.get_nextPane(),minPane)
+            for pane, msgTuple in msgQueue.get_range(nextPane,maxPane+1):
+                payload, payloadSeq, payloadAck = msgTuple
+                if window.msg_sent(payloadAck) is False:
+                    msg = self.build_Msg(msgTuple)
+                    timer = self.get_Timer()
+                    timer.segment_Sent(pane) # before sending, its ACK may be handled first
+                    self.sendMsg(msg)
+                    if timer.TimeoutStarted() is False or timer.TimeoutExpired():
+                        timer.startTimeoutTimer()
+                    if self.selective_Repeat():
+                        self._SegmentTimers.start(pane,timer.get_timeoutInterval())
+
+                    window.set_window_status(payloadAck,defines.Status.SENT)
+                window.set_nextPane(pane+1)
         except Exception as err:
             log.message.error("sendMsgWindow","{}".format(err))
 
@@ -241,47 +656,57 @@ class STPSender(STPConnection):
     def sendMsg(self,msg=None,pldEnabled=True,event="snd"):
         ''' Sends Message to its receiver - PLD Enabled by default '''
         try:
-            connection = self.get_Socket()
+            msg.set_ChecksumType(self.get_ChecksumType())
+            if pldEnabled and self.timestamps_Enabled():
+                msg.set_Timestamp(self.get_Timer().get_Timestamp())
             logFile = self.get_LogFile()
             logFile.incr_Transmitted()
+            logFile.update_Payload_Sent(len(msg.get_Payload()))
             logTime = self.get_TimePassed()
             if pldEnabled:
                 ''' PLD Module Determines Msg Events '''
                 self.get_PLD().send(msg,logEvent=event)
             else:
                 ''' Handshake/Terminate '''
-                with self.lock:
-                    connection.sendto(msg.packMsg(), msg.get_Recipient())
+                self.transmit(msg)
                 logFile.toFile(event,logTime,msg.getType(),msg.get_SequenceNumber(),len(msg.get_Payload()),msg.get_ACKNumber())
         except Exception as err:
             log.message.error("sendMsg","{}".format(err))
 
 
-    def init_msg_queue(self):
-        ''' open file and break into segments'''
+    def init_msg_queue(self,filename=None):
+        ''' open file (default the filename argument) and map it into MSS segments (read on demand) '''
         try:
-            msgQueue = []
             args = self.get_Args()
-            with open(args.get_filename(),defines.READ_BYTE) as f:
-                readLength = args.get_max_segment_size()      
-
-                ''' store each msg payload into our msg queue with its sequence and expected ack number '''
-                seqNum = self.get_SequenceNumber()
-                msgQueue = message.STPMSGQueue()
-
-                while True:
-                    msg = f.read(readLength)
-                    if msg:
-                        msgLen = len(msg)
-                        ackNum = seqNum+msgLen
-                        msgQueue.add((msg,seqNum,ackNum))
-                        seqNum += msgLen
-                    else:
-                        break
+            if filename is None:
+                filename = args.get_filename()
+
+            ''' each segment payload is sliced from the file with its sequence and expected ack number '''
+            if self.seq64_Required(filename) and not self.seq64_Enabled():
+                log.message.error("init_msg_queue","File needs 64 bit sequence numbers which were not negotiated (seq64={})".format(args.get_seq64()))
+                sys.exit()
+            if self.is_Session(filename):
+                ''' a directory or manifest - its files framed one after another '''
+                if not self.session_Enabled():
+                    log.message.error("init_msg_queue","Receiver does not support multi-file sessions")
+                    sys.exit()
+                msgQueue = message.STPSessionSource(self.get_SessionFiles(filename),self.get_MSS(),self.get_SequenceNumber())
+                self.get_LogFile().set_Files(msgQueue.get_Files())
+            else:
+                ''' sequence numbers count from the start of the file, whichever range is sent '''
+                offset, end = self.get_SendRange()
+                msgQueue = message.STPSegmentSource(filename,self.get_MSS(),self.get_SequenceNumber(),offset,end)
+                self.set_SequenceNumber(self.get_SequenceNumber() + offset)
+                if self.get_ResumeOffset() > 0:
+                    ''' the receiver holds the file up to offset - start at the first missing byte '''
+                    log.message.info("Resuming at byte {} of {}".format(offset,msgQueue.get_FileSize()))
+                    self.get_LogFile().set_Resumed(offset)
+            if self.compression_Enabled():
+                msgQueue = message.STPCompressedSource(msgQueue,args.get_compress(),args.get_compress_level())
 
             ''' store the msgQueue onto our sockets window '''
             self.get_MsgWindow().set_msgQueue(msgQueue)
-            self.get_LogFile().set_FileSize(max(0,seqNum-1))
+            self.get_LogFile().set_FileSize(msgQueue.get_FileSize())
             
         except Exception as err:
             log.message.error("build_msg_queue","{}".format(err))
@@ -294,17 +719,34 @@ class STPSender(STPConnection):
             args = self.get_Args()
 
             ''' Calculate the max number of window panes in our sliding window (MIN 1) '''
-            numWindowPanes = max(floor(args.get_max_window_size() / args.get_max_segment_size()),1)
-            assert(numWindowPanes*args.get_max_segment_size() <= args.get_max_window_size()),"Invalid Window Size"
+            numWindowPanes = max(floor(self.get_MWS() / self.get_MSS()),1)
+            assert(numWindowPanes*self.get_MSS() <= self.get_MWS()),"Invalid Window Size"
 
             window = self.get_MsgWindow()
             window.set_numWindowPanes(numWindowPanes)
-            window.set_maxPane(numWindowPanes-1)
+
+            ''' the congestion window decides how many of the panes are used '''
+            self._Congestion = congestion.create(args.get_cc(),numWindowPanes)
+            window.set_maxPane(self._Congestion.get_Window()-1)
         except Exception as err:
             log.message.error("init_window_frame","{}".format(err))
 
 
-    def update_window(self,msg):
+    def update_window_batch(self,msgs):
+        ''' Updates the window with a batch of ACKs - resent msgs go in one batch and the sender thread is woken once '''
+        uploading = True
+        self.begin_Batch()
+        try:
+            for msg in msgs:
+                if uploading and msg.is_ACK():
+                    uploading = self.update_window(msg,False)
+        finally:
+            self.flush_Batch()
+            self.notify_Event()
+        return uploading
+
+
+    def update_window(self,msg,notify=True):
         ''' Updates the message window frame and RTT Timers '''
         try:
             ackNum = msg.get_ACKNumber()
@@ -314,12 +756,23 @@ class STPSender(STPConnection):
             window = self.get_MsgWindow()
             minPane = window.get_minPane()
             maxPane = window.get_maxPane()
-            numWindowPanes = window.get_numWindowPanes()
             msgQueue = window.get_msgQueue()
             queueLength = msgQueue.get_length()
             
+            logFile.incr_ACK_Received()
             ackStatus = window.set_window_status(ackNum,window.get_window_status(ackNum)+1)
 
+            ''' Selective Repeat/SACK - mark each segment the receiver reported as received (blocks below the cumulative ACK are old) '''
+            for start, end in msg.get_Blocks():
+                if end <= self.get_SequenceNumber():
+                    continue
+                for gapStart, gapEnd in window.add_selected_range(max(start,self.get_SequenceNumber()),end):
+                    pane = msgQueue.get_seq_index(gapStart)
+                    while pane >= minPane and pane < queueLength and msgQueue.get_key(pane) <= gapEnd:
+                        window.set_selected(pane)
+                        self._SegmentTimers.cancel(pane)
+                        pane += 1
+
             recvPane = msgQueue.get_key_index(ackNum)   
             if recvPane == -1:
                 logFile.toFile("rcv",logTime,msg.getType(),msg.get_SequenceNumber(),len(msg.get_Payload()),msg.get_ACKNumber())
@@ -331,52 +784,68 @@ class STPSender(STPConnection):
             if recvPane >= minPane:
                 logFile.toFile("rcv",logTime,msg.getType(),msg.get_SequenceNumber(),len(msg.get_Payload()),msg.get_ACKNumber())
 
-                ''' Update Timers '''
+                ''' Update Timers - RTT sample from the timestamp echo or send time (Karn's algorithm) '''
                 timer = self.get_Timer()
-                timer.update_RTT(recvPane)
+                timer.update_RTT(minPane,recvPane,msg.get_Timestamp())
 
                 ''' Update Window '''
                 window.set_window_status(ackNum,defines.Status.RECEIVED)
+                ''' only the cumulative ACK's status is kept (to count its duplicates) - the window does not grow with the file '''
+                window.clear_window_status(msgQueue.get_key(pane) for pane in range(max(minPane-1,0),recvPane))
                 self.set_SequenceNumber(ackNum)
+                window.clear_selected(minPane,recvPane+1,ackNum)
+                for pane in range(minPane,recvPane+1):
+                    self._SegmentTimers.cancel(pane)
+                ackedPanes = recvPane+1 - minPane
                 minPane = window.set_minPane(recvPane+1)
+                msgQueue.release(minPane)
 
                 ''' finished uploading file '''
                 if minPane == queueLength:
                     return False
 
-                ''' Restart the Timer if UnACK'd Msgs from old window remaining (No RTTEst) '''
+                ''' Restart the Timer if UnACK'd Msgs from old window remaining '''
                 if minPane <= maxPane:
                     self.get_Timer().startTimeoutTimer()
 
-                ''' update maxPane -> cannot exceed queueLength'''
-                maxPane = window.set_maxPane(min((minPane + (numWindowPanes-1)),queueLength))
+                ''' update cwnd and maxPane -> cannot exceed queueLength'''
+                partialACK = self.congestion_Event(self._Congestion.on_ACK,ackedPanes,recvPane,window.get_nextPane()-1)
+
+                ''' NewReno partial ACK - the next hole was lost too '''
+                if partialACK and not self.sack_Enabled() and self.resend_Pane(minPane):
+                    logFile.incr_Fast_Retransmissions()
 
             else:
                 ''' Increment number of duplicate ACKS's for this pane '''
                 logFile.incr_Duplicate_ACK_Received()
                 logFile.toFile("rcv/DA",logTime,msg.getType(),msg.get_SequenceNumber(),len(msg.get_Payload()),msg.get_ACKNumber())
+                self.congestion_Event(self._Congestion.on_DuplicateACK)
 
-                ''' If 3 ACK's Received, resend msg '''
-                if ackStatus == defines.Status.RECEIVED_3:
-                    receiver = self.get_Args().get_receiver()
-                    msg = msgQueue.get_msg(recvPane+1)
-                    if len(msg) == 3:
-                        ''' Build and Re-Send the msg to the server '''  
-                        payload, payloadSeq, payloadAck = msg
-                        msg = message.build(receiver,payload,payloadSeq,self.get_AckNumber())             
-                        self.sendMsg(msg,event="snd/RXT")
+                ''' If 3 ACK's Received, resend msg (SACK resends the holes below) '''
+                if ackStatus == defines.Status.RECEIVED_3 and not self.sack_Enabled():
+                    self.congestion_Event(self._Congestion.on_Loss,window.get_nextPane()-1)
+                    if self.resend_Pane(recvPane+1):
                         logFile.incr_Fast_Retransmissions()
 
-                        ''' Restart the Timer (No RTTEst)'''
-                        timer = self.get_Timer()
-                        timer.startTimeoutTimer() 
+                        ''' Restart the Timer '''
+                        self.get_Timer().startTimeoutTimer() 
 
                         ''' Restart Ack Count '''
                         window.set_window_status(ackNum,defines.Status.SENT)
 
+                ''' an ACK older than the cumulative ACK (reordered) keeps no status '''
+                if recvPane < minPane - 1:
+                    window.clear_window_status([ackNum])
+
+            if self.sack_Enabled():
+                self.retransmit_Lost()
                         
         except Exception as err:
             log.message.error("update_window","{}".format(err))
+        finally:
+            ''' window may have opened or the timer restarted '''
+            if notify:
+                self.notify_Event()
         return True
 
 
@@ -395,16 +864,28 @@ class STPSender(STPConnection):
 
             ''' store next sequence number we expect from the server '''
             seqNum = self.set_SequenceNumber(seqNum+1)
+            features = self.request_Features(msg)
             
-            ''' Send and wait for SYN ACK Response '''
-            self.sendSYN(msg)
+            ''' Send and wait for SYN ACK Response - resend the SYN each (backed off) timeout '''
+            syn = msg
+            timer = self.get_Timer()
+            self.sendSYN(syn)
+            timer.startTimeoutTimer()
             while True:
-                msg = self.listen()
-                if msg is not None and msg.is_SYNACK() and msg.get_ACKNumber() == seqNum:
+                msg = self.listen(timer.get_TimeoutRemaining())
+                if msg is None:
+                    if timer.TimeoutExpired():
+                        log.message.info("Handshake Timeout - resending SYN")
+                        timer.backoff_Timeout()
+                        self.sendSYN(syn)
+                        timer.startTimeoutTimer()
+                elif msg.is_SYNACK() and msg.get_ACKNumber() == seqNum:
                     logFile.toFile("rcv",self.get_TimePassed(),msg.getType(),msg.get_SequenceNumber(),len(msg.get_Payload()),msg.get_ACKNumber())
                     break
                 else:
                     log.message.error("handShake","Invalid Message received! Expected: {} Received: {}".format(seqNum,msg.get_ACKNumber()))
+            timer.set_TimeoutStart(None)
+            self.accept_Features(features,msg)
 
             ''' Send ACK Response '''
             ackMSG = msg.createACKResponse(1)
@@ -482,38 +963,45 @@ class STPSender(STPConnection):
             logFile = self.get_LogFile()
             logFile.writeResults()
 
+            msgQueue = self.get_MsgWindow().get_msgQueue()
+            if msgQueue is not None:
+                msgQueue.close()
+
             log.message.success("Connection Terminated")
 
         except Exception as err:
             log.message.error("tearDown","{}".format(err))
 
 
-    def listen(self):
-        ''' listen for a packet and return msg object'''
+    def listen(self,timeout=None):
+        ''' wait for a packet (up to timeout seconds) and return msg object'''
         socket = self.get_Socket()
         try:
-            with self.lock:
-                packet,sender = socket.recvfrom(defines.BUFFER_SIZE)
-            
-            msg = message.STPMessage()
-            if msg is None: return None
-
-            unPacked = msg.unpackMsg(packet)
-            if unPacked != defines.SUCCESS:
-                return None 
-            msg.set_Recipient(sender)
-            return msg
+            if not self._Selector.select(timeout):
+                return None
+            packet,sender = socket.recvfrom(defines.BUFFER_SIZE)
+            return self.receive(packet,sender)
         except KeyboardInterrupt:
             sys.exit()
         except:
             return None
 
 
+    def receive(self,packet,sender):
+        ''' unpack a received packet, returns msg object (None if corrupted) '''
+        msg = message.STPMessage()
+        unPacked = msg.unpackMsg(packet)
+        if unPacked != defines.SUCCESS:
+            return None 
+        msg.set_Recipient(sender)
+        return msg
+
+
 
 
 class STPReceiver(STPConnection):
     ''' Receiver Server '''
-    def __init__(self):
+    def __init__(self,logFile=None):
         ''' Initialises an STP Message Object '''
         self._Socket = None
         self.lock = threading.RLock()
@@ -521,7 +1009,15 @@ class STPReceiver(STPConnection):
         self._Connections = {} # dictionary of connections permits simultaneous uploads
         self._Args = None
         self._time = datetime.datetime.now()
-        self._logFile = log.receiverSTPLogs()
+        self._logFile = logFile if logFile is not None else log.receiverSTPLogs()
+        self._Header = bytearray(message.MAX_HEADER_SIZE)
+        self._Accepted = 0 # connections accepted
+        self._Served = 0 # connections terminated
+        self._ReusePort = False # share the port with other receiver processes
+        self._KernelDrops = None # socket drops counted by the kernel when bound
+        self._BatchIO = None # batched datagram I/O
+        self._Batch = threading.local() # datagrams queued by this thread until flush_Batch
+        self._ACKTimers = timer.STPTimerHeap() # delayed ACK deadlines keyed by sender address
 
 
     def set_Receiver(self,receiver):
@@ -529,6 +1025,17 @@ class STPReceiver(STPConnection):
         self._Receiver = receiver
 
 
+    def set_Args(self,args):
+        ''' set STP Arguments Object '''
+        self._Args = args
+        self.get_LogFile().set_Verbosity(args.get_log())
+
+
+    def set_ReusePort(self,value=True):
+        ''' set SO_REUSEPORT on the listening socket so worker processes share the port '''
+        self._ReusePort = value
+
+
     def set_ConnectionSender(self,sender):
         ''' set a senders connection sender '''
         self._Connections[sender]['sender'] = sender
@@ -567,83 +1074,179 @@ class STPReceiver(STPConnection):
         except:
             connection = None
         return connection
-   
 
-    def get_CumulativeACK(self,sender,nextAck):
-        ''' Calculates the Cumulative ACK we next expect from sender '''
-        try:
-            connection = self.get_Connection(sender)
-            if connection is None:
-                log.message.error("get_CumulativeACK","Connection does not exist!")
-                return
 
-            buffer = connection['buffer']
-            listLen = len(buffer)
+    def get_ConnectionLog(self,sender:tuple):
+        ''' return a senders connection log (the server log for unknown senders) '''
+        connection = self.get_Connection(sender)
+        if connection is None:
+            return self.get_LogFile()
+        return connection['log']
+
+
+    def new_ConnectionLog(self,sender:tuple,n):
+        ''' create the log of the n-th connection - serving one connection it is the server log '''
+        logFile = self.get_LogFile()
+        if self.get_Args().single_Connection():
+            return logFile
+        filename = log.CONNECTION_LOG.format(host=sender[0],port=sender[1],n=n)
+        return log.receiverSTPLogs(logFile.get_Verbosity(),filename,logFile)
+
+
+    def next_ConnectionNumber(self):
+        ''' return the number of a new connection (in accept order) '''
+        self._Accepted += 1
+        return self._Accepted
+
+
+    def serving(self):
+        ''' return True until the number of connections to serve have terminated '''
+        connections = self.get_Args().get_connections()
+        return connections == 0 or self._Served < connections
+
+
+    def finish_Serving(self):
+        ''' checkpoint unfinished transfers and write the totals of all connections to the server log '''
+        self.checkpoint_Connections()
+        if not self.get_Args().single_Connection():
+            log.message.info("Served {} Connections".format(self._Served))
+            self.get_LogFile().set_Kernel_Dropped(self.get_KernelDropped())
+            self.get_LogFile().writeResults()
    
-            if listLen < 1: return nextAck
-            for seq, msg in buffer:
-                if seq < nextAck:
-                    continue
-                if seq != nextAck:
-                    break
-                nextAck = seq + len(msg)
 
-            return nextAck
+    def wide_Header(self,recipient):
+        ''' return True if msgs to recipient carry 64 bit sequence and ACK numbers (negotiated for its connection) '''
+        connection = self.get_Connection(recipient)
+        return connection is not None and bool(connection['features'] & defines.Feature.SEQ64)
+
+
+    def supported_Features(self):
+        ''' return the features this receiver accepts (ack_every=1 declines delayed ACKs, a filename the stripes of a file cannot share declines stripes) '''
+        features = defines.Feature.ALL
+        if self.get_Args().get_ack_every() <= 1:
+            features &= ~defines.Feature.DELAYED_ACK
+        if self.get_Args().get_checkpoint() <= 0:
+            features &= ~defines.Feature.RESUME
+        if not self.get_Args().stripes_Shared():
+            features &= ~defines.Feature.STRIPE
+        return features
+
+
+    def get_CumulativeACK(self,sender):
+        ''' Returns the Cumulative ACK we next expect from sender '''
+        connection = self.get_Connection(sender)
+        if connection is None:
+            log.message.error("get_CumulativeACK","Connection does not exist!")
+            return -1
+        return connection['buffer'].get_CumulativeACK()
 
-        except Exception as error:
-            log.message.error("get_CumulativeACK","Error: {}".format(error))
+
+    def get_ConnectionRanges(self,sender):
+        ''' Returns the out of order (start,end) ranges received from sender '''
+        connection = self.get_Connection(sender)
+        if connection is None:
+            return []
+        return connection['buffer'].get_Ranges()
+
+
+    def get_ConnectionBlocks(self,sender,seqNum,msgLength):
+        ''' Returns the (start,end) blocks to report in the ACK for a segment, as per negotiated features '''
+        connection = self.get_Connection(sender)
+        blocks = []
+        if connection['features'] & defines.Feature.SACK:
+            ''' out of order ranges, the range holding this segment first '''
+            blocks = connection['buffer'].get_Blocks(seqNum,defines.SACK_BLOCKS)
+        if connection['features'] & defines.Feature.SELECTIVE_REPEAT:
+            ''' report the segment received so only lost segments are resent '''
+            if not any(start <= seqNum < end for start,end in blocks):
+                blocks.insert(0,(seqNum,seqNum+msgLength))
+        return blocks
 
 
     def add_ConnectionBuffer(self,msg):
-        ''' Store message into connections message buffer '''
+        ''' Store message into connections reorder buffer '''
         sender = msg.get_Recipient()
-        sequence = msg.get_SequenceNumber()
-        payload = msg.get_Payload()
         try:
             connection = self.get_Connection(sender)
             if connection is None:
                 log.message.error("add_ConnectionBuffer","Connection does not exist!\n\n --- DUMPING MSG CONTENTS ---")
                 return False
-            newMsg = (sequence,payload)
-            if newMsg not in connection['buffer']:
-                ''' only buffer messages we have not received already '''
-                connection['buffer'].append((sequence,payload))
-                connection['buffer'] = sorted(connection['buffer'])
-                return True
-            else:
-                return False
+            ''' only buffer messages we have not received already '''
+            return connection['buffer'].add(msg.get_SequenceNumber(),msg.get_Payload())
         except Exception as error:
             log.message.error("add_ConnectionBuffer","Error: {}\n\n --- DUMPING MSG CONTENTS ---".format(error))
             return False
 
 
-    def assemble_msg(self,sender):
-        ''' Assembles a transferred file from all the received connection messages '''
-        msg = b''
+    def flush_ConnectionBuffer(self,sender):
+        ''' Writes in-order buffered messages to the connections file, returns the Cumulative ACK '''
         connection = self.get_Connection(sender)
         if connection is None:
-            log.message.error("assemble_msg","Connection does not exist!")
-            return msg
-        while(1):
-            try:
-                item = heappop(connection['buffer'])
-                if item is None:
-                    break
-                msg = b''.join([msg, item[1]])
-            except:
+            log.message.error("flush_ConnectionBuffer","Connection does not exist!")
+            return -1
+        fileWriter = connection['writer']
+        while True:
+            for payload in connection['buffer'].pop_ready():
+                fileWriter.write(payload)
+            ''' data written out of order by a checkpoint is skipped '''
+            skipped = connection['buffer'].pop_stored()
+            if not skipped:
                 break
-        return msg
+            fileWriter.skip(skipped)
+        return connection['buffer'].get_CumulativeACK()
 
 
-    def add_Connection(self,sender:tuple,seq=0,ack=0):
-        ''' Adds a new client connection and returns object '''
+    def add_Connection(self,sender:tuple,seq=0,ack=0,checksum=defines.CHECKSUM_INTERNET,features=defines.Feature.DEFAULT,resume=None,stripe=None):
+        ''' Adds a new client connection (resuming from a checkpoint, or one stripe of a file) and returns object '''
         connection = self.get_Connection(sender)
         if connection is None:
+            offset = resume['written'] if resume is not None else 0
+            if stripe is not None:
+                ''' sequence numbers count from the start of the striped file '''
+                ack += stripe['offset']
             self._Connections[sender] = {}
             self._Connections[sender]['sender'] = sender
             self._Connections[sender]['seq'] = seq
-            self._Connections[sender]['ack'] = ack
-            self._Connections[sender]['buffer'] = [] # Min Heap
+            self._Connections[sender]['ack'] = ack + offset
+            self._Connections[sender]['buffer'] = buffer.STPReorderBuffer(ack + offset)
+            self._Connections[sender]['checksum'] = checksum
+            self._Connections[sender]['features'] = features
+            self._Connections[sender]['start'] = ack # sequence number of the first byte of the file
+            self._Connections[sender]['fileSize'] = None # bytes the sender announced at handshake
+            self._Connections[sender]['codec'] = None # compression codec negotiated at handshake
+            self._Connections[sender]['mss'] = None # max segment payload negotiated at handshake
+            self._Connections[sender]['resume'] = resume # checkpoint the transfer resumed from (None if not resumable)
+            self._Connections[sender]['stripe'] = stripe # group, offset and total size of a stripe (None if not striped)
+            self._Connections[sender]['checkpointDue'] = time.monotonic() + self.get_Args().get_checkpoint() # monotonic time the next checkpoint is due
+            self._Connections[sender]['state'] = defines.ESTABLISHED
+            self._Connections[sender]['unacked'] = 0 # in-order segments awaiting a delayed ACK
+            self._Connections[sender]['ackEcho'] = None # timestamp of the oldest segment awaiting a delayed ACK
+            self._Connections[sender]['quickACKs'] = 0 # in-order segments still ACK'd at once after a loss
+
+            ''' each connection writes to its own output path and log '''
+            n = self.next_ConnectionNumber()
+            args = self.get_Args()
+            ''' the stripes of a file share its output path - named by their {group} '''
+            path = args.get_output_path(sender[0],sender[1],n,stripe['group'] if stripe is not None else None)
+            if resume is not None and resume['path'] is not None:
+                ''' a resumed transfer continues its file '''
+                path = resume['path']
+            if os.path.dirname(path):
+                os.makedirs(os.path.dirname(path),exist_ok=True)
+            self._Connections[sender]['path'] = path
+            self._Connections[sender]['log'] = self.new_ConnectionLog(sender,n)
+            self._Connections[sender]['log'].add_Features(features)
+            if features & defines.Feature.SESSION:
+                ''' a session of files is recreated under the output path '''
+                self._Connections[sender]['writer'] = writer.STPSessionWriter(path,args.get_write_buffer(),args.get_fsync())
+            elif stripe is not None:
+                self._Connections[sender]['writer'] = writer.STPFileWriter(path,args.get_write_buffer(),args.get_fsync(),stripe['offset'],stripe['total'])
+            elif resume is not None and resume['path'] is not None:
+                self._Connections[sender]['writer'] = writer.STPFileWriter(path,args.get_write_buffer(),args.get_fsync(),offset)
+                for start, end in resume['ranges']:
+                    self._Connections[sender]['buffer'].add_Stored(ack + start,ack + end)
+            else:
+                self._Connections[sender]['writer'] = writer.STPFileWriter(path,args.get_write_buffer(),args.get_fsync())
             connection = self._Connections[sender]
         return connection
 
@@ -653,6 +1256,7 @@ class STPReceiver(STPConnection):
         connection = self.get_Connection(sender)
         if connection is not None:
             del self._Connections[sender]
+            self._ACKTimers.cancel(sender)
         connection = self.get_Connection(sender)
         if connection is not None:
             log.message.error("remove_Connection","Error Removing Connection!")
@@ -665,16 +1269,43 @@ class STPReceiver(STPConnection):
             sys.exit()
 
         self._Socket = socket(AF_INET, defines.UDPSOCKET)
+        if self._ReusePort:
+            self._Socket.setsockopt(SOL_SOCKET, SO_REUSEPORT, 1)
+        self.init_SocketBuffers()
         self._Socket.bind(self._Receiver)
+        self._KernelDrops = sockopts.kernel_drops(self._Socket)
+        self.init_BatchIO()
+
+
+    def init_SocketBuffers(self):
+        ''' size the receive buffer to queue the senders windows, and the send buffer if set '''
+        args = self.get_Args()
+        sockopts.set_buffer(self.get_Socket(),SO_RCVBUF,args.get_rcvbuf() or defines.RECEIVER_BUFFER_SIZE,not args.get_rcvbuf())
+        if args.get_sndbuf():
+            sockopts.set_buffer(self.get_Socket(),SO_SNDBUF,args.get_sndbuf())
+
+
+    def get_KernelDropped(self):
+        ''' return the datagrams the kernel dropped at the socket since it was bound (None if not available) '''
+        if self._KernelDrops is None:
+            return None
+        drops = sockopts.kernel_drops(self.get_Socket())
+        if drops is None:
+            return None
+        return drops - self._KernelDrops
 
 
     def sendMsg(self,msg=None,pldEnabled=False,event="snd"):
         ''' Sends Message to its receiver '''       
         try:
-            socket = self.get_Socket()
-            logFile = self.get_LogFile()
+            logFile = self.get_ConnectionLog(msg.get_Recipient())
             logTime = self.get_TimePassed()
-            socket.sendto(msg.packMsg(), msg.get_Recipient())
+
+            ''' reply using the checksum algorithm the sender chose for this connection '''
+            connection = self.get_Connection(msg.get_Recipient())
+            if connection is not None:
+                msg.set_ChecksumType(connection['checksum'])
+            self.transmit(msg)
             logFile.toFile(event,logTime,msg.getType(),msg.get_SequenceNumber(),len(msg.get_Payload()),msg.get_ACKNumber())
         except:
             log.message.error("sendMsg","Error Sending Message!")
@@ -693,20 +1324,147 @@ class STPReceiver(STPConnection):
             ''' Store new connection - Note vulnerable to SYN flooding! '''
             try:
                 sender = msg.get_Recipient()
+
+                ''' Accept the requested features we support and reply to the options '''
+                features = msg.get_Features() & self.supported_Features()
+                options = self.reply_Options(msg.get_HandshakeOptions(),features)
+                if defines.Option.CODEC not in options:
+                    features &= ~defines.Feature.COMPRESSION
+                stripe = None
+                if features & defines.Feature.STRIPE and not features & defines.Feature.SESSION:
+                    stripe = self.accept_Stripe(msg.get_HandshakeOptions())
+                if stripe is None:
+                    features &= ~defines.Feature.STRIPE
+                resume = None
+                if features & defines.Feature.RESUME and stripe is None and not features & defines.Feature.SESSION:
+                    resume = self.resume_Checkpoint(sender,msg.get_HandshakeOptions(),options)
+                if resume is None:
+                    features &= ~defines.Feature.RESUME
+                else:
+                    options[defines.Option.RESUME] = resume['written']
+                msg.set_Features(features,options)
+                checksum = defines.CHECKSUMS[options.get(defines.Option.CHECKSUM,defines.CHECKSUMS.index(msg.get_ChecksumType()))]
+
+                ''' Store incremented Seq and Ack Numbers'''
+                connection = self.add_Connection(sender,storedSeqNum + 1,rcvAckNum,checksum,features,resume,stripe)
+                connection['fileSize'] = msg.get_HandshakeOptions().get(defines.Option.FILE_SIZE)
+                connection['mss'] = options.get(defines.Option.MSS)
+                if defines.Option.CODEC in options:
+                    connection['codec'] = defines.CODECS[options[defines.Option.CODEC]]
+
                 ''' Send SYN-ACK Response '''
                 msg.set_ACKNumber(rcvAckNum)
                 msg.set_SequenceNumber(storedSeqNum) 
                 self.sendSYNACK(msg)
 
-                ''' Store incremented Seq and Ack Numbers'''
-                self.add_Connection(sender,storedSeqNum + 1,rcvAckNum)
-
             except:
                 log.message.error("handShake","Error Initiating Handshake!")
         else:
             log.message.error("handShake","Error Receiving Handshake!")
     
 
+    def reply_Options(self,options:dict,features):
+        ''' return the replies to a senders handshake options - the MSS and window we can receive, checksum and ACK strategy '''
+        replies = {}
+        if defines.Option.MSS in options:
+            replies[defines.Option.MSS] = min(options[defines.Option.MSS],defines.BUFFER_SIZE - message.MAX_HEADER_SIZE)
+        if defines.Option.WINDOW in options:
+            mss = replies.get(defines.Option.MSS,defines.BUFFER_SIZE - message.MAX_HEADER_SIZE)
+            if not self.get_Args().get_rcvbuf():
+                ''' auto sized - grow the receive buffer to queue the window '''
+                sockopts.set_buffer(self.get_Socket(),SO_RCVBUF,sockopts.window_buffer(options[defines.Option.WINDOW],mss),True)
+            rcvbuf = self.get_Socket().getsockopt(SOL_SOCKET,SO_RCVBUF)
+            replies[defines.Option.WINDOW] = min(options[defines.Option.WINDOW],sockopts.buffer_window(rcvbuf,mss))
+        if defines.Option.CHECKSUM in options:
+            checksum = options[defines.Option.CHECKSUM]
+            replies[defines.Option.CHECKSUM] = checksum if checksum < len(defines.CHECKSUMS) else 0
+        if features & defines.Feature.DELAYED_ACK:
+            replies[defines.Option.ACK_EVERY] = self.get_Args().get_ack_every()
+            replies[defines.Option.ACK_DELAY] = self.get_Args().get_ack_delay()
+        if features & defines.Feature.COMPRESSION:
+            codec = options.get(defines.Option.CODEC,len(defines.CODECS))
+            if codec < len(defines.CODECS) and defines.CODECS[codec] in compress.available():
+                replies[defines.Option.CODEC] = codec
+        return replies
+
+
+    def resume_Checkpoint(self,sender,options:dict,replies:dict):
+        ''' return the checkpoint a senders transfer resumes from (written 0 if there is none), None if it is not resumable '''
+        transferID = options.get(defines.Option.TRANSFER_ID)
+        if transferID is None or defines.Option.FILE_SIZE not in options:
+            return None
+        connection = self.get_Connection(sender)
+        if connection is not None:
+            ''' a repeated SYN - the connection has resumed already '''
+            return connection['resume']
+        self.abandon_Transfer(transferID)
+
+        fresh = {'id': transferID, 'path': None, 'size': options[defines.Option.FILE_SIZE], 'mss': replies.get(defines.Option.MSS), 'written': 0, 'ranges': []}
+        state = checkpoint.load(transferID)
+        if state is None:
+            return fresh
+        try:
+            valid = state['size'] == options[defines.Option.FILE_SIZE] and os.path.getsize(state['path']) >= state['written']
+        except OSError:
+            valid = False
+        if not valid:
+            log.message.info("Checkpoint of {} does not match its file - starting at byte 0".format(state['path']))
+            return fresh
+        if state['mss'] != replies.get(defines.Option.MSS):
+            ''' ranges stored out of order only line up with segments of the same MSS '''
+            state['mss'], state['ranges'] = replies.get(defines.Option.MSS), []
+        log.message.info("Resuming {} at byte {} of {}".format(state['path'],state['written'],state['size']))
+        return state
+
+
+    def accept_Stripe(self,options:dict):
+        ''' return the group, offset and total size of a stripe of a file, None if the options do not describe one '''
+        try:
+            stripe = {'group': options[defines.Option.STRIPE], 'offset': options[defines.Option.STRIPE_OFFSET], 'total': options[defines.Option.STRIPE_TOTAL]}
+        except KeyError:
+            return None
+        if stripe['offset'] + options.get(defines.Option.FILE_SIZE,0) > stripe['total']:
+            return None
+        return stripe
+
+
+    def abandon_Transfer(self,transferID):
+        ''' checkpoint and remove the connection of a transfer a restarted sender resumes (its old sender died) '''
+        for sender, connection in list(self._Connections.items()):
+            if connection['resume'] is not None and connection['resume']['id'] == transferID and connection['state'] == defines.ESTABLISHED:
+                self.checkpoint_Connection(connection)
+                connection['writer'].close()
+                self.remove_Connection(sender)
+                log.message.info("Connection {}:{} abandoned - its transfer resumes".format(sender[0],sender[1]))
+
+
+    def checkpoint_Connection(self,connection):
+        ''' write the out of order data at its offsets, sync the file and save the connections checkpoint '''
+        try:
+            fileWriter = connection['writer']
+            start = connection['start']
+            for seqNum, payload in connection['buffer'].spill():
+                fileWriter.write_at(payload,seqNum - start)
+            fileWriter.flush()
+            fileWriter.sync()
+
+            state = connection['resume']
+            state['path'] = connection['path']
+            state['written'] = connection['buffer'].get_CumulativeACK() - start
+            state['ranges'] = [(first - start, end - start) for first, end in connection['buffer'].get_Stored()]
+            checkpoint.save(state)
+        except (OSError, ValueError) as err:
+            log.message.error("checkpoint_Connection","{}".format(err))
+        connection['checkpointDue'] = time.monotonic() + self.get_Args().get_checkpoint()
+
+
+    def checkpoint_Connections(self):
+        ''' checkpoint the unfinished resumable transfers (the receiver is stopping) '''
+        for connection in list(self._Connections.values()):
+            if connection['resume'] is not None and connection['state'] == defines.ESTABLISHED:
+                self.checkpoint_Connection(connection)
+
+
     def tearDown(self,msg):
         ''' Complete Connection Teardown '''
         log.message.info("TearDown Requested")
@@ -719,6 +1477,10 @@ class STPReceiver(STPConnection):
             seqNum += 1
             connection['seq'] = seqNum
 
+            ''' the ACK of the FIN covers any delayed ACK '''
+            connection['unacked'] = 0
+            self._ACKTimers.cancel(msg.get_Recipient())
+
             ''' Send ACK MSG '''
             msg.resetFlag()
             self.sendACK(msg)
@@ -728,44 +1490,207 @@ class STPReceiver(STPConnection):
             self.sendFIN(msg)
 
             ''' Wait for ACK Response - LAST_ACK '''
-            while True:
-                msg = self.listen()
-                if msg is not None and msg.is_ACK() and msg.get_ACKNumber() == seqNum:
-                    break
-                else:
-                    ''' Old Delayed MSG from File Transfer '''
-                    continue
+            connection['state'] = defines.LAST_ACK
+        except Exception as err:
+            log.message.error("tearDown","{}".format(err))
 
-            ''' Build and Store Transferred File'''
-            data = self.assemble_msg(msg.get_Recipient())
-            self.remove_Connection(msg.get_Recipient())
 
-            logFile = self.get_LogFile()
+    def finish_tearDown(self,sender):
+        ''' Complete Connection Teardown once the last ACK is received '''
+        try:
+            ''' Write remaining data and close the Transferred File '''
+            connection = self.get_Connection(sender)
+            self.flush_ConnectionBuffer(sender)
+            received = connection['ack'] - connection['start']
+            complete = connection['fileSize'] is None or received == connection['fileSize']
+            if connection['resume'] is not None and not complete:
+                self.checkpoint_Connection(connection)
+            connection['writer'].close()
+            if connection['features'] & defines.Feature.SESSION:
+                connection['log'].update_Files_Received(connection['writer'].get_Files())
+            if not complete:
+                log.message.error("finish_tearDown","Received {} bytes of a {} byte file".format(received,connection['fileSize']))
+            elif connection['resume'] is not None:
+                checkpoint.remove(connection['resume']['id'])
+            self.remove_Connection(sender)
+            self._Served += 1
+
+            logFile = connection['log']
+            if logFile is self.get_LogFile():
+                ''' kernel drops are counted per socket - only reported for a single connection '''
+                logFile.set_Kernel_Dropped(self.get_KernelDropped())
             logFile.writeResults()
-            try:
-                args = self.get_Args()
-                f = open(args.get_filename(),defines.WRITE_BYTE)
-                f.write(data)
-                f.close()
-                
-            except Exception as err:
-                log.message.error("tearDown","Error Writing File: {}".format(err))
-            log.message.success("Connection Terminated")
+            if logFile is not self.get_LogFile():
+                logFile.close()
+            log.message.success("Connection Terminated: {}".format(connection['path']))
         except Exception as err:
-            log.message.error("tearDown","{}".format(err))
+            log.message.error("finish_tearDown","{}".format(err))
+
+
+    def send_ConnectionACK(self,sender,timestamp=None,blocks=[],event="snd"):
+        ''' ACK all in-order data received from sender (including any delayed ACK) '''
+        connection = self.get_Connection(sender)
+        ackMsg = message.STPMessage()
+        ackMsg.set_Recipient(sender)
+        ackMsg.set_ACKNumber(connection['ack'])
+        ackMsg.set_SequenceNumber(connection['seq'])
+        ackMsg.set_Blocks(blocks)
+        if connection['features'] & defines.Feature.TIMESTAMPS:
+            ''' echo the timestamp of the oldest segment this ACK is for '''
+            ackMsg.set_Timestamp(connection['ackEcho'] if connection['unacked'] else timestamp)
+        connection['unacked'] = 0
+        self._ACKTimers.cancel(sender)
+        connection['log'].incr_ACK_Sent()
+        self.sendACK(ackMsg,event)
+
+
+    def delay_ACK(self,connection,msg):
+        ''' count an in-order segment towards a delayed ACK - returns True if its ACK may wait '''
+        connection['unacked'] += 1
+        if connection['unacked'] == 1:
+            connection['ackEcho'] = msg.get_Timestamp()
+            self._ACKTimers.start(msg.get_Recipient(),self.get_Args().get_ack_delay())
+        return connection['unacked'] < self.get_Args().get_ack_every()
+
+
+    def get_DelayedACKTimeout(self):
+        ''' return seconds until the next delayed ACK is due (None if none are pending) '''
+        return self._ACKTimers.get_TimeoutRemaining()
+
+
+    def send_DelayedACKs(self):
+        ''' send the delayed ACKs that are due '''
+        for sender in self._ACKTimers.expired():
+            if sender in self._Connections:
+                self.send_ConnectionACK(sender)
+
+
+    def process_Batch(self,msgs):
+        ''' Handle a batch of received msgs, sending their replies in one batch - returns True if a connection terminated '''
+        terminated = False
+        self.begin_Batch()
+        try:
+            for msg in msgs:
+                if self.process(msg):
+                    terminated = True
+            self.send_DelayedACKs()
+        finally:
+            self.flush_Batch()
+        return terminated
+
+
+    def process(self,msg):
+        ''' Handle a received msg for its connection - returns True once a connection has terminated '''
+        sender = msg.get_Recipient()
+        logFile = self.get_ConnectionLog(sender)
+        connection = self.get_Connection(sender)
+
+        ''' Initiate New Connection (a repeated SYN means the SYN-ACK was lost) '''
+        if connection is None or (msg.is_SYN() and connection['state'] == defines.ESTABLISHED):
+            self.handShake(msg)
+            return False
+
+        if connection['state'] == defines.LAST_ACK:
+            if msg.is_ACK() and msg.get_ACKNumber() == connection['seq']:
+                self.finish_tearDown(sender)
+                return True
+            ''' Old Delayed MSG from File Transfer '''
+            return False
+
+        ''' Receive next Packet '''
+        msgLength = len(msg.get_Payload())
+        if msgLength > 0:
+
+            rcvSeqNum = msg.get_SequenceNumber()
+            rcvAckNum = msg.get_ACKNumber()
+            expectedAckNum = self.get_ConnectionSeq(sender)
+            expectedSeqNum = self.get_ConnectionACK(sender)
+            event = "snd"
+
+            log.downloadProgress(rcvSeqNum)
+
+            ''' check the ACK matches my stored Sequence Number '''
+            if rcvAckNum != expectedAckNum:
+                log.message.error("process","Invalid ACK Received Frome Client: {} expected: {}".format(rcvAckNum,expectedAckNum))
+                return False
+
+            ''' only an in-order segment not filling a hole may have its ACK delayed '''
+            delayACK = bool(connection['features'] & defines.Feature.DELAYED_ACK)
+            if rcvSeqNum != expectedSeqNum or self.get_ConnectionRanges(sender):
+                ''' loss or reordering - ACK at once, and quick ACK the next in-order segments while the sender recovers '''
+                delayACK = False
+                connection['quickACKs'] = defines.QUICK_ACKS
+            elif connection['quickACKs'] > 0:
+                connection['quickACKs'] -= 1
+                delayACK = False
+
+            if rcvSeqNum == expectedSeqNum:
+                ''' store msg, write in-order data and update new expected seq (cumulative) '''
+                self.add_ConnectionBuffer(msg)
+                nextExpectedSeqNum = self.flush_ConnectionBuffer(sender)
+                self.set_ConnectionACK(sender,nextExpectedSeqNum) 
+            elif rcvSeqNum < expectedSeqNum:
+                ''' dont store msg again - request our expectedSeqNum '''
+                nextExpectedSeqNum = expectedSeqNum
+                logFile.incr_Duplicate_ACK_Sent()
+                logFile.incr_Duplicate_Received()
+                event += "/DA"
+            else:
+                ''' store msg if required '''
+                nextExpectedSeqNum = expectedSeqNum
+                if self.add_ConnectionBuffer(msg) is False:
+                    logFile.incr_Duplicate_Received()
+                logFile.incr_Duplicate_ACK_Sent()
+                event += "/DA"
+
+            if connection['resume'] is not None and time.monotonic() >= connection['checkpointDue']:
+                self.checkpoint_Connection(connection)
+
+            if delayACK and self.delay_ACK(connection,msg):
+                return False
+
+            ''' send ack back to sender - request our expectedSeqNum '''
+            self.send_ConnectionACK(sender,msg.get_Timestamp(),self.get_ConnectionBlocks(sender,rcvSeqNum,msgLength),event)
+        else:
+            log.message.success("Client Connection Established")
+            if msg.is_FIN():
+                self.tearDown(msg)
+            else:
+                ''' Third Handshake Ack is Ignored '''
+                pass
+        return False
+
+
+    def decompress_Payload(self,msg):
+        ''' replace a compressed payload with its file bytes, returns False if it does not decompress '''
+        connection = self.get_Connection(msg.get_Recipient())
+        if connection is None or connection['codec'] is None:
+            return False
+        payload = compress.decompress(connection['codec'],msg.get_Payload())
+        if payload is None:
+            return False
+        self.get_ConnectionLog(msg.get_Recipient()).incr_Compressed_Received()
+        msg.set_Payload(payload)
+        return True
 
 
     def listen(self):
         ''' listen for a packet and return msg object'''
         socket = self.get_Socket()
         try:
-            with self.lock:
-                packet,sender = socket.recvfrom(defines.BUFFER_SIZE)
-            
-            msg = message.STPMessage()
-            if msg is None: return None
+            packet,sender = socket.recvfrom(defines.BUFFER_SIZE)
+            return self.receive(packet,sender)
+        except KeyboardInterrupt:
+            sys.exit()
+        except:
+            return None
 
-            logFile = self.get_LogFile()
+
+    def receive(self,packet,sender):
+        ''' unpack and log a received packet, returns msg object (None if corrupted) '''
+        try:
+            msg = message.STPMessage()
+            logFile = self.get_ConnectionLog(sender)
             logTime = self.get_TimePassed()
 
             unPacked = msg.unpackMsg(packet)
@@ -774,6 +1699,9 @@ class STPReceiver(STPConnection):
                 return None               
 
             msg.set_Recipient(sender)
+            if msg.is_Compressed() and not self.decompress_Payload(msg):
+                logFile.incr_Corrupted_Received()
+                return None
             dataLen = len(msg.get_Payload())
             if(dataLen > 0):
                 logFile.incr_Segments_Received()
@@ -782,7 +1710,6 @@ class STPReceiver(STPConnection):
             logFile.incr_Received()
             logFile.toFile("rcv",logTime,msg.getType(),msg.get_SequenceNumber(),len(msg.get_Payload()),msg.get_ACKNumber())
             return msg
-        except KeyboardInterrupt:
-            sys.exit()
-        except:
+        except Exception as err:
+            log.message.error("receive","{}".format(err))
             return None
\ No newline at end of file
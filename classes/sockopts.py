@@ -0,0 +1,59 @@
+#! /usr/bin/env python3.6
+
+import os, socket, sys
+from classes import defines, log, message
+
+
+'''
+    Socket Buffers and Kernel Drops
+
+    A datagram arriving at a full receive buffer is dropped by the kernel without any
+    notice to either side, so a window larger than the socket buffers looks like network
+    loss. The buffers are sized to hold a full window of datagrams, and the datagrams the
+    kernel dropped are read from the drops column of /proc/net/udp (Linux only).
+'''
+
+
+def window_buffer(mws,mss,payload=True):
+    ''' bytes of socket buffer to queue a full window of datagrams (ACKs if not payload) '''
+    segments = max(-(-mws // mss),1)
+    return segments * ((mss if payload else 0) + message.MAX_HEADER_SIZE + defines.SOCKET_BUFFER_OVERHEAD)
+
+
+def buffer_window(size,mss):
+    ''' bytes of window a socket buffer of size bytes (as getsockopt reports it) can queue '''
+    if sys.platform.startswith('linux'):
+        ''' linux reports double the size set, the other half is its own bookkeeping '''
+        size //= 2
+    return max(size // (mss + message.MAX_HEADER_SIZE + defines.SOCKET_BUFFER_OVERHEAD),1) * mss
+
+
+def set_buffer(sock,option,size,grow=False):
+    ''' set SO_RCVBUF/SO_SNDBUF to size bytes (if grow only when larger), returns the size the kernel allows '''
+    if grow and sock.getsockopt(socket.SOL_SOCKET,option) >= size:
+        return sock.getsockopt(socket.SOL_SOCKET,option)
+    try:
+        sock.setsockopt(socket.SOL_SOCKET,option,size)
+    except OSError as err:
+        log.message.error("set_buffer","{}".format(err))
+    actual = sock.getsockopt(socket.SOL_SOCKET,option)
+    if actual < size:
+        ''' capped by net.core.rmem_max/wmem_max '''
+        log.message.info("Socket buffer {} bytes (requested {}) - raise net.core.rmem_max/wmem_max for more".format(actual,size))
+    return actual
+
+
+def kernel_drops(sock):
+    ''' return the datagrams the kernel has dropped for sock (receive buffer full), None if not available '''
+    try:
+        inode = str(os.fstat(sock.fileno()).st_ino)
+        for table in defines.UDP_TABLES:
+            with open(table) as f:
+                next(f)
+                for line in f:
+                    fields = line.split()
+                    if fields[9] == inode:
+                        return int(fields[-1])
+    except (OSError, ValueError, IndexError, StopIteration):
+        pass
+    return None
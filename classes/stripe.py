@@ -0,0 +1,156 @@
+#! /usr/bin/env python3.6
+
+import multiprocessing, queue, random, os, sys
+from classes import defines,protocol,threads,log
+
+
+'''
+    Striped Transfers
+
+    The file is split into N byte ranges of whole segments and a sender process per range
+    sends it over its own STP connection, so one transfer is not bound to a single window,
+    UDP flow and interpreter. Each stripe tells the receiver its offset, the size of the
+    whole file and the stripe group of the transfer, and the receiver writes the stripes of
+    a group into one output file at their offsets (with workers=N each stripe may be served
+    by its own process). Stripes report their counters to the parent, which keeps the totals.
+'''
+
+
+def stripe_ranges(fileSize,mss,stripes):
+    ''' return the (offset,size) of each stripe - whole segments, the last takes the rest (fewer stripes for a small file) '''
+    segments = -(-fileSize // mss)
+    size = max(-(-segments // stripes),1) * mss
+    return [(offset,min(size,fileSize - offset)) for offset in range(0,fileSize,size)] or [(0,0)]
+
+
+class STPStripeSender(protocol.STPSender):
+    ''' Sender of one stripe (byte range) of a file '''
+    def __init__(self,group,offset,size,total,logFile=None):
+        protocol.STPSender.__init__(self,logFile)
+        self._StripeGroup = group # shared by the stripes of one file
+        self._StripeOffset = offset
+        self._StripeSize = size
+        self._StripeTotal = total # size of the whole file
+
+
+    def stripe_Enabled(self):
+        ''' return True if the receiver accepted the stripe '''
+        return bool(self._Features & defines.Feature.STRIPE)
+
+
+    def get_TransferSize(self,filename=None):
+        ''' return the bytes of the stripe '''
+        return self._StripeSize
+
+
+    def seq64_Required(self,filename=None):
+        ''' return True if the sequence numbers of the stripe (counted from the start of the file) exceed 32 bits '''
+        return self.get_SequenceNumber() + self._StripeOffset + self._StripeSize + 2 > defines.SEQ_MASK
+
+
+    def request_Features(self,msg):
+        ''' set the features requested by our arguments and the stripe in a SYN msg (stripes are not resumable) '''
+        features = protocol.STPSender.request_Features(self,msg)
+        features = (features | defines.Feature.STRIPE) & ~defines.Feature.RESUME
+        msg.set_Features(features,self.request_Options())
+        return features
+
+
+    def request_Options(self):
+        ''' return the handshake options of our SYN msg, with the stripe group, offset and file size '''
+        options = protocol.STPSender.request_Options(self)
+        options[defines.Option.STRIPE] = self._StripeGroup
+        options[defines.Option.STRIPE_OFFSET] = self._StripeOffset
+        options[defines.Option.STRIPE_TOTAL] = self._StripeTotal
+        return options
+
+
+    def get_SendRange(self):
+        ''' return the (start, end) file offsets of the stripe '''
+        return self._StripeOffset, self._StripeOffset + self._StripeSize
+
+
+    def init_msg_queue(self,filename=None):
+        ''' map the stripe into MSS segments - refused if the receiver does not write stripes '''
+        if not self.stripe_Enabled():
+            log.message.error("init_msg_queue","Receiver does not support striped transfers")
+            sys.exit()
+        protocol.STPSender.init_msg_queue(self,filename)
+        self.get_LogFile().set_FileSize(self._StripeSize)
+
+
+
+def send_stripe(args,stripe,offset,size,total,group,results):
+    ''' stripe process - send one byte range of the file and report its counters to the parent '''
+    random.seed(args.get_seed() + stripe)
+    socket = STPStripeSender(group,offset,size,total,log.senderSTPLogs(args.get_log(),log.STRIPE_LOG.format(stripe)))
+    socket.set_Args(args)
+    threads.upload(socket)
+    results.put((stripe,socket.get_LogFile().get_Counters()))
+
+
+
+class STPStripedSender(object):
+    ''' Starts a sender process per stripe of the file and keeps the totals of their counters '''
+    def __init__(self,args):
+        self._Args = args
+        self._logFile = log.senderSTPLogs(args.get_log())
+        self._Results = multiprocessing.Queue()
+        self._Stripes = [] # sender process of each stripe
+
+
+    def get_LogFile(self):
+        ''' return the totals of all stripes '''
+        return self._logFile
+
+
+    def start_Stripes(self,ranges,total):
+        ''' start a sender process for each (offset,size) stripe of a file of total bytes '''
+        group = int.from_bytes(os.urandom(defines.STRIPE_GROUP_SIZE),'big')
+        log.message.info("Striping {} bytes over {} connections (group {})".format(total,len(ranges),group))
+        for stripe, (offset, size) in enumerate(ranges):
+            process = multiprocessing.Process(target=send_stripe,args=(self._Args,stripe,offset,size,total,group,self._Results))
+            process.start()
+            self._Stripes.append(process)
+
+
+    def collect_Results(self):
+        ''' add the counters of each stripe to the totals as its process finishes, returns the stripes reported '''
+        reported = set()
+        while len(reported) < len(self._Stripes):
+            try:
+                stripe, counters = self._Results.get(timeout=defines.WORKER_POLL_INTERVAL)
+            except queue.Empty:
+                if not any(process.is_alive() for process in self._Stripes):
+                    break
+                continue
+            self._logFile.add_Counters(counters)
+            reported.add(stripe)
+        return reported
+
+
+    def send(self):
+        ''' send the stripes of the file in parallel, then write the totals to the sender log '''
+        filename = self._Args.get_filename()
+        if filename.startswith(defines.MANIFEST_PREFIX) or os.path.isdir(filename):
+            log.message.error("send","Multi-file sessions cannot be striped")
+            return
+        try:
+            total = os.path.getsize(filename)
+        except OSError as err:
+            log.message.error("send","{}".format(err))
+            return
+
+        self.start_Stripes(stripe_ranges(total,self._Args.get_max_segment_size(),self._Args.get_stripes()),total)
+        try:
+            reported = self.collect_Results()
+        except KeyboardInterrupt:
+            reported = set()
+            for process in self._Stripes:
+                process.terminate()
+        for stripe, process in enumerate(self._Stripes):
+            process.join()
+            if stripe not in reported or process.exitcode != 0:
+                log.message.error("send","Stripe {} failed ({})".format(stripe,process.exitcode))
+        self._logFile.writeResults()
+        self._logFile.close()
@@ -0,0 +1,171 @@
+#! /usr/bin/env python3.6
+
+import multiprocessing, threading, queue, signal, time
+from classes import defines,protocol,log
+
+
+'''
+    Multi-Process Receiver
+
+    A supervisor starts N worker processes, each running its own STPReceiver on the same
+    port with SO_REUSEPORT. The kernel hashes each sender's address to one worker, so a
+    connection is served by a single process. Workers report each terminated connection's
+    counters to the supervisor, which keeps the totals and restarts workers that exit.
+'''
+
+
+class STPWorkerReceiver(protocol.STPReceiver):
+    ''' Receiver Server in a worker process - reports terminated connections to its supervisor '''
+    def __init__(self,args,worker,results,accepted):
+        protocol.STPReceiver.__init__(self,log.receiverSTPLogs(args.get_log(),log.WORKER_LOG.format(worker)))
+        self._Worker = worker
+        self._Results = results # queue of (worker, path, counters) to the supervisor (path None when stopped)
+        self._SharedAccepted = accepted # connection number shared by all workers
+        self.set_Receiver(args.get_receiver())
+        self.set_Args(args)
+        self.set_ReusePort()
+
+
+    def next_ConnectionNumber(self):
+        ''' return the number of a new connection (in accept order across all workers) '''
+        with self._SharedAccepted.get_lock():
+            self._SharedAccepted.value += 1
+            return self._SharedAccepted.value
+
+
+    def serving(self):
+        ''' workers serve until the supervisor stops them '''
+        return True
+
+
+    def finish_Serving(self):
+        ''' checkpoint unfinished transfers and report the datagrams the kernel dropped at this workers socket to the supervisor '''
+        self.checkpoint_Connections()
+        self._Results.put((self._Worker,None,{'_Kernel_Dropped': self.get_KernelDropped()}))
+
+
+    def finish_tearDown(self,sender):
+        ''' Complete Connection Teardown and report the connection to the supervisor '''
+        connection = self.get_Connection(sender)
+        protocol.STPReceiver.finish_tearDown(self,sender)
+        if connection is not None:
+            self._Results.put((self._Worker,connection['path'],connection['log'].get_Counters()))
+
+
+
+stopping = threading.Event()
+
+def stop_worker(signum, frame):
+    ''' Signal Event to stop a Worker - interrupts the blocking receive '''
+    stopping.set()
+    raise SystemExit
+
+
+
+def serve_worker(args,worker,results,accepted):
+    ''' worker process - serve connections on the shared port until stopped '''
+    signal.signal(signal.SIGTERM, stop_worker)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    socket = STPWorkerReceiver(args,worker,results,accepted)
+    socket.connect()
+    try:
+        while not stopping.is_set():
+            try:
+                socket.process_Batch(socket.listen_Batch(socket.get_DelayedACKTimeout()))
+            except (OSError, ValueError) as err:
+                log.message.error("serve_worker","{}".format(err))
+    except SystemExit:
+        pass
+    finally:
+        socket.finish_Serving()
+
+
+
+class STPSupervisor(object):
+    ''' Starts the receiver worker processes, aggregates their results and restarts them if they exit '''
+    def __init__(self,args):
+        self._Args = args
+        self._logFile = log.receiverSTPLogs(args.get_log())
+        self._Results = multiprocessing.Queue()
+        self._Accepted = multiprocessing.Value('L',0)
+        self._Workers = [None] * args.get_workers()
+        self._Served = 0 # connections terminated across all workers
+        self._Restarts = 0
+
+
+    def get_LogFile(self):
+        ''' return the totals of all workers '''
+        return self._logFile
+
+
+    def get_Served(self):
+        ''' return connections terminated across all workers '''
+        return self._Served
+
+
+    def start_Worker(self,worker):
+        ''' start (or restart) worker '''
+        process = multiprocessing.Process(target=serve_worker,args=(self._Args,worker,self._Results,self._Accepted),daemon=True)
+        process.start()
+        self._Workers[worker] = process
+
+
+    def check_Workers(self):
+        ''' restart any worker that has exited '''
+        for worker,process in enumerate(self._Workers):
+            if not process.is_alive():
+                log.message.error("check_Workers","Worker {} exited ({}) - restarting".format(worker,process.exitcode))
+                self._Restarts += 1
+                time.sleep(defines.WORKER_RESTART_DELAY)
+                self.start_Worker(worker)
+
+
+    def collect_Results(self,timeout):
+        ''' add the counters of connections terminated within timeout seconds to the totals '''
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                worker,path,counters = self._Results.get(timeout=max(deadline - time.monotonic(),0))
+            except queue.Empty:
+                return
+            self._logFile.add_Counters(counters)
+            if path is None:
+                ''' a stopped workers socket counters '''
+                continue
+            self._Served += 1
+            log.message.success("Worker {} Connection Terminated: {}".format(worker,path))
+
+
+    def serving(self):
+        ''' return True until the number of connections to serve have terminated '''
+        connections = self._Args.get_connections()
+        return connections == 0 or self._Served < connections
+
+
+    def serve(self):
+        ''' serve connections with the worker processes until done or interrupted '''
+        for worker in range(len(self._Workers)):
+            self.start_Worker(worker)
+        log.message.info("Awaiting Connection ({} workers)".format(len(self._Workers)))
+        try:
+            while self.serving():
+                self.collect_Results(defines.WORKER_POLL_INTERVAL)
+                if self.serving():
+                    self.check_Workers()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+
+    def stop(self):
+        ''' stop the workers and write the totals to the server log '''
+        for process in self._Workers:
+            if process is not None and process.is_alive():
+                process.terminate()
+        for process in self._Workers:
+            if process is not None:
+                process.join()
+        self.collect_Results(0)
+        log.message.info("Served {} Connections with {} workers ({} restarts)".format(self._Served,len(self._Workers),self._Restarts))
+        self._logFile.writeResults()
@@ -34,25 +34,58 @@ class senderThread(threading.Thread):
     def run(self):
         ''' run sender thread '''
         socket = self.get_Socket()
-        window = socket.get_MsgWindow()
-        msgQueue = window.get_msgQueue()
-        logFile = socket.get_LogFile()
         
         while not self.shutdown_flag.is_set():
+            ''' Sleep until an ACK arrives, the window opens or the timer expires '''
+            socket.wait_Event()
+            if self.shutdown_flag.is_set():
+                break
+
             ''' Timeout Event - Restransmit MinPane '''
-            timer = socket.get_Timer()
-            if timer.TimeoutExpired():
-                minPane = window.get_minPane()
-                payload, payloadSeq, payloadAck = msgQueue.get_msg(minPane)
-
-                ''' ReSend the msg to the server '''    
-                receiver = socket.get_Args().get_receiver()   
-                msg = message.build(receiver,payload,payloadSeq,socket.get_AckNumber())  
-                socket.sendMsg(msg,event="snd/RXT")
-
-                ''' Restart Timer (No RTTEst) '''
-                timer.startTimeoutTimer()
-                logFile.incr_Retransmissions()
-
-            ''' Send any New Messages '''
-            socket.sendMsgWindow()
+            socket.begin_Batch()
+            try:
+                socket.retransmit_Timeout()
+
+                ''' Send any New Messages '''
+                socket.sendMsgWindow()
+            finally:
+                ''' Send the burst in as few system calls as possible '''
+                socket.flush_Batch()
+
+
+
+def upload(socket):
+    ''' connect socket (an STPSender with its arguments set), send its file and tear down the connection '''
+    socket.init_window_frame()
+    socket.connect()
+    try:
+        ''' init PLD Module and file segments'''
+        socket.init_PLD()
+        socket.init_msg_queue()
+        defines.uploading = socket.get_MsgWindow().get_msgQueue().get_length() > 0
+        try:
+            ''' create sender thread '''
+            thread = senderThread(socket)
+            thread.start()
+
+            signal.signal(signal.SIGTERM, terminate_thread)
+            signal.signal(signal.SIGINT, terminate_thread)
+    
+            while defines.uploading:
+                ''' listen for ACKS from the server (all pending ACKs at once) '''
+                msgs = socket.listen_Batch()
+                if msgs:
+                    defines.uploading = socket.update_window_batch(msgs)
+
+            thread.shutdown_flag.set()
+            socket.notify_Event()
+            thread.join()
+            print("\n")
+        except ServiceExit:
+            ''' Force Kill File Upload Gracefully '''
+            thread.shutdown_flag.set()
+            socket.notify_Event()
+            thread.join()
+    except:
+        pass
+    socket.tearDown()
@@ -3,12 +3,16 @@
 import threading
 from threading import Timer
 from classes import defines,protocol,threads,message,window,defines,log
-import time, datetime
+import time, heapq
 
 
 
 class STDTimer(object):
-    ''' Timer Object '''
+    '''
+        Retransmission Timer - RTT estimation (rfc6298) on the monotonic clock.
+        Each segment's first send time is kept so every ACK can take an RTT sample,
+        except for retransmitted segments (Karn's algorithm) unless the ACK echoes a timestamp.
+    '''
     def __init__(self):
         self._TimerLock = threading.RLock()
         self._EstimatedRTT = defines.ESTIMATEDRTT
@@ -18,7 +22,9 @@ class STDTimer(object):
         self._Gamma = 0
 
         ''' RTT Estimation '''
-        self._RTTStatus = False
+        self._Samples = 0 # RTT samples taken
+        self._SendTimes = {} # pane -> first send time (ns)
+        self._Retransmitted = set() # panes sent more than once (never sampled)
 
 
     def get_Gamma(self):
@@ -33,24 +39,13 @@ class STDTimer(object):
 
 
     def get_Time(self):
-        ''' get Timer current Time '''
-        return datetime.datetime.now()
+        ''' get Timer current Time (monotonic nanoseconds) '''
+        return time.monotonic_ns()
 
 
-    def get_RTTStart(self):
-        ''' get Timer RTT Start Time '''
-        return self._RTTStart
-
-
-    def set_RTTStart(self,timeIn):
-        ''' set Timer RTT Start Time '''
-        with self._TimerLock:
-            self._RTTStart = timeIn
-
-
-    def RTTRunning(self):
-        ''' return True if RTT Estimation in progress '''
-        return self._RTTStatus
+    def get_Timestamp(self):
+        ''' get a 32 bit microsecond timestamp for the header timestamp field '''
+        return (self.get_Time() // 1000) & defines.TIMESTAMP_MASK
 
 
     def get_TimeoutStart(self):
@@ -76,23 +71,36 @@ class STDTimer(object):
         ''' return True if Timer Time-Out has Expired'''
         TimeoutStart = self.get_TimeoutStart()
         if TimeoutStart != None:
-            TimeoutExpired = self.secondToMillisecond((self.get_Time() - TimeoutStart).total_seconds())
+            TimeoutExpired = self.nanosecondToMillisecond(self.get_Time() - TimeoutStart)
             TimeoutInterval = self.get_timeoutInterval()
             if (TimeoutExpired >= TimeoutInterval):
                 return True
         return False
 
 
-    def startTimeoutTimer(self,startRTT = False):
+    def get_TimeoutRemaining(self):
+        ''' return seconds until the Timer Time-Out expires (None if not started) '''
+        TimeoutStart = self.get_TimeoutStart()
+        if TimeoutStart is None:
+            return None
+        TimeoutPassed = self.nanosecondToMillisecond(self.get_Time() - TimeoutStart)
+        return max(self.get_timeoutInterval() - TimeoutPassed,0) / 1000
+
+
+    def startTimeoutTimer(self):
         ''' start Timer Time-Out'''
+        self.set_TimeoutStart(self.get_Time())
+
+
+    def backoff_Timeout(self):
+        ''' Timeout Event - double the TimeoutInterval (up to RTO_MAX) until a new RTT sample '''
         with self._TimerLock:
-            self.set_TimeoutStart(self.get_Time())
-            self._RTTStatus = startRTT
+            self._TimeoutInterval = min(self._TimeoutInterval * 2,defines.RTO_MAX)
 
 
-    def secondToMillisecond(self,timeIn):
-        ''' convert seconds to milliseconds '''
-        return timeIn*1000
+    def nanosecondToMillisecond(self,timeIn):
+        ''' convert nanoseconds to milliseconds '''
+        return timeIn / 1000000
 
 
     def get_EstimatedRTT(self):
@@ -111,9 +119,9 @@ class STDTimer(object):
 
 
     def calc_timeoutInterval(self):
-        ''' calculate TimeoutInterval '''
+        ''' calculate TimeoutInterval (clamped to RTO_MIN and RTO_MAX) '''
         timeoutInterval = self.get_EstimatedRTT() + self.get_Gamma() * self.get_DevRTT()
-        return timeoutInterval
+        return min(max(timeoutInterval,defines.RTO_MIN),defines.RTO_MAX)
         
 
     def calc_EstimatedRTT(self,SampleRTT):
@@ -128,17 +136,110 @@ class STDTimer(object):
         return devRTT
 
 
-    def update_RTT(self,pane):
-        ''' Calculates SampleRTT, and updates EstimatedRTT and DevRTT '''
-        if self._RTTStatus is False: return  
-        try:
-            RTTStart = self.get_TimeoutStart()
-            SampleRTT = self.secondToMillisecond(((self.get_Time() - RTTStart).total_seconds()))
-            with self._TimerLock:
+    def segment_Sent(self,pane):
+        ''' record the first send time of pane, later sends mark it retransmitted '''
+        with self._TimerLock:
+            if pane in self._SendTimes:
+                self._Retransmitted.add(pane)
+            else:
+                self._SendTimes[pane] = self.get_Time()
+
+
+    def add_Sample(self,SampleRTT):
+        ''' updates EstimatedRTT, DevRTT and TimeoutInterval with SampleRTT (milliseconds) '''
+        with self._TimerLock:
+            if self._Samples == 0:
+                ''' first measurement as per rfc6298 '''
+                self._EstimatedRTT = SampleRTT
+                self._DevRTT = SampleRTT / 2
+            else:
                 ''' Must update in this order as per rfc6298 '''
                 self._DevRTT = self.calc_DevRTT(SampleRTT)
                 self._EstimatedRTT = self.calc_EstimatedRTT(SampleRTT)
+            self._Samples += 1
+            self._TimeoutInterval = self.calc_timeoutInterval()
+
+
+    def update_RTT(self,start,end,echo=None):
+        '''
+            Panes start to end (inclusive) have been ACK'd - take a SampleRTT from the echoed
+            timestamp, or from the send time of end if none of the panes were retransmitted
+        '''
+        now = self.get_Time()
+        with self._TimerLock:
+            sendTime = self._SendTimes.get(end)
+            retransmitted = False
+            for pane in range(start,end+1):
+                self._SendTimes.pop(pane,None)
+                if pane in self._Retransmitted:
+                    self._Retransmitted.discard(pane)
+                    retransmitted = True
+
+        if echo is not None:
+            SampleRTT = ((now // 1000 - echo) & defines.TIMESTAMP_MASK) / 1000
+        elif sendTime is not None and not retransmitted:
+            SampleRTT = self.nanosecondToMillisecond(now - sendTime)
+        else:
+            ''' no sample - new data was ACK'd so drop any backoff '''
+            with self._TimerLock:
                 self._TimeoutInterval = self.calc_timeoutInterval()
-                self._RTTStatus = False
-        except:
-            pass
\ No newline at end of file
+            return
+        self.add_Sample(SampleRTT)
+
+
+
+class STPTimerHeap(object):
+    ''' Per-segment retransmission timers - a min-heap of (deadline,key) with lazy cancellation '''
+    def __init__(self):
+        self._TimerLock = threading.RLock()
+        self._heap = []
+        self._deadlines = {} # key -> active deadline
+
+
+    def start(self,key,interval):
+        ''' start (or restart) the timer for key, expiring in interval milliseconds '''
+        deadline = time.monotonic_ns() + int(interval*1000000)
+        with self._TimerLock:
+            self._deadlines[key] = deadline
+            heapq.heappush(self._heap,(deadline,key))
+
+
+    def cancel(self,key):
+        ''' cancel the timer for key '''
+        with self._TimerLock:
+            self._deadlines.pop(key,None)
+
+
+    def running(self,key):
+        ''' return True if key has an active timer '''
+        return key in self._deadlines
+
+
+    def pop_stale(self):
+        ''' discard cancelled or restarted entries from the top of the heap '''
+        while self._heap and self._deadlines.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+
+
+    def expired(self):
+        ''' pop and return the keys of all expired timers '''
+        now = time.monotonic_ns()
+        keys = []
+        with self._TimerLock:
+            self.pop_stale()
+            while self._heap and self._heap[0][0] <= now:
+                deadline, key = heapq.heappop(self._heap)
+                del self._deadlines[key]
+                keys.append(key)
+                self.pop_stale()
+        return keys
+
+
+    def get_TimeoutRemaining(self):
+        ''' return seconds until the next timer expires (None if no timers running) '''
+        with self._TimerLock:
+            self.pop_stale()
+            if not self._heap:
+                return None
+            return max(self._heap[0][0] - time.monotonic_ns(),0) / 1000000000
+
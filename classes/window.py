@@ -1,7 +1,7 @@
 #! /usr/bin/env python3.6
 
 import threading
-from classes import defines,protocol,threads,message,timer,log
+from classes import defines,protocol,threads,message,timer,buffer,log
 
 class STPWindow(object):
     ''' STP Message Window '''
@@ -12,6 +12,10 @@ class STPWindow(object):
         self._window = {}
         self._minPane = 0
         self._maxPane = 0
+        self._nextPane = 0 # next pane never sent
+        self._selected = set() # panes ACK'd individually beyond minPane (selective repeat/SACK)
+        self._highSelected = -1 # highest pane ACK'd individually
+        self._scoreboard = buffer.STPRangeSet() # byte ranges ACK'd individually
         self.lock = threading.RLock()
 
 
@@ -29,6 +33,58 @@ class STPWindow(object):
         return value
 
 
+    def set_nextPane(self,value:int):
+        ''' set nextPane value '''
+        with self.lock:
+            self._nextPane = value 
+        return value
+
+
+    def get_nextPane(self):
+        ''' get nextPane value '''
+        return self._nextPane
+
+
+    def has_unsent(self):
+        ''' returns True if the window holds msgs that have never been sent '''
+        msgQueue = self.get_msgQueue()
+        if msgQueue is None:
+            return False
+        nextPane = max(self._nextPane,self._minPane)
+        return nextPane <= self._maxPane and nextPane < msgQueue.get_length()
+
+
+    def set_selected(self,pane:int):
+        ''' mark pane as received (individually ACK'd) '''
+        with self.lock:
+            self._selected.add(pane)
+            self._highSelected = max(self._highSelected,pane)
+
+
+    def is_selected(self,pane:int):
+        ''' returns True if pane has been individually ACK'd '''
+        return pane in self._selected
+
+
+    def get_highSelected(self):
+        ''' get the highest pane individually ACK'd (-1 if none) '''
+        return self._highSelected
+
+
+    def add_selected_range(self,start:int,end:int):
+        ''' record [start,end) bytes as ACK'd, returns the (start,end) ranges not recorded before '''
+        with self.lock:
+            return self._scoreboard.add(start,end)
+
+
+    def clear_selected(self,start:int,end:int,seqNum:int):
+        ''' forget individually ACK'd panes start to end (exclusive) once cumulatively ACK'd up to seqNum '''
+        with self.lock:
+            for pane in range(start,end):
+                self._selected.discard(pane)
+            self._scoreboard.trim(seqNum)
+
+
     def set_msgQueue(self,queue:object):
         ''' set msgQueue object '''
         with self.lock:
@@ -68,6 +124,13 @@ class STPWindow(object):
         return value 
 
 
+    def clear_window_status(self,keys):
+        ''' forget the status of window panes (keys) - ie panes below the cumulative ACK '''
+        with self.lock:
+            for key in keys:
+                self._window.pop(key,None)
+
+
     def get_window_status(self,key):
         ''' get window pane value '''
         if key in self._window:
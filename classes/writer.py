@@ -0,0 +1,214 @@
+#! /usr/bin/env python3.6
+
+import os, time, struct
+from classes import defines,log,message
+
+IOV_MAX = 1024 # max buffers in one writev call (POSIX minimum)
+
+
+class STPFileWriter(object):
+    '''
+        Streams a connections in-order data to its output file as the cumulative ACK advances.
+        Data is held in a write-behind buffer of bufferSize bytes before being written.
+        Given an offset the file is kept (created if missing) and written from offset on - a resumed
+        transfer, or one stripe of a file other writers write the rest of (the file cut or extended to size).
+    '''
+    def __init__(self,filename,bufferSize=defines.WRITE_BUFFER_SIZE,fsync=defines.FSYNC_FIN,offset=None,size=None):
+        if offset is None:
+            self._file = open(filename,defines.WRITE_BYTE,buffering=0)
+        else:
+            self._file = open(os.open(filename,os.O_RDWR | os.O_CREAT,0o666),defines.UPDATE_BYTE,buffering=0)
+            if size is not None and os.fstat(self._file.fileno()).st_size != size:
+                os.ftruncate(self._file.fileno(),size)
+            self._file.seek(offset)
+        self._bufferSize = bufferSize
+        self._fsync = fsync
+        self._buffer = []
+        self._buffered = 0 # bytes waiting in the write-behind buffer
+        self._written = 0 # bytes written to the file
+        self._lastSync = time.monotonic()
+
+
+    def get_Written(self):
+        ''' get number of bytes passed to the writer '''
+        return self._written + self._buffered
+
+
+    def write(self,data):
+        ''' buffer in-order data, writing to file once the write-behind buffer is full '''
+        if len(data) == 0:
+            return
+        self._buffer.append(data)
+        self._buffered += len(data)
+        if self._buffered >= self._bufferSize or len(self._buffer) >= IOV_MAX:
+            self.flush()
+
+
+    def write_at(self,data,offset):
+        ''' write out of order data at offset of the file (the in-order position is kept) '''
+        fd = self._file.fileno()
+        if hasattr(os,'pwrite'):
+            view = memoryview(data)
+            while len(view) > 0:
+                written = os.pwrite(fd,view,offset)
+                view = view[written:]
+                offset += written
+        else:
+            position = self._file.tell()
+            self._file.seek(offset)
+            self._file.write(data)
+            self._file.seek(position)
+
+
+    def skip(self,length):
+        ''' move the in-order position past length bytes written out of order already '''
+        self.flush()
+        self._file.seek(length,os.SEEK_CUR)
+
+
+    def flush(self):
+        ''' write the write-behind buffer to file '''
+        if self._buffered > 0:
+            fd = self._file.fileno()
+            if hasattr(os,'writev'):
+                written = os.writev(fd,self._buffer)
+                if written < self._buffered:
+                    ''' short write - write the rest until it is all written '''
+                    view = memoryview(b''.join(self._buffer))[written:]
+                    while len(view) > 0:
+                        view = view[os.write(fd,view):]
+            else:
+                self._file.write(b''.join(self._buffer))
+            self._written += self._buffered
+            self._buffer = []
+            self._buffered = 0
+
+        if self._fsync == defines.FSYNC_PERIODIC and time.monotonic() - self._lastSync >= defines.FSYNC_INTERVAL:
+            self.sync()
+
+
+    def sync(self):
+        ''' flush file data to disk '''
+        os.fsync(self._file.fileno())
+        self._lastSync = time.monotonic()
+
+
+    def close(self):
+        ''' flush remaining data and close the file (syncing as per fsync policy) '''
+        try:
+            self.flush()
+            if self._fsync != defines.FSYNC_NEVER:
+                self.sync()
+        except Exception as err:
+            log.message.error("close","Error Writing File: {}".format(err))
+        finally:
+            self._file.close()
+
+
+
+class STPSessionWriter(object):
+    '''
+        Recreates a session of files under its root directory from a connections in-order data.
+        Each file is framed by its name and size (message.FRAME_FORMAT) and written with an STPFileWriter
+        (synced as per the fsync policy as it closes).
+    '''
+    def __init__(self,root,bufferSize=defines.WRITE_BUFFER_SIZE,fsync=defines.FSYNC_FIN):
+        self._root = root
+        self._bufferSize = bufferSize
+        self._fsync = fsync
+        self._header = b'' # frame header received so far
+        self._name = None # name of the file being received (None between frames)
+        self._file = None # writer of the file being received (None if it is discarded)
+        self._remaining = 0 # bytes of the file still to come
+        self._files = 0 # files received
+        self._written = 0 # bytes passed to the writer
+        os.makedirs(root,exist_ok=True)
+
+
+    def get_Written(self):
+        ''' get number of bytes passed to the writer '''
+        return self._written
+
+
+    def get_Files(self):
+        ''' get number of files received '''
+        return self._files
+
+
+    def get_Path(self,name):
+        ''' return the output path of a session file name, None if it is not a relative path within the root '''
+        parts = name.split('/')
+        if any(part in ('', '.', '..') for part in parts):
+            return None
+        return os.path.join(self._root,*parts)
+
+
+    def write(self,data):
+        ''' split in-order data into frame headers and file data '''
+        self._written += len(data)
+        view = memoryview(data)
+        while len(view) > 0:
+            if self._name is None:
+                view = self.read_header(view)
+                continue
+            chunk = view[:self._remaining]
+            if self._file is not None:
+                self._file.write(chunk)
+            self._remaining -= len(chunk)
+            view = view[len(chunk):]
+            if self._remaining == 0:
+                self.finish_file()
+
+
+    def read_header(self,view):
+        ''' add frame header bytes from view, opening the file once the header is complete - returns the rest of view '''
+        while True:
+            need = message.FRAME_SIZE
+            if len(self._header) >= message.FRAME_SIZE:
+                need += struct.unpack_from(message.FRAME_FORMAT,self._header)[0]
+            if len(self._header) >= need:
+                break
+            if len(view) == 0:
+                return view
+            take = need - len(self._header)
+            self._header += bytes(view[:take])
+            view = view[take:]
+
+        nameLength, self._remaining = struct.unpack_from(message.FRAME_FORMAT,self._header)
+        self._name = self._header[message.FRAME_SIZE:].decode('utf-8','surrogateescape')
+        self._header = b''
+        self.open_file()
+        if self._remaining == 0:
+            self.finish_file()
+        return view
+
+
+    def open_file(self):
+        ''' open the writer of the file being received (discarding its data if it cannot be written) '''
+        path = self.get_Path(self._name)
+        if path is None:
+            log.message.error("open_file","Invalid session file name: {}".format(self._name))
+            return
+        try:
+            os.makedirs(os.path.dirname(path),exist_ok=True)
+            self._file = STPFileWriter(path,self._bufferSize,self._fsync)
+        except OSError as err:
+            log.message.error("open_file","{}".format(err))
+
+
+    def finish_file(self):
+        ''' close the file received '''
+        if self._file is not None:
+            self._file.close()
+            self._files += 1
+        self._file = None
+        self._name = None
+
+
+    def close(self):
+        ''' close any incomplete file '''
+        if self._name is not None or self._header:
+            log.message.error("close","Session ended within {}".format(self._name if self._name is not None else "a frame header"))
+        if self._file is not None:
+            self._file.close()
+            self._file = None
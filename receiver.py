@@ -1,12 +1,17 @@
 #! /usr/bin/env python3.6
 
 import sys,time,datetime,string
-from classes import arguments,protocol,message,defines,log
+from classes import arguments,protocol,message,defines,log,supervisor
 from os import sys
 from socket import *
 
 
 def main(args):
+    ''' serve with worker processes sharing the port '''
+    if args.get_workers() > 1:
+        supervisor.STPSupervisor(args).serve()
+        sys.exit()
+
     ''' initialise STP protocol '''
     socket = protocol.STPReceiver()
     socket.set_Receiver(args.get_receiver()) 
@@ -15,71 +20,21 @@ def main(args):
     log.message.info("Awaiting Connection")
     logFile = socket.get_LogFile()
 
-    while True:
-        try:
-            msg = socket.listen()
-            if msg is not None:
-                sender = msg.get_Recipient()
-                ''' Initiate New Connection '''
-                if socket.get_Connection(sender) is None:
-                    socket.handShake(msg)
-                else:
-                    ''' Receive next Packet '''
-                    msgLength = len(msg.get_Payload())
-                    if msgLength > 0:
-
-                        rcvSeqNum = msg.get_SequenceNumber()
-                        rcvAckNum = msg.get_ACKNumber()
-                        expectedAckNum = socket.get_ConnectionSeq(sender)
-                        expectedSeqNum = socket.get_ConnectionACK(sender)
-                        event = "snd"
-
-                        log.downloadProgress(rcvSeqNum)
-
-                        ''' check the ACK matches my stored Sequence Number '''
-                        if rcvAckNum != expectedAckNum:
-                            log.message.error("main","Invalid ACK Received Frome Client: {} expected: {}".format(rcvAckNum,expectedAckNum))
-                            continue
-
-                        if rcvSeqNum == expectedSeqNum:
-                            ''' store msg, update new expected seq (cumulative) '''
-                            nextExpectedSeqNum = rcvSeqNum + msgLength
-                            nextExpectedSeqNum = socket.get_CumulativeACK(sender,nextExpectedSeqNum)
-                            socket.set_ConnectionACK(sender,nextExpectedSeqNum) 
-                            socket.add_ConnectionBuffer(msg)
-                        elif rcvSeqNum < expectedSeqNum:
-                            ''' dont store msg again - request our expectedSeqNum '''
-                            nextExpectedSeqNum = expectedSeqNum
-                            logFile.incr_Duplicate_ACK_Sent()
-                            logFile.incr_Duplicate_Received()
-                            event += "/DA"
-                        else:
-                            ''' store msg if required '''
-                            nextExpectedSeqNum = expectedSeqNum
-                            if socket.add_ConnectionBuffer(msg) is False:
-                                logFile.incr_Duplicate_Received()
-                            logFile.incr_Duplicate_ACK_Sent()
-                            event += "/DA"
- 
-                        ''' send ack back to sender - request our expectedSeqNum '''
-                        ackMsg = message.STPMessage()
-                        ackMsg.set_Recipient(sender)
-                        ackMsg.set_ACKNumber(nextExpectedSeqNum)
-                        ackMsg.set_SequenceNumber(expectedAckNum) 
-                        socket.sendACK(ackMsg,event)
-                    else:
-                        log.message.success("Client Connection Established")
-                        if msg.is_FIN():
-                            socket.tearDown(msg)
-                            sys.exit() 
-                        else:
-                            ''' Third Handshake Ack is Ignored '''
-                            pass
-
-        except (OSError, ValueError) as err:
-            log.message.error("main","{}".format(err))
-        except KeyboardInterrupt:
-            sys.exit()
+    try:
+        while True:
+            try:
+                ''' wait for packets (or until a delayed ACK is due) '''
+                msgs = socket.listen_Batch(socket.get_DelayedACKTimeout())
+                ''' Handle the Packets - exit once the connections to serve have terminated '''
+                if socket.process_Batch(msgs) and not socket.serving():
+                    sys.exit() 
+
+            except (OSError, ValueError) as err:
+                log.message.error("main","{}".format(err))
+            except KeyboardInterrupt:
+                sys.exit()
+    finally:
+        socket.finish_Serving()
 
 
 if __name__== "__main__":